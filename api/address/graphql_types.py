@@ -16,9 +16,11 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import TypedDict
+from asyncio import Task
+from collections.abc import Sequence
+from typing import Any, NotRequired, TypedDict
 
-from strawberry import auto
+from strawberry import auto, type
 from strawberry.experimental.pydantic import type as pydantic_type
 from strawberry.scalars import JSON
 
@@ -27,6 +29,7 @@ from database.models.brazil import (
 	CityCreate,
 	StateCreate,
 )
+from database.models.records import AddressRecord, CityRecord, StateRecord
 
 
 @pydantic_type(StateCreate, name='State')
@@ -52,6 +55,39 @@ class AddressType:
 	coordinates: JSON | None = None
 
 
+@type
+class AddressInsertResult:
+	zipcode: int
+	address: AddressType | None = None
+	error: str | None = None
+
+
+def resolve_from(strawberry_type: Any, *sources: Any) -> None:
+	"""
+	Let strawberry resolve a pydantic type straight from other objects.
+
+	Pydantic types only accept their own instances and their model, so
+	records would need a from_pydantic copy first; fields are read by
+	attribute anyway, any object with the same names can be returned.
+
+	Args:
+			strawberry_type (Any): type made by strawberry pydantic type
+			*sources (Any): classes accepted besides the type and its model
+
+	"""
+	accepted = (strawberry_type, strawberry_type._pydantic_type, *sources)
+	strawberry_type.__strawberry_definition__.is_type_of = (
+		lambda obj, _info: isinstance(obj, accepted)
+	)
+
+
+resolve_from(StateType, StateRecord)
+resolve_from(CityType, CityRecord)
+resolve_from(AddressType, AddressRecord)
+
+
 class DictResponse(TypedDict):
-	data: list[Address]
+	data: Sequence[Address | AddressRecord]
 	provider: str
+	# plugins still running after the first answer, see jobs.enrichment
+	pending: NotRequired[set[Task['DictResponse']]]
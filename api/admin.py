@@ -0,0 +1,86 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from secrets import compare_digest
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+
+from database.slow_queries import SlowQuery, slow_queries
+from utils.settings import settings
+
+
+def require_admin(
+	authorization: Annotated[str | None, Header()] = None,
+) -> None:
+	"""
+	Accept only requests with Authorization: Bearer ADMIN_TOKEN.
+
+	Args:
+			authorization (str | None, optional): Authorization header.
+					Defaults to None.
+
+	Raises:
+			HTTPException: 404 when ADMIN_TOKEN is not set (the endpoints
+					do not exist), 401 on a missing or wrong token
+
+	"""
+	if not settings.ADMIN_TOKEN:
+		raise HTTPException(status_code=404, detail='Not Found')
+	scheme, _, token = (authorization or '').partition(' ')
+	if scheme.lower() != 'bearer' or not compare_digest(
+		token.encode(), settings.ADMIN_TOKEN.encode()
+	):
+		raise HTTPException(
+			status_code=401,
+			detail='Invalid admin token',
+			headers={'WWW-Authenticate': 'Bearer'},
+		)
+
+
+router = APIRouter(
+	prefix='/admin',
+	tags=['admin'],
+	dependencies=[Depends(require_admin)],
+	include_in_schema=False,
+)
+
+
+@router.get('/slow-queries')
+async def get_slow_queries(
+	limit: Annotated[int, Query(gt=0, le=1000)] = 20,
+) -> list[SlowQuery]:
+	"""
+	List the statement shapes with most time spent in slow executions.
+
+	Args:
+			limit (int, optional): shapes returned. Defaults to 20.
+
+	Returns:
+			list[SlowQuery]: count, total, mean and max time, last parameters
+					and sampled EXPLAIN plan of each shape (see
+					database.slow_queries)
+
+	"""
+	return slow_queries.top(limit)
+
+
+@router.delete('/slow-queries', status_code=204)
+async def clear_slow_queries() -> None:
+	"""Forget the slow queries seen so far, e.g. after a deploy."""
+	slow_queries.clear()
@@ -16,6 +16,8 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 
 from fastapi import FastAPI, Request
@@ -23,11 +25,66 @@ from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 
+from api import admin, health, rest
+from api.compression import CompressionMiddleware
+from api.metrics import MetricsMiddleware
+from api.metrics import router as metrics_router
+from api.profiling import ProfilingMiddleware
 from api.schema import graphql_app
+from api.server_timing import ServerTimingMiddleware
+from database import ping
+from database.engine import engine
+from jobs import backfill, warmup
+from jobs.tasks import spawn
+from utils import logs, tracing
 from utils.settings import settings
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+	"""
+	Run the background jobs of the app while it is up.
+
+	Starts the log pipeline, the warm-up, the database ping (see
+	database.ping), the providers usage sync and the backfill
+	scheduler, stops them on shutdown.
+
+	Args:
+			app (FastAPI): the app
+
+	"""
+	with logs.pipeline():
+		if settings.WARMUP_ENABLED:
+			spawn(warmup.warm_up(), name='warm-up')
+		else:
+			warmup.ready.set()
+		pinger = spawn(ping.monitor(), name='database-ping')
+		syncer = spawn(backfill.sync_budgets(), name='budget-sync')
+		scheduler = None
+		if settings.BACKFILL_ENABLED:
+			scheduler = spawn(backfill.scheduler(), name='backfill-scheduler')
+		yield
+		pinger.cancel()
+		syncer.cancel()
+		if scheduler:
+			scheduler.cancel()
+
+
+if tracing.configure():
+	tracing.instrument_engine(engine.sync_engine)
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+# outside compression, so compression time is part of the request latency
+app.add_middleware(MetricsMiddleware)
+# around everything else, a profiled request has no other measurements
+app.add_middleware(ProfilingMiddleware)
 app.include_router(graphql_app, prefix='/graphql')
+app.include_router(rest.router)
+app.include_router(metrics_router)
+app.include_router(admin.router)
+app.include_router(health.router)
 
 if settings.DEV:
 	app.mount(
@@ -0,0 +1,387 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import zlib
+from collections.abc import Callable
+from http import HTTPStatus
+from typing import Protocol, Self
+
+import brotli  # type: ignore[import-untyped]
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.settings import settings
+
+COMPRESSIBLE_TYPES = (
+	'application/json',
+	'application/graphql-response+json',
+	'application/x-ndjson',
+	'text/',
+)
+
+
+class Compressor(Protocol):
+	def compress(self: Self, data: bytes, final: bool) -> bytes:
+		"""Compress a body chunk, finishing the stream on the last one."""
+		...
+
+
+class GzipCompressor:
+	__slots__ = ('_compressor',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start a gzip stream, at COMPRESSION_GZIP_LEVEL.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self._compressor = zlib.compressobj(
+			settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+		)
+
+	def compress(self: Self, data: bytes, final: bool) -> bytes:
+		"""
+		Compress a body chunk.
+
+		Args:
+				self (Self): scope of the class
+				data (bytes): body chunk
+				final (bool): last chunk of the body
+
+		Returns:
+				bytes: compressed data, flushed so the client can decode it
+
+		"""
+		return self._compressor.compress(data) + self._compressor.flush(
+			zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+		)
+
+
+class BrotliCompressor:
+	__slots__ = ('_compressor',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start a brotli stream, at COMPRESSION_BROTLI_QUALITY.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self._compressor = brotli.Compressor(
+			quality=settings.COMPRESSION_BROTLI_QUALITY
+		)
+
+	def compress(self: Self, data: bytes, final: bool) -> bytes:
+		"""
+		Compress a body chunk.
+
+		Args:
+				self (Self): scope of the class
+				data (bytes): body chunk
+				final (bool): last chunk of the body
+
+		Returns:
+				bytes: compressed data, flushed so the client can decode it
+
+		"""
+		chunk: bytes = self._compressor.process(data)
+		tail: bytes = (
+			self._compressor.finish() if final else self._compressor.flush()
+		)
+		return chunk + tail
+
+
+class ZstdCompressor:
+	__slots__ = ('_compressor',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start a zstd stream, at COMPRESSION_ZSTD_LEVEL.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self._compressor = zstandard.ZstdCompressor(
+			level=settings.COMPRESSION_ZSTD_LEVEL
+		).compressobj()
+
+	def compress(self: Self, data: bytes, final: bool) -> bytes:
+		"""
+		Compress a body chunk.
+
+		Args:
+				self (Self): scope of the class
+				data (bytes): body chunk
+				final (bool): last chunk of the body
+
+		Returns:
+				bytes: compressed data, flushed so the client can decode it
+
+		"""
+		return self._compressor.compress(data) + self._compressor.flush(
+			zstandard.COMPRESSOBJ_FLUSH_FINISH
+			if final
+			else zstandard.COMPRESSOBJ_FLUSH_BLOCK
+		)
+
+
+COMPRESSORS: dict[str, Callable[[], Compressor]] = {
+	'zstd': ZstdCompressor,
+	'br': BrotliCompressor,
+	'gzip': GzipCompressor,
+}
+
+
+def negotiate(accept_encoding: str) -> str | None:
+	"""
+	Pick the encoding of the response from the Accept-Encoding header.
+
+	The highest q-value wins, ties go to the order of COMPRESSION_ENCODINGS.
+
+	Args:
+			accept_encoding (str): Accept-Encoding of the request
+
+	Returns:
+			str | None: content coding, None to send the body as is
+
+	"""
+	weights: dict[str, float] = {}
+	for item in accept_encoding.lower().split(','):
+		name, _, params = item.partition(';')
+		q = 1.0
+		param, _, value = params.strip().partition('=')
+		if param == 'q':
+			try:
+				q = float(value)
+			except ValueError:
+				q = 0.0
+		weights[name.strip()] = q
+	default = weights.get('*', 0.0)
+	encoding, best = None, 0.0
+	for name in settings.COMPRESSION_ENCODINGS:
+		q = weights.get(name, default)
+		if q > best:
+			encoding, best = name, q
+	return encoding
+
+
+def compressible(headers: Headers) -> bool:
+	"""
+	Check if a response may be compressed, based on its headers.
+
+	Args:
+			headers (Headers): headers of the response
+
+	Returns:
+			bool: True for text and json bodies not encoded yet
+
+	"""
+	if 'content-encoding' in headers:
+		return False
+	return headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+	"""
+	Tag the ETag of a compressed representation with its content coding.
+
+	Each coding is a different representation, so it gets its own strong
+	tag (RFC 9110, 8.8.3), e.g. "1001000-1.0-gzip".
+
+	Args:
+			etag (str): ETag set by the app
+			encoding (str): content coding of the body
+
+	Returns:
+			str: ETag of the encoded body
+
+	"""
+	tag = etag.removesuffix('"')
+	return f'{tag}-{encoding}"'
+
+
+def decoded_if_none_match(
+	if_none_match: str, encoding: str
+) -> tuple[str, bool]:
+	"""
+	Remove the content coding from the tags of If-None-Match.
+
+	The app compares them with its own ETags (see encoded_etag).
+
+	Args:
+			if_none_match (str): If-None-Match of the request
+			encoding (str): negotiated content coding
+
+	Returns:
+			tuple[str, bool]: header for the app, True if any tag had
+					the coding
+
+	"""
+	suffix = f'-{encoding}"'
+	tags = [tag.strip() for tag in if_none_match.split(',')]
+	encoded = any(tag.endswith(suffix) for tag in tags)
+	return ', '.join(
+		tag.removesuffix(suffix) + '"' if tag.endswith(suffix) else tag
+		for tag in tags
+	), encoded
+
+
+class CompressionResponder:
+	__slots__ = ('_compressor', '_encoded_tag', '_encoding', '_send', '_start')
+
+	def __init__(
+		self: Self, send: Send, encoding: str, encoded_tag: bool
+	) -> None:
+		"""
+		Wrap send of one response.
+
+		Args:
+				self (Self): scope of the class
+				send (Send): ASGI send
+				encoding (str): negotiated content coding
+				encoded_tag (bool): If-None-Match had a tag of this coding,
+						a 304 answers with that tag
+
+		"""
+		self._send = send
+		self._encoding = encoding
+		self._encoded_tag = encoded_tag
+		self._start: Message | None = None
+		self._compressor: Compressor | None = None
+
+	async def __call__(self: Self, message: Message) -> None:
+		"""
+		Hold the response start until the first body chunk tells if the
+		body is worth compressing, then compress every chunk.
+
+		Args:
+				self (Self): scope of the class
+				message (Message): ASGI message sent by the app
+
+		"""
+		if message['type'] == 'http.response.start':
+			self._start = message
+			return
+		if message['type'] != 'http.response.body':
+			await self._send(message)
+			return
+
+		body: bytes = message.get('body', b'')
+		more_body: bool = message.get('more_body', False)
+		if self._start is not None:
+			start, self._start = self._start, None
+			headers = MutableHeaders(raw=start['headers'])
+			if (
+				(more_body or len(body) >= max(settings.COMPRESSION_MIN_SIZE, 1))
+				and start['status'] not in {204, 304}
+				and compressible(headers)
+			):
+				self._compressor = COMPRESSORS[self._encoding]()
+				headers['Content-Encoding'] = self._encoding
+				headers.add_vary_header('Accept-Encoding')
+				if etag := headers.get('etag'):
+					headers['ETag'] = encoded_etag(etag, self._encoding)
+				del headers['Content-Length']
+				if not more_body:
+					body = self._compressor.compress(body, final=True)
+					headers['Content-Length'] = str(len(body))
+					self._compressor = None
+			elif compressible(headers):
+				headers.add_vary_header('Accept-Encoding')
+			elif (
+				start['status'] == HTTPStatus.NOT_MODIFIED
+				and self._encoded_tag
+				and (etag := headers.get('etag'))
+			):
+				# validates the compressed 200 the client has cached
+				headers['ETag'] = encoded_etag(etag, self._encoding)
+				headers.add_vary_header('Accept-Encoding')
+			await self._send(start)
+			if not more_body or self._compressor is None:
+				await self._send({**message, 'body': body})
+				return
+
+		if self._compressor is not None:
+			body = self._compressor.compress(body, final=not more_body)
+		await self._send({**message, 'body': body})
+
+
+class CompressionMiddleware:
+	"""
+	Compress responses with zstd, brotli or gzip, as the client accepts.
+
+	Bodies under COMPRESSION_MIN_SIZE are sent as they are, so single
+	zipcode lookups don't pay the cpu; streamed bodies are compressed
+	chunk by chunk and flushed, so exports stay progressive. Compressed
+	bodies keep a strong ETag with the coding appended, which the app
+	never sees: it is removed from If-None-Match and put back on 304s.
+	"""
+
+	__slots__ = ('app',)
+
+	def __init__(self: Self, app: ASGIApp) -> None:
+		"""
+		Wrap the app.
+
+		Args:
+				self (Self): scope of the class
+				app (ASGIApp): the app
+
+		"""
+		self.app = app
+
+	async def __call__(
+		self: Self, scope: Scope, receive: Receive, send: Send
+	) -> None:
+		"""
+		Wrap send with a CompressionResponder when the client accepts one
+		of COMPRESSION_ENCODINGS.
+
+		Args:
+				self (Self): scope of the class
+				scope (Scope): ASGI scope
+				receive (Receive): ASGI receive
+				send (Send): ASGI send
+
+		"""
+		if scope['type'] != 'http':
+			await self.app(scope, receive, send)
+			return
+		request_headers = Headers(scope=scope)
+		encoding = negotiate(request_headers.get('accept-encoding', ''))
+		if encoding is None:
+			await self.app(scope, receive, send)
+			return
+		encoded_tag = False
+		if if_none_match := request_headers.get('if-none-match'):
+			if_none_match, encoded_tag = decoded_if_none_match(if_none_match, encoding)
+			raw = [
+				(name, value)
+				for name, value in scope['headers']
+				if name != b'if-none-match'
+			]
+			raw.append((b'if-none-match', if_none_match.encode('latin-1')))
+			scope = {**scope, 'headers': raw}
+		await self.app(
+			scope, receive, CompressionResponder(send, encoding, encoded_tag)
+		)
@@ -0,0 +1,213 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, Self
+
+from graphql import (
+	FieldNode,
+	FragmentDefinitionNode,
+	FragmentSpreadNode,
+	GraphQLError,
+	GraphQLObjectType,
+	InlineFragmentNode,
+	OperationType,
+	SelectionSetNode,
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+from graphql.utilities import get_operation_ast
+from strawberry.extensions import FieldExtension, SchemaExtension
+from strawberry.types import Info
+
+from utils.settings import settings
+
+
+def page_size_limit(page_size: int) -> int:
+	"""
+	Apply MAX_PAGE_SIZE to a requested page size.
+
+	Args:
+			page_size (int): page size sent by the client
+
+	Raises:
+			GraphQLError: If it is over the maximum and
+					PAGE_SIZE_OVER_MAX is 'reject'
+
+	Returns:
+			int: page size to use, clamped to the maximum
+
+	"""
+	if page_size <= settings.MAX_PAGE_SIZE:
+		return page_size
+	if settings.PAGE_SIZE_OVER_MAX == 'reject':
+		raise GraphQLError(f'pageSize must be at most {settings.MAX_PAGE_SIZE}')
+	return settings.MAX_PAGE_SIZE
+
+
+class PageSizeLimit(FieldExtension):
+	"""Clamp or reject the page_size argument before the resolver runs."""
+
+	async def resolve_async(
+		self: Self,
+		next_: Callable[..., Any],
+		source: Any,
+		info: Info,
+		**kwargs: Any,
+	) -> Any:
+		"""
+		Call the resolver with a page size under MAX_PAGE_SIZE.
+
+		Args:
+				self (Self): scope of the class
+				next_ (Callable[..., Any]): the resolver
+				source (Any): parent value
+				info (Info): strawberry info
+				**kwargs (Any): field arguments
+
+		Returns:
+				Any: resolver result
+
+		"""
+		if 'page_size' in kwargs:
+			kwargs['page_size'] = page_size_limit(kwargs['page_size'])
+		return await next_(source, info, **kwargs)
+
+
+def all_address_cost(arguments: Mapping[str, Any]) -> int:
+	"""
+	Estimate the rows allAddress reads.
+
+	A zipcode is unique, so that filter reads one row whatever the page.
+	Any other filter (or none) may match many rows and OFFSET reads every
+	row of the previous pages, so page size times page number are read.
+	City and state are joined in the same query, so selecting them reads
+	no extra rows.
+
+	Args:
+			arguments (Mapping[str, Any]): coerced field arguments
+
+	Returns:
+			int: estimated cost
+
+	"""
+	if (arguments.get('filter') or {}).get('zipcode'):
+		return 1
+	page_size: int = min(arguments.get('pageSize', 10), settings.MAX_PAGE_SIZE)
+	page_number: int = arguments.get('pageNumber', 1)
+	return page_size * page_number
+
+
+# root field -> cost function, other fields cost 1
+FIELD_COSTS: dict[str, Callable[[Mapping[str, Any]], int]] = {
+	'allAddress': all_address_cost,
+}
+
+
+def _fields(
+	selection_set: SelectionSetNode,
+	fragments: Mapping[str, FragmentDefinitionNode],
+) -> Iterator[FieldNode]:
+	"""Flatten fragments of a selection set into its fields."""
+	for selection in selection_set.selections:
+		if isinstance(selection, FieldNode):
+			yield selection
+		elif isinstance(selection, InlineFragmentNode):
+			yield from _fields(selection.selection_set, fragments)
+		elif isinstance(selection, FragmentSpreadNode):
+			fragment = fragments.get(selection.name.value)
+			if fragment:
+				yield from _fields(fragment.selection_set, fragments)
+
+
+class CostLimiter(SchemaExtension):
+	"""
+	Reject operations whose estimated cost is over MAX_QUERY_COST.
+
+	Runs before execution, with the variables, so nothing reaches the
+	database. Every root field (aliases included) is summed.
+	"""
+
+	def on_execute(self: Self) -> Iterator[None]:
+		"""
+		Estimate the operation cost and stop it when too expensive.
+
+		Args:
+				self (Self): scope of the class
+
+		Raises:
+				GraphQLError: If the cost is over MAX_QUERY_COST
+
+		Yields:
+				Iterator[None]: execution step
+
+		"""
+		cost = self.cost()
+		if cost > settings.MAX_QUERY_COST:
+			raise GraphQLError(
+				f'Query cost {cost} is over the maximum of {settings.MAX_QUERY_COST}',
+				extensions={'code': 'QUERY_TOO_EXPENSIVE', 'cost': cost},
+			)
+		yield
+
+	def cost(self: Self) -> int:
+		"""
+		Estimate the cost of the operation being executed.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				int: sum of the root fields cost, 0 when the variables do
+						not coerce (execution reports them)
+
+		"""
+		context = self.execution_context
+		document = context.graphql_document
+		if document is None:
+			return 0
+		operation = get_operation_ast(document, context.operation_name)
+		if operation is None:
+			return 0
+
+		schema = context.schema._schema
+		root: GraphQLObjectType | None = {
+			OperationType.QUERY: schema.query_type,
+			OperationType.MUTATION: schema.mutation_type,
+		}.get(operation.operation)
+		fragments = {
+			definition.name.value: definition
+			for definition in document.definitions
+			if isinstance(definition, FragmentDefinitionNode)
+		}
+		variables = get_variable_values(
+			schema, operation.variable_definitions or (), context.variables or {}
+		)
+		if isinstance(variables, list):
+			# invalid variables, execution reports them
+			return 0
+
+		cost = 0
+		for node in _fields(operation.selection_set, fragments):
+			name = node.name.value
+			definition = root.fields.get(name) if root else None
+			if definition is None or name not in FIELD_COSTS:
+				cost += 1
+				continue
+			arguments = get_argument_values(definition, node, variables)
+			cost += FIELD_COSTS[name](arguments)
+		return cost
@@ -0,0 +1,108 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterator
+from time import perf_counter
+from typing import Self
+
+from graphql import DocumentNode, GraphQLError
+from strawberry.extensions import SchemaExtension
+
+from utils import server_timing
+from utils.lru import LRUCache
+from utils.settings import settings
+
+
+class CachedDocument:
+	"""Parsed document of a query text and its validation errors."""
+
+	__slots__ = ('document', 'errors')
+
+	def __init__(self: Self, document: DocumentNode) -> None:
+		"""
+		Keep a parsed document, validation is filled by its first execution.
+
+		Args:
+				self (Self): scope of the class
+				document (DocumentNode): parsed query
+
+		"""
+		self.document = document
+		self.errors: list[GraphQLError] | None = None
+
+
+documents: LRUCache[str, CachedDocument] = LRUCache(
+	settings.DOCUMENT_CACHE_MAX_SIZE
+)
+
+
+class DocumentCache(SchemaExtension):
+	"""
+	Cache parse and validation of each query text, repeats go to execution.
+
+	The schema and its validation rules never change at runtime, so the
+	validation errors of a document (usually none) can be reused too.
+	Hits and misses are counted by documents.
+	"""
+
+	cached: CachedDocument | None = None
+
+	def on_parse(self: Self) -> Iterator[None]:
+		"""
+		Reuse the document of a known query text, store it otherwise.
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterator[None]: parsing step
+
+		"""
+		context = self.execution_context
+		if context.query:
+			begin = perf_counter()
+			self.cached = documents.get(context.query)
+			server_timing.record(
+				'cache', perf_counter() - begin, 'hit' if self.cached else 'miss'
+			)
+		if self.cached:
+			context.graphql_document = self.cached.document
+		yield
+		if not self.cached and context.query and context.graphql_document:
+			self.cached = documents.put(
+				context.query, CachedDocument(context.graphql_document)
+			)
+
+	def on_validate(self: Self) -> Iterator[None]:
+		"""
+		Reuse the validation errors of a known document.
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterator[None]: validation step
+
+		"""
+		context = self.execution_context
+		if self.cached and self.cached.errors is not None:
+			# a list (even empty) tells strawberry validation already ran
+			context.errors = list(self.cached.errors)
+		yield
+		if self.cached and self.cached.errors is None:
+			self.cached.errors = list(context.errors or [])
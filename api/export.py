@@ -0,0 +1,175 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import AsyncIterator, Sequence
+from csv import writer
+from io import StringIO
+from typing import Any, Literal
+
+from msgspec.json import Encoder
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.address.graphql_inputs import (
+	AddressFilterInput,
+	CityInput,
+	StateInput,
+)
+from database import functions
+from database.engine import engine
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord
+from utils.settings import settings
+
+Extension = Literal['ndjson', 'csv']
+
+MEDIA_TYPES: dict[str, str] = {
+	'ndjson': 'application/x-ndjson',
+	'csv': 'text/csv; charset=utf-8',
+}
+
+CSV_HEADER = (
+	'zipcode',
+	'state',
+	'state_name',
+	'city_ibge',
+	'city_name',
+	'city_ddd',
+	'neighborhood',
+	'complement',
+	'latitude',
+	'longitude',
+	'altitude',
+	'updated_at',
+)
+
+_encoder = Encoder()
+
+
+def export_filter(
+	zipcode: int | None = None,
+	neighborhood: str | None = None,
+	complement: str | None = None,
+	city: int | None = None,
+	state: StateAcronym | None = None,
+) -> AddressFilterInput:
+	"""
+	Build the allAddress filter from export query parameters.
+
+	Args:
+			zipcode (int | None, optional): zipcode. Defaults to None.
+			neighborhood (str | None, optional): neighborhood. Defaults to None.
+			complement (str | None, optional): complement. Defaults to None.
+			city (int | None, optional): city ibge code. Defaults to None.
+			state (StateAcronym | None, optional): state. Defaults to None.
+
+	Returns:
+			AddressFilterInput: filter for functions.stream_addresses
+
+	"""
+	return AddressFilterInput(
+		zipcode=zipcode,
+		neighborhood=neighborhood,
+		complement=complement,
+		city=CityInput(ibge=city, name=None, ddd=None) if city else None,
+		state=StateInput(acronym=state, name=None) if state else None,
+	)
+
+
+def ndjson_chunk(rows: Sequence[Any]) -> bytes:
+	"""
+	Encode rows as json lines, same fields as GET /zipcode.
+
+	Args:
+			rows (Sequence[Any]): rows from functions.stream_addresses
+
+	Returns:
+			bytes: one json object per line
+
+	"""
+	return _encoder.encode_lines(
+		[AddressRecord.from_row(row._mapping) for row in rows]
+	)
+
+
+def csv_chunk(rows: Sequence[Any], header: bool = False) -> bytes:
+	"""
+	Encode rows as csv, coordinates flattened.
+
+	Args:
+			rows (Sequence[Any]): rows from functions.stream_addresses
+			header (bool, optional): start with CSV_HEADER. Defaults to False.
+
+	Returns:
+			bytes: csv lines, utf-8
+
+	"""
+	buffer = StringIO()
+	csv = writer(buffer)
+	if header:
+		csv.writerow(CSV_HEADER)
+	for row in rows:
+		coordinates = row.coordinates or {}
+		csv.writerow(
+			(
+				row.zipcode,
+				row.state_acronym,
+				row.state_name,
+				row.city_ibge,
+				row.city_name,
+				row.city_ddd,
+				row.neighborhood,
+				row.complement,
+				coordinates.get('latitude'),
+				coordinates.get('longitude'),
+				coordinates.get('altitude'),
+				row.updated_at.isoformat() if row.updated_at else None,
+			)
+		)
+	return buffer.getvalue().encode()
+
+
+async def export_chunks(
+	filter: AddressFilterInput, extension: Extension
+) -> AsyncIterator[bytes]:
+	"""
+	Stream every address matching filter, EXPORT_CHUNK_SIZE rows at a time.
+
+	The generator owns its session, as it outlives the request handler.
+	When the client disconnects, starlette cancels the response and the
+	session closes the server-side cursor on the way out.
+
+	Args:
+			filter (AddressFilterInput): same filter as all_address
+			extension (Extension): 'ndjson' or 'csv'
+
+	Yields:
+			bytes: encoded chunk
+
+	"""
+	first = True
+	async with AsyncSession(engine) as session:
+		async for rows in functions.stream_addresses(
+			session, filter, settings.EXPORT_CHUNK_SIZE
+		):
+			if extension == 'csv':
+				yield csv_chunk(rows, header=first)
+			else:
+				yield ndjson_chunk(rows)
+			first = False
+	if first and extension == 'csv':
+		yield csv_chunk([], header=True)
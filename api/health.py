@@ -0,0 +1,93 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Literal, TypedDict
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy.pool import QueuePool
+
+from database.engine import engine
+from database.ping import PingStatus, database
+from jobs import tasks, warmup
+from plugins.circuit import CircuitStatus, circuits
+
+router = APIRouter(include_in_schema=False)
+
+
+class PoolStatus(TypedDict):
+	"""Database pool connections."""
+
+	size: int
+	checked_out: int
+	overflow: int
+
+
+class Health(TypedDict):
+	"""Body of /health and /ready."""
+
+	status: Literal['ok', 'degraded']
+	ready: bool
+	database: PingStatus
+	pool: PoolStatus | None
+	plugins: dict[str, CircuitStatus]
+	background_tasks: int
+
+
+def health() -> Health:
+	"""
+	Report the worker state, from memory only.
+
+	ok when the database answers and no provider circuit is open, ready
+	when warmed up and the database answers. The database is pinged by
+	database.ping.monitor, not here, so probes never take a pooled
+	connection.
+	"""
+	ping = database.status()
+	plugins = circuits.status()
+	pool = engine.sync_engine.pool
+	return {
+		'status': 'ok'
+		if ping['available']
+		and all(plugin['state'] == 'closed' for plugin in plugins.values())
+		else 'degraded',
+		'ready': warmup.ready.is_set() and ping['available'],
+		'database': ping,
+		'pool': {
+			'size': pool.size(),
+			'checked_out': pool.checkedout(),
+			'overflow': max(pool.overflow(), 0),
+		}
+		if isinstance(pool, QueuePool)
+		else None,
+		'plugins': plugins,
+		'background_tasks': tasks.pending(),
+	}
+
+
+@router.get('/health')
+async def get_health() -> Health:
+	"""Answer 200 while the worker serves requests (liveness), with its state."""
+	return health()
+
+
+@router.get('/ready')
+async def ready() -> JSONResponse:
+	"""Answer 200 once warmed up with the database answering, 503 otherwise."""
+	report = health()
+	return JSONResponse(report, status_code=200 if report['ready'] else 503)
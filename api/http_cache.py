@@ -0,0 +1,92 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Mapping
+from datetime import UTC
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+
+from database.models.brazil import Address
+from database.models.records import AddressRecord
+from utils.settings import settings
+
+
+def cache_headers(
+	address: Address | AddressRecord, body: bytes | None = None
+) -> dict[str, str]:
+	"""
+	Build ETag, Last-Modified and Cache-Control of an address response.
+
+	Stored addresses get their validators from updated_at, so a 304 can be
+	answered without encoding the body. Addresses without updated_at (just
+	found by plugins) need the body, hashed into the ETag.
+
+	Args:
+			address (Address | AddressRecord): address of the response
+			body (bytes | None, optional): encoded body, only needed when
+					address has no updated_at. Defaults to None.
+
+	Returns:
+			dict[str, str]: response headers
+
+	"""
+	headers = {'Cache-Control': f'public, max-age={settings.HTTP_CACHE_MAX_AGE}'}
+	if address.updated_at:
+		# naive datetimes on database are local time
+		modified = address.updated_at.astimezone(UTC)
+		headers['ETag'] = f'"{address.zipcode}-{modified.timestamp():.6f}"'
+		headers['Last-Modified'] = format_datetime(modified, usegmt=True)
+	elif body is not None:
+		headers['ETag'] = f'"{blake2b(body, digest_size=16).hexdigest()}"'
+	return headers
+
+
+def is_not_modified(
+	request_headers: Mapping[str, str], headers: Mapping[str, str]
+) -> bool:
+	"""
+	Check the conditional request headers against the response validators.
+
+	If-None-Match wins over If-Modified-Since (RFC 9110, 13.2.2).
+
+	Args:
+			request_headers (Mapping[str, str]): headers sent by the client
+			headers (Mapping[str, str]): headers from cache_headers
+
+	Returns:
+			bool: True if a 304 Not Modified should be sent
+
+	"""
+	etag = headers.get('ETag')
+	if if_none_match := request_headers.get('if-none-match'):
+		if etag is None:
+			return False
+		tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+		return '*' in tags or etag in tags
+
+	last_modified = headers.get('Last-Modified')
+	if_modified_since = request_headers.get('if-modified-since')
+	if not last_modified or not if_modified_since:
+		return False
+	try:
+		since = parsedate_to_datetime(if_modified_since)
+	except (TypeError, ValueError):
+		return False
+	if since.tzinfo is None:
+		since = since.replace(tzinfo=UTC)
+	return parsedate_to_datetime(last_modified) <= since
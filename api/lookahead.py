@@ -0,0 +1,56 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from strawberry import Info
+from strawberry.types.nodes import SelectedField, Selection
+
+
+def _paths(selections: Iterable[Selection], prefix: str = '') -> Iterator[str]:
+	"""Walk selections, fragments included, yielding dotted field names."""
+	for selection in selections:
+		if isinstance(selection, SelectedField):
+			path = f'{prefix}{selection.name}'
+			yield path
+			yield from _paths(selection.selections, f'{path}.')
+		else:
+			yield from _paths(selection.selections, prefix)
+
+
+def selected_paths(info: Info) -> frozenset[str]:
+	"""
+	Get the fields selected under the current field, e.g. to project columns.
+
+	Fragments are flattened; @skip and @include are not evaluated, so a
+	field under them counts as selected.
+
+	Args:
+			info (Info): strawberry info of the resolver
+
+	Returns:
+			frozenset[str]: dotted names, e.g. 'zipcode', 'city', 'city.name'
+
+	"""
+	return frozenset(
+		_paths(
+			selection
+			for field in info.selected_fields
+			for selection in field.selections
+		)
+	)
@@ -0,0 +1,223 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable, Iterator
+from time import perf_counter
+from typing import Any, Self
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import (
+	CounterMetricFamily,
+	GaugeMetricFamily,
+	Metric,
+)
+from prometheus_client.registry import Collector
+from sqlalchemy.pool import QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from strawberry.extensions import SchemaExtension
+
+from api.document_cache import documents
+from api.persisted_queries import persisted_queries
+from database.engine import engine
+from jobs import tasks
+from plugins.budget import budgets
+from utils.lru import LRUCache
+from utils.metrics import OPERATION_LATENCY, REQUEST_LATENCY
+from utils.settings import settings
+
+CACHES: dict[str, LRUCache[str, Any]] = {
+	'documents': documents,
+	'persisted_queries': persisted_queries,
+}
+
+router = APIRouter()
+
+_operations: set[str] = set()
+
+
+def operation_label(name: str | None) -> str:
+	"""
+	Label of a GraphQL operation, client chosen names are bounded.
+
+	Args:
+			name (str | None): operation name sent by the client
+
+	Returns:
+			str: the name, 'anonymous' without one or 'other' once
+					METRICS_MAX_OPERATIONS names were seen
+
+	"""
+	if not name:
+		return 'anonymous'
+	if name not in _operations:
+		if len(_operations) >= settings.METRICS_MAX_OPERATIONS:
+			return 'other'
+		_operations.add(name)
+	return name
+
+
+class OperationMetrics(SchemaExtension):
+	"""Time each GraphQL operation, by operation name."""
+
+	def on_operation(self: Self) -> Iterator[None]:
+		"""
+		Observe the whole operation, from parsing to the result.
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterator[None]: operation step
+
+		"""
+		start = perf_counter()
+		yield
+		OPERATION_LATENCY.labels(
+			operation_label(self.execution_context.operation_name)
+		).observe(perf_counter() - start)
+
+
+class MetricsMiddleware:
+	"""
+	Time HTTP requests until the last body message was sent.
+
+	Requests are labeled by route template (e.g. /zipcode/{cep}), not by
+	path, so series stay bounded; unknown paths are 'unmatched'.
+	"""
+
+	__slots__ = ('app',)
+
+	def __init__(self: Self, app: ASGIApp) -> None:
+		"""
+		Wrap the app.
+
+		Args:
+				self (Self): scope of the class
+				app (ASGIApp): the app
+
+		"""
+		self.app = app
+
+	async def __call__(
+		self: Self, scope: Scope, receive: Receive, send: Send
+	) -> None:
+		"""
+		Observe the request latency and status.
+
+		Args:
+				self (Self): scope of the class
+				scope (Scope): ASGI scope
+				receive (Receive): ASGI receive
+				send (Send): ASGI send
+
+		"""
+		if scope['type'] != 'http':
+			await self.app(scope, receive, send)
+			return
+
+		start = perf_counter()
+		status = 500
+
+		async def send_status(message: Message) -> None:
+			nonlocal status
+			if message['type'] == 'http.response.start':
+				status = message['status']
+			await send(message)
+
+		try:
+			await self.app(scope, receive, send_status)
+		finally:
+			# set by the router on the scope once a route matched
+			route = getattr(scope.get('route'), 'path', 'unmatched')
+			if route != '/metrics':
+				REQUEST_LATENCY.labels(scope['method'], route, str(status)).observe(
+					perf_counter() - start
+				)
+
+
+class StateCollector(Collector):
+	"""Gauges of in-memory state, read only when /metrics is scraped."""
+
+	def collect(self: Self) -> Iterable[Metric]:
+		"""
+		Read the database pool, background tasks, caches and budgets.
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterable[Metric]: one family per gauge
+
+		"""
+		pool = engine.sync_engine.pool
+		if isinstance(pool, QueuePool):
+			connections = GaugeMetricFamily(
+				'jacobson_db_pool_connections',
+				'Database pool connections, by state.',
+				labels=['state'],
+			)
+			connections.add_metric(['checked_out'], pool.checkedout())
+			connections.add_metric(['checked_in'], pool.checkedin())
+			connections.add_metric(['overflow'], max(pool.overflow(), 0))
+			yield connections
+			yield GaugeMetricFamily(
+				'jacobson_db_pool_size',
+				'Database pool size, without overflow.',
+				value=pool.size(),
+			)
+
+		yield GaugeMetricFamily(
+			'jacobson_background_tasks',
+			'Background jobs (inserts, refreshes, enrichment) not finished yet.',
+			value=tasks.pending(),
+		)
+
+		entries = GaugeMetricFamily(
+			'jacobson_cache_entries', 'In-memory cache size.', labels=['cache']
+		)
+		hits = CounterMetricFamily(
+			'jacobson_cache_hits', 'In-memory cache hits.', labels=['cache']
+		)
+		misses = CounterMetricFamily(
+			'jacobson_cache_misses', 'In-memory cache misses.', labels=['cache']
+		)
+		for name, cache in CACHES.items():
+			stats = cache.stats()
+			entries.add_metric([name], stats['size'])
+			hits.add_metric([name], stats['hits'])
+			misses.add_metric([name], stats['misses'])
+		yield from (entries, hits, misses)
+
+		remaining = GaugeMetricFamily(
+			'jacobson_provider_budget_remaining',
+			'Provider requests left today, for live lookups.',
+			labels=['provider'],
+		)
+		for provider, budget in budgets.providers.items():
+			remaining.add_metric([provider], budget.remaining())
+		yield remaining
+
+
+REGISTRY.register(StateCollector())
+
+
+@router.get('/metrics', include_in_schema=False)
+async def metrics() -> Response:
+	"""Expose every metric in the Prometheus text format."""
+	return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,189 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Mapping
+from hashlib import sha256
+from typing import Any, Self
+
+from graphql import GraphQLError
+from strawberry.fastapi import GraphQLRouter
+from strawberry.http import GraphQLHTTPResponse, GraphQLRequestData
+from strawberry.http.async_base_view import AsyncHTTPRequestAdapter
+from strawberry.http.exceptions import HTTPException
+from strawberry.types import ExecutionResult
+
+from utils import server_timing
+from utils.lru import LRUCache
+from utils.settings import settings
+
+NOT_FOUND = 'PersistedQueryNotFound'
+
+
+class PersistedQueryNotFoundError(Exception):
+	"""Only a hash was sent and it is not in the store, client must resend."""
+
+
+class PersistedQueryStore(LRUCache[str, str]):
+	"""Bounded (LRU) store of sha256 hash -> query text."""
+
+	__slots__ = ()
+
+	def resolve(
+		self: Self, query: str | None, extensions: Mapping[str, Any] | None
+	) -> str | None:
+		"""
+		Apply the automatic persisted queries protocol to a request.
+
+		Hash and query: the hash is checked and the query stored. Only the
+		hash: the stored query is returned. No hash: nothing changes.
+		Parsing and validation of the query are cached by DocumentCache.
+
+		Args:
+				self (Self): scope of the class
+				query (str | None): query text sent by the client
+				extensions (Mapping[str, Any] | None): request extensions,
+						{'persistedQuery': {'version': 1, 'sha256Hash': ...}}
+
+		Raises:
+				HTTPException: If the version is not 1 or the hash does not
+						match the query: 400 error
+				PersistedQueryNotFoundError: If only an unknown hash was sent
+
+		Returns:
+				str | None: query text to execute
+
+		"""
+		persisted = (extensions or {}).get('persistedQuery')
+		if not persisted:
+			return query
+		if persisted.get('version') != 1:
+			raise HTTPException(400, 'Unsupported persisted query version')
+
+		query_hash = persisted.get('sha256Hash')
+		if query is None:
+			if stored := self.get(query_hash):
+				return stored
+			raise PersistedQueryNotFoundError
+
+		if sha256(query.encode()).hexdigest() != query_hash:
+			raise HTTPException(400, 'Provided sha does not match query')
+		self.put(query_hash, query)
+		return query
+
+
+persisted_queries = PersistedQueryStore(settings.APQ_MAX_SIZE)
+
+
+class PersistedQueryRouter(GraphQLRouter[object, object]):
+	"""GraphQL router with automatic persisted queries (APQ)."""
+
+	def should_render_graphql_ide(self: Self, request: Any) -> bool:
+		"""
+		Render the IDE only for GETs without query and without hash.
+
+		Args:
+				self (Self): scope of the class
+				request (Any): strawberry request adapter
+
+		Returns:
+				bool: True if the GraphQL IDE should be rendered
+
+		"""
+		return 'extensions' not in request.query_params and (
+			super().should_render_graphql_ide(request)
+		)
+
+	async def parse_http_body(
+		self: Self, request: AsyncHTTPRequestAdapter
+	) -> GraphQLRequestData:
+		"""
+		Read the request and replace a known hash by its query.
+
+		Args:
+				self (Self): scope of the class
+				request (AsyncHTTPRequestAdapter): strawberry request adapter
+
+		Returns:
+				GraphQLRequestData: query, variables and operation name
+
+		"""
+		if request.method == 'GET':
+			data = self.parse_query_params(request.query_params)
+			if extensions := data.get('extensions'):
+				data['extensions'] = self.parse_json(extensions)
+		elif 'application/json' in (request.content_type or ''):
+			data = self.parse_json(await request.get_body())
+		else:
+			return await super().parse_http_body(request)
+
+		return GraphQLRequestData(
+			query=persisted_queries.resolve(data.get('query'), data.get('extensions')),
+			variables=data.get('variables'),
+			operation_name=data.get('operationName'),
+		)
+
+	async def execute_operation(
+		self: Self, request: Any, context: Any, root_value: Any
+	) -> ExecutionResult:
+		"""
+		Answer unknown hashes with the APQ error and make GETs cacheable.
+
+		Args:
+				self (Self): scope of the class
+				request (Any): FastAPI request
+				context (Any): CustomContext, with the sub response
+				root_value (Any): root value of the schema
+
+		Returns:
+				ExecutionResult: result of the operation
+
+		"""
+		try:
+			result = await super().execute_operation(request, context, root_value)
+		except PersistedQueryNotFoundError:
+			return ExecutionResult(
+				data=None,
+				errors=[
+					GraphQLError(NOT_FOUND, extensions={'code': 'PERSISTED_QUERY_NOT_FOUND'})
+				],
+			)
+
+		if (
+			request.method == 'GET'
+			and 'persistedQuery' in request.query_params.get('extensions', '')
+			and not result.errors
+		):
+			context.response.headers['Cache-Control'] = (
+				f'public, max-age={settings.HTTP_CACHE_MAX_AGE}'
+			)
+		return result
+
+	def encode_json(self: Self, response_data: GraphQLHTTPResponse) -> str:
+		"""
+		Encode the response, timed as the serialize phase.
+
+		Args:
+				self (Self): scope of the class
+				response_data (GraphQLHTTPResponse): data and errors
+
+		Returns:
+				str: json body
+
+		"""
+		with server_timing.phase('serialize'):
+			return super().encode_json(response_data)
@@ -0,0 +1,198 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import UTC, datetime
+from pathlib import Path
+from secrets import compare_digest
+from typing import Literal, Self
+
+from pyinstrument import Profiler
+from pyinstrument.renderers.base import Renderer
+from pyinstrument.renderers.html import HTMLRenderer
+from pyinstrument.renderers.speedscope import SpeedscopeRenderer
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.settings import settings
+
+TOKEN_HEADER = 'x-profile-token'
+FORMAT_HEADER = 'x-profile-format'
+
+ProfileFormat = Literal['html', 'speedscope']
+
+FORMATS: dict[ProfileFormat, tuple[str, str]] = {
+	'html': ('text/html; charset=utf-8', 'html'),
+	'speedscope': ('application/json', 'speedscope.json'),
+}
+
+
+def profile_format(headers: Headers) -> ProfileFormat | None:
+	"""
+	Check if a request asked to be profiled, and in which format.
+
+	Profiling needs PROFILING_ENABLED and ADMIN_TOKEN, and the request
+	has to send the token in X-Profile-Token.
+
+	Args:
+			headers (Headers): request headers
+
+	Returns:
+			ProfileFormat | None: X-Profile-Format (html by default), None
+					when the request is not profiled
+
+	"""
+	token = headers.get(TOKEN_HEADER)
+	if not (settings.PROFILING_ENABLED and settings.ADMIN_TOKEN and token):
+		return None
+	if not compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+		return None
+	requested = headers.get(FORMAT_HEADER, 'html')
+	return 'speedscope' if requested == 'speedscope' else 'html'
+
+
+def render(profiler: Profiler, output: ProfileFormat) -> str:
+	"""
+	Render a finished profile.
+
+	Args:
+			profiler (Profiler): stopped profiler
+			output (ProfileFormat): html or speedscope (json)
+
+	Returns:
+			str: the profile
+
+	"""
+	renderer: Renderer = (
+		SpeedscopeRenderer() if output == 'speedscope' else HTMLRenderer()
+	)
+	return profiler.output(renderer)
+
+
+def profile_path(output: ProfileFormat, path: str) -> Path:
+	"""
+	Choose the file of a profile in PROFILING_DIRECTORY.
+
+	Args:
+			output (ProfileFormat): html or speedscope
+			path (str): request path, part of the file name
+
+	Returns:
+			Path: file named by time, path and format
+
+	"""
+	stamp = datetime.now(UTC).strftime('%Y%m%dT%H%M%S%f')
+	name = path.strip('/').replace('/', '_') or 'root'
+	return Path(settings.PROFILING_DIRECTORY or '.') / (
+		f'{stamp}-{name}.{FORMATS[output][1]}'
+	)
+
+
+def write(file: Path, content: str) -> None:
+	"""
+	Write a profile, creating its directory.
+
+	Args:
+			file (Path): see profile_path
+			content (str): rendered profile
+
+	"""
+	file.parent.mkdir(parents=True, exist_ok=True)
+	file.write_text(content, encoding='utf-8')
+
+
+async def discard(message: Message) -> None:
+	"""Drop a response message, the profile is the response."""
+
+
+class ProfilingMiddleware:
+	"""
+	Profile single requests with pyinstrument, on demand.
+
+	Info:
+			Only requests with X-Profile-Token: ADMIN_TOKEN are profiled,
+			and only when PROFILING_ENABLED (meant for DEV and canary
+			instances). The profiler follows the request task (async mode),
+			so resolvers, SQLAlchemy and plugin calls are in the profile
+			and concurrent requests are not.
+
+			Without PROFILING_DIRECTORY the profile is the response, the
+			app response is dropped. With it, the app response goes back
+			with X-Profile-File, the path the profile is written to once
+			the request is done.
+	"""
+
+	__slots__ = ('app',)
+
+	def __init__(self: Self, app: ASGIApp) -> None:
+		"""
+		Wrap the app.
+
+		Args:
+				self (Self): scope of the class
+				app (ASGIApp): the app
+
+		"""
+		self.app = app
+
+	async def __call__(
+		self: Self, scope: Scope, receive: Receive, send: Send
+	) -> None:
+		"""
+		Run profiled requests under pyinstrument.
+
+		Args:
+				self (Self): scope of the class
+				scope (Scope): ASGI scope
+				receive (Receive): ASGI receive
+				send (Send): ASGI send
+
+		"""
+		output = None
+		if scope['type'] == 'http':
+			output = profile_format(Headers(scope=scope))
+		if output is None:
+			await self.app(scope, receive, send)
+			return
+
+		file = None
+		forward: Send = discard
+		if settings.PROFILING_DIRECTORY:
+			file = profile_path(output, scope['path'])
+
+			async def forward(message: Message) -> None:
+				if message['type'] == 'http.response.start':
+					MutableHeaders(scope=message).append('X-Profile-File', str(file))
+				await send(message)
+
+		profiler = Profiler(
+			interval=settings.PROFILING_INTERVAL, async_mode='enabled'
+		)
+		profiler.start()
+		try:
+			await self.app(scope, receive, forward)
+		finally:
+			profiler.stop()
+		content = render(profiler, output)
+
+		if file is None:
+			response = Response(content, media_type=FORMATS[output][0])
+			await response(scope, receive, send)
+		else:
+			await run_in_threadpool(write, file, content)
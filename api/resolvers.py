@@ -16,6 +16,10 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from collections.abc import Collection, Sequence
+from time import perf_counter
+
+from graphql import GraphQLError
 from pydantic import PositiveInt
 from sqlmodel.ext.asyncio.session import AsyncSession
 
@@ -23,7 +27,15 @@ from api.address.graphql_inputs import AddressFilterInput, AddressInsertInput
 from api.address.graphql_types import DictResponse
 from database import functions
 from database.models.brazil import Address
+from database.models.records import AddressRecord
+from jobs import refresh
+from jobs.enrichment import store
+from jobs.refresh import StoredAddress
+from jobs.tasks import spawn
 from plugins.plugins_controller import get_zipcode_from_plugins
+from utils import logs, server_timing, tracing
+from utils.metrics import LOOKUPS
+from utils.settings import settings
 
 
 async def get_address(
@@ -31,30 +43,81 @@ async def get_address(
 	filter: AddressFilterInput,
 	page_size: PositiveInt,
 	page_number: PositiveInt,
+	fields: Collection[str] | None = None,
 ) -> DictResponse:
 	"""
 	Get all addresses from database or all plugins.
 
+	Stale addresses are still returned, their refresh runs in background
+	(see jobs.refresh.schedule_refresh). Addresses found by plugins are
+	stored in background too (see jobs.enrichment.store). Zipcode lookups
+	are logged (see utils.logs.lookup).
+
 	Args:
 			session (AsyncSession): get the session of database from get_session
 			filter (AddressFilterInput): Strawberry input dataclass,
 					everything can be None (based on sqlmodel model)
 			page_size (PositiveInt): How many elements in each page
 			page_number (PositiveInt): Number of the page
+			fields (Collection[str] | None, optional): selected fields
+					(see api.lookahead), only their columns and joins are read
+					and stored addresses come as records. Defaults to None,
+					full db models.
 
 	Returns:
 			DictResponse: 'data' key has all addresses
-					(db model) based on filter or empty list;
+					(db model or record) based on filter or empty list;
 					'provider' key has the service provider local or some plugin
 
 	"""
-	result = await functions.get_address_by_dc_join_state_join_city(
-		session, filter, page_size, page_number
-	)
-	if result or not filter.zipcode:
-		return {'data': result, 'provider': 'local'}
-
-	return await get_zipcode_from_plugins(filter.zipcode)
+	with (
+		tracing.tracer.start_as_current_span('get_address') as span,
+		logs.lookup(filter.zipcode) as entry,
+	):
+		if filter.zipcode:
+			span.set_attribute('zipcode', filter.zipcode)
+		stored: Sequence[StoredAddress]
+		data: Sequence[Address | AddressRecord]
+		if fields is None:
+			stored = data = await functions.get_address_by_dc_join_state_join_city(
+				session, filter, page_size, page_number
+			)
+		else:
+			rows = await functions.get_address_rows(
+				session, filter, fields, page_size, page_number
+			)
+			stored = rows
+			data = [AddressRecord.from_row(row._mapping) for row in rows]
+		if data or not filter.zipcode:
+			if filter.zipcode:
+				LOOKUPS.labels('local').inc()
+			span.set_attributes({'provider': 'local', 'rows': len(data)})
+			entry.update({'provider': 'local', 'cache': 'hit'})
+			refresh.schedule_refresh(stored)
+			return {'data': data, 'provider': 'local'}
+
+		begin = perf_counter()
+		plugins_result = await get_zipcode_from_plugins(filter.zipcode)
+		server_timing.record(
+			'plugins',
+			perf_counter() - begin,
+			plugins_result['provider'] if plugins_result['data'] else 'not_found',
+		)
+		span.set_attributes(
+			{
+				'provider': plugins_result['provider'],
+				'rows': len(plugins_result['data']),
+			}
+		)
+		entry['cache'] = 'miss'
+		if plugins_result['data']:
+			entry['provider'] = plugins_result['provider']
+			LOOKUPS.labels(plugins_result['provider']).inc()
+			spawn(store(plugins_result), name=f'store-{filter.zipcode}')
+		else:
+			entry['provider'] = 'not_found'
+			LOOKUPS.labels('not_found').inc()
+		return plugins_result
 
 
 async def insert_address(
@@ -73,3 +136,29 @@ async def insert_address(
 
 	"""
 	return await functions.insert_address_by_dc(session, address)
+
+
+async def insert_addresses(
+	session: AsyncSession, addresses: Sequence[AddressInsertInput]
+) -> list[AddressRecord | str]:
+	"""
+	Insert many addresses at once, each one succeeds or fails on its own.
+
+	Args:
+			session (AsyncSession): get the session of database from get_session
+			addresses (Sequence[AddressInsertInput]): Strict address classes,
+					at most MAX_BULK_ADDRESSES
+
+	Raises:
+			GraphQLError: If there are more than MAX_BULK_ADDRESSES addresses
+
+	Returns:
+			list[AddressRecord | str]: inserted record or error message,
+					in the same order as addresses
+
+	"""
+	if len(addresses) > settings.MAX_BULK_ADDRESSES:
+		raise GraphQLError(
+			f'at most {settings.MAX_BULK_ADDRESSES} addresses per request'
+		)
+	return await functions.insert_addresses(session, addresses)
@@ -0,0 +1,129 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response
+from fastapi.responses import StreamingResponse
+from msgspec.json import Encoder
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.address.graphql_inputs import AddressFilterInput
+from api.export import MEDIA_TYPES, Extension, export_chunks, export_filter
+from api.http_cache import cache_headers, is_not_modified
+from api.resolvers import get_address
+from database.engine import get_session
+from database.models.brazil import Address
+from database.models.records import AddressRecord
+from utils import server_timing
+
+router = APIRouter(tags=['rest'])
+
+_encoder = Encoder()
+
+
+def encode_address(address: Address | AddressRecord) -> bytes:
+	"""
+	Encode an address to json.
+
+	The fields of the GraphQL Address type plus updated_at, null for
+	addresses just found by plugins.
+
+	Args:
+			address (Address | AddressRecord): stored row or plugin record
+
+	Returns:
+			bytes: json body
+
+	"""
+	with server_timing.phase('serialize'):
+		if isinstance(address, Address):
+			address = AddressRecord.from_model(address)
+		return _encoder.encode(address)
+
+
+@router.get('/zipcode/{cep}')
+async def get_zipcode(
+	request: Request,
+	cep: Annotated[int, Path(gt=1_000_000, lt=99_999_999)],
+	session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
+	"""
+	Look up a single zipcode, without GraphQL parsing and validation.
+
+	Same pipeline as Query.all_address (database, then plugins), the
+	response is encoded by msgspec straight from the row.
+
+	Responses carry ETag, Last-Modified and Cache-Control; conditional
+	requests (If-None-Match, If-Modified-Since) on a stored address that
+	did not change get 304 without encoding the body.
+
+	Args:
+			request (Request): Fastapi Request, for conditional headers
+			cep (int): zipcode, digits only
+			session (AsyncSession): get db session from get_session
+
+	Raises:
+			HTTPException: If no plugin found the zipcode: 404 error
+
+	Returns:
+			Response: address as json, or empty 304
+
+	"""
+	result = await get_address(session, AddressFilterInput(zipcode=cep), 1, 1)
+	if not result['data']:
+		raise HTTPException(status_code=404, detail='Zipcode not found')
+
+	address = result['data'][0]
+	body = None if address.updated_at else encode_address(address)
+	headers = cache_headers(address, body)
+	if is_not_modified(request.headers, headers):
+		return Response(status_code=304, headers=headers)
+	return Response(
+		body or encode_address(address),
+		media_type='application/json',
+		headers=headers,
+	)
+
+
+@router.get('/addresses/export.{extension}')
+async def export_addresses(
+	extension: Extension,
+	filter: Annotated[AddressFilterInput, Depends(export_filter)],
+) -> StreamingResponse:
+	"""
+	Export every address matching the filters as NDJSON or CSV.
+
+	Same filters as allAddress, without pagination: rows are streamed from
+	a server-side cursor, so memory stays flat whatever the result size.
+
+	Args:
+			extension (Extension): 'ndjson' or 'csv'
+			filter (AddressFilterInput): filters from the query string
+
+	Returns:
+			StreamingResponse: addresses, ordered by zipcode
+
+	"""
+	return StreamingResponse(
+		export_chunks(filter, extension),
+		media_type=MEDIA_TYPES[extension],
+		headers={
+			'Content-Disposition': f'attachment; filename="addresses.{extension}"'
+		},
+	)
@@ -16,25 +16,37 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Annotated, Self
+from typing import Annotated, Self, cast
 
 from fastapi import Depends
 from pydantic import PositiveInt
 from sqlmodel.ext.asyncio.session import AsyncSession
 from strawberry import Info, Schema, field, type
-from strawberry.fastapi import BaseContext, GraphQLRouter
+from strawberry.extensions import QueryDepthLimiter
+from strawberry.extensions.tracing import OpenTelemetryExtension
+from strawberry.fastapi import BaseContext
 
 from api.address.graphql_inputs import AddressFilterInput, AddressInsertInput
-from api.address.graphql_types import AddressType
-from api.resolvers import get_address, insert_address
-from database import functions
+from api.address.graphql_types import (
+	AddressInsertResult,
+	AddressType,
+)
+from api.cost import CostLimiter, PageSizeLimit
+from api.document_cache import DocumentCache
+from api.lookahead import selected_paths
+from api.metrics import OperationMetrics
+from api.persisted_queries import PersistedQueryRouter
+from api.resolvers import get_address, insert_address, insert_addresses
+from api.server_timing import ServerTimingExtension
 from database.engine import get_session
+from database.models.records import AddressRecord
+from utils import tracing
 from utils.settings import settings
 
 
 @type
 class Query:
-	@field
+	@field(extensions=[PageSizeLimit()])  # type: ignore[misc]
 	async def all_address(
 		self: Self,
 		info: Info,
@@ -45,35 +57,31 @@ class Query:
 		"""
 		Query all addresses from database or all plugins.
 
+		Only the columns and joins of the selected fields are read.
+
 		Args:
 				info (Info): Strawberry default value to get context information
 						in this case we use 'db'
 				filter (AddressFilterInput): Strawberry input dataclass,
 						everything can be None (based on sqlmodel model)
-				page_size (PositiveInt, optional): How many elements in each page.
-						Defaults to 10.
+				page_size (PositiveInt, optional): How many elements in each page,
+						at most MAX_PAGE_SIZE (see api.cost). Defaults to 10.
 				page_number (PositiveInt, optional): Number of the page. Defaults to 1.
 
 		Returns:
-				list[AddressType]: All addresses (db model converted to strawberry type)
-						based on filter or empty list
+				list[AddressType]: All addresses based on filter or empty list,
+						records or db models resolved as they are (see
+						api.address.graphql_types.resolve_from)
 
 		"""
 		result = await get_address(
-			info.context.session, filter, page_size, page_number
-		)
-		if result['provider'] != 'local' and result['data']:
-			info.context.background_tasks.add_task(
-				functions.insert_address, info.context.session, result['data'][0]
-			)
-			# insert log
-
-		return list(
-			map(
-				AddressType.from_pydantic,
-				result['data'],
-			)
+			info.context.session,
+			filter,
+			page_size,
+			page_number,
+			fields=selected_paths(info),
 		)
+		return cast(list[AddressType], result['data'])
 
 
 @type
@@ -92,12 +100,41 @@ class Mutation:
 						almost all fields need to be passed
 
 		Returns:
-				AddressType: Address (db model converted to strawberry dataclass)
+				AddressType: Address, the db model resolved as it is
 
 		"""
-		return AddressType.from_pydantic(
-			await insert_address(info.context.session, address)
-		)
+		return cast(AddressType, await insert_address(info.context.session, address))
+
+	@field
+	async def create_addresses(
+		self: Self, info: Info, addresses: list[AddressInsertInput]
+	) -> list[AddressInsertResult]:
+		"""
+		Insert many addresses in one transaction, e.g. a partner sync.
+
+		A failed address (invalid, duplicated, city not found or already
+		stored) does not stop the others.
+
+		Args:
+				info (Info): Strawberry default value to get context information
+						in this case we use 'db'
+				addresses (list[AddressInsertInput]): Strict address classes,
+						at most MAX_BULK_ADDRESSES
+
+		Returns:
+				list[AddressInsertResult]: one result per address, in order,
+						with the address inserted or the error
+
+		"""
+		results = await insert_addresses(info.context.session, addresses)
+		return [
+			AddressInsertResult(
+				zipcode=address.zipcode, address=cast(AddressType, result)
+			)
+			if isinstance(result, AddressRecord)
+			else AddressInsertResult(zipcode=address.zipcode, error=result)
+			for address, result in zip(addresses, results, strict=True)
+		]
 
 
 class CustomContext(BaseContext):
@@ -122,10 +159,22 @@ async def get_context(
 	return CustomContext(session)
 
 
-schema = Schema(query=Query, mutation=Mutation)
+schema = Schema(
+	query=Query,
+	mutation=Mutation,
+	extensions=[
+		OperationMetrics,
+		DocumentCache,
+		ServerTimingExtension,
+		QueryDepthLimiter(max_depth=settings.MAX_QUERY_DEPTH),
+		CostLimiter,
+		# operation, parsing, validation and resolver spans
+		*([OpenTelemetryExtension] if tracing.enabled() else []),
+	],
+)
 
 """Create Graphql Router for fastapi and start graphql ide if env is DEV."""
-graphql_app = GraphQLRouter[object, object](
+graphql_app = PersistedQueryRouter(
 	schema,
 	context_getter=get_context,
 	graphql_ide='graphiql' if settings.DEV else None,
@@ -0,0 +1,134 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterator
+from random import random
+from time import perf_counter
+from typing import Self
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from strawberry.extensions import SchemaExtension
+
+from utils import server_timing
+from utils.settings import settings
+
+REQUEST_HEADER = 'x-server-timing'
+
+
+def wants_timing(headers: Headers) -> bool:
+	"""
+	Check if a request is timed: asked by header or sampled.
+
+	Args:
+			headers (Headers): request headers
+
+	Returns:
+			bool: True if the response gets a Server-Timing header
+
+	"""
+	if settings.SERVER_TIMING_ENABLED and headers.get(REQUEST_HEADER, '') not in (
+		'',
+		'0',
+	):
+		return True
+	return random() < settings.SERVER_TIMING_SAMPLE_RATE
+
+
+class ServerTimingMiddleware:
+	"""
+	Add a Server-Timing header with the phases of timed requests.
+
+	Requests send X-Server-Timing: 1 (when SERVER_TIMING_ENABLED) or are
+	sampled by SERVER_TIMING_SAMPLE_RATE. Phases are recorded by
+	utils.server_timing (parse, validate, cache, db, plugins, serialize),
+	total is the time until the response started.
+	"""
+
+	__slots__ = ('app',)
+
+	def __init__(self: Self, app: ASGIApp) -> None:
+		"""
+		Wrap the app.
+
+		Args:
+				self (Self): scope of the class
+				app (ASGIApp): the app
+
+		"""
+		self.app = app
+
+	async def __call__(
+		self: Self, scope: Scope, receive: Receive, send: Send
+	) -> None:
+		"""
+		Time the request phases and add the header to the response start.
+
+		Args:
+				self (Self): scope of the class
+				scope (Scope): ASGI scope
+				receive (Receive): ASGI receive
+				send (Send): ASGI send
+
+		"""
+		if scope['type'] != 'http' or not wants_timing(Headers(scope=scope)):
+			await self.app(scope, receive, send)
+			return
+
+		begin = perf_counter()
+		with server_timing.timed() as timing:
+
+			async def send_timing(message: Message) -> None:
+				if message['type'] == 'http.response.start':
+					timing.add('total', perf_counter() - begin)
+					MutableHeaders(scope=message).append('Server-Timing', timing.header())
+				await send(message)
+
+			await self.app(scope, receive, send_timing)
+
+
+class ServerTimingExtension(SchemaExtension):
+	"""Record GraphQL parsing and validation as Server-Timing phases."""
+
+	def on_parse(self: Self) -> Iterator[None]:
+		"""
+		Time parsing, cached documents skip most of it (see DocumentCache).
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterator[None]: parsing step
+
+		"""
+		with server_timing.phase('parse'):
+			yield
+
+	def on_validate(self: Self) -> Iterator[None]:
+		"""
+		Time validation.
+
+		Args:
+				self (Self): scope of the class
+
+		Yields:
+				Iterator[None]: validation step
+
+		"""
+		with server_timing.phase('validate'):
+			yield
@@ -0,0 +1,114 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from argparse import ArgumentParser
+from asyncio import Semaphore, gather, run
+from collections import Counter
+from logging import NullHandler
+from time import perf_counter
+from unittest.mock import patch
+
+from benchmarks.simulator import (
+	CEP_ABERTO_HOST,
+	SCENARIOS,
+	VIACEP_HOST,
+	ProviderSimulator,
+)
+from benchmarks.timer import percentiles
+from utils import logs
+from utils.settings import settings
+
+
+async def drive(
+	simulator: ProviderSimulator, lookups: int, concurrency: int
+) -> None:
+	"""
+	Run lookups through get_zipcode_from_plugins and print the report.
+
+	Args:
+			simulator (ProviderSimulator): transport used by the plugins
+			lookups (int): how many zipcodes to look up
+			concurrency (int): lookups in flight at the same time
+
+	"""
+	# imported here, under the settings of main, the plugins bind them
+	# on import
+	from plugins import plugins_controller
+	from plugins.client import http_client
+
+	http_client.transport = simulator
+	semaphore = Semaphore(concurrency)
+	latencies: list[float] = []
+	providers: Counter[str] = Counter()
+
+	async def lookup(zipcode: int) -> None:
+		async with semaphore:
+			start = perf_counter()
+			result = await plugins_controller.get_zipcode_from_plugins(zipcode)
+			latencies.append(perf_counter() - start)
+			providers[result['provider'] if result['data'] else 'not_found'] += 1
+
+	start = perf_counter()
+	await gather(*(lookup(1_001_000 + i) for i in range(lookups)))
+	elapsed = perf_counter() - start
+
+	print(f'{lookups} lookups, concurrency {concurrency}, {elapsed:.2f}s')
+	print(f'  throughput  {lookups / elapsed:>10.1f} lookups/s')
+	for name, value in percentiles(latencies).items():
+		print(f'  {name:<10}  {value:>10.1f} ms')
+	print(f'  answered by {dict(providers)}')
+	for host, stats in simulator.stats.items():
+		print(f'  {host}: {stats.calls} calls {dict(stats.outcomes)}')
+
+
+def main() -> None:
+	"""
+	Plugin fan-out benchmark against the offline provider simulator.
+
+	Run with: python -m benchmarks.bench_fanout --scenario flaky
+	"""
+	parser = ArgumentParser(description=main.__doc__)
+	parser.add_argument('--scenario', choices=SCENARIOS, default='healthy')
+	parser.add_argument('--lookups', type=int, default=500)
+	parser.add_argument('--concurrency', type=int, default=50)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	# the simulator does not check it, it just has to exist
+	simulated = settings.model_copy(
+		update={'CEP_ABERTO_TOKEN': settings.CEP_ABERTO_TOKEN or 'simulated'}
+	)
+
+	profiles = SCENARIOS[args.scenario]
+	simulator = ProviderSimulator(
+		viacep=profiles.get('viacep'),
+		cep_aberto=profiles.get('cep_aberto'),
+		seed=args.seed,
+	)
+	print(f'scenario {args.scenario} ({VIACEP_HOST}, {CEP_ABERTO_HOST})')
+	# records go through the queue as in the app, then are discarded,
+	# not printed by the lastResort handler among the report
+	with (
+		patch('utils.settings.settings', simulated),
+		logs.pipeline(NullHandler()),
+	):
+		run(drive(simulator, args.lookups, args.concurrency))
+
+
+if __name__ == '__main__':
+	main()
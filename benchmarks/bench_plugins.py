@@ -0,0 +1,134 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from json import dumps, loads
+from typing import Any
+
+from benchmarks.timer import measure, report
+from database.models.brazil import (
+	Address,
+	City,
+	StateAcronym,
+	StateAcronymName,
+	StateCreate,
+)
+from plugins.cep_aberto.cep_aberto import CepAberto
+from plugins.viacep.viacep import ViaCep
+
+VIACEP_PAYLOAD = dumps(
+	{
+		'cep': '01001-000',
+		'logradouro': 'Praça da Sé',
+		'complemento': 'lado ímpar',
+		'bairro': 'Sé',
+		'localidade': 'São Paulo',
+		'uf': 'SP',
+		'ibge': '3550308',
+		'gia': '1004',
+		'ddd': '11',
+		'siafi': '7107',
+	}
+).encode()
+
+CEP_ABERTO_PAYLOAD = dumps(
+	{
+		'altitude': 760.0,
+		'cep': '01001000',
+		'latitude': '-23.5479099981',
+		'longitude': '-46.636',
+		'logradouro': 'Praça da Sé',
+		'bairro': 'Sé',
+		'complemento': '- lado ímpar',
+		'cidade': {'ddd': 11, 'ibge': '3550308', 'nome': 'São Paulo'},
+		'estado': {'sigla': 'SP'},
+	}
+).encode()
+
+
+def _legacy_viacep(content: bytes) -> Address:
+	"""Old ViaCep path: json.loads and SQLModel instances."""
+	data: dict[str, Any] = loads(content)
+	acronym = data['uf']
+	return Address(
+		zipcode=int(data['cep'].replace('-', '')),
+		state=StateCreate(
+			acronym=StateAcronym(acronym),
+			name=getattr(StateAcronymName, acronym).value,
+		),
+		city=City(
+			ibge=int(data['ibge']), name=data['localidade'], ddd=int(data['ddd'])
+		),
+		neighborhood=data['bairro'],
+		complement=f'{data['logradouro']} {data['complemento']}'.strip(),
+	)
+
+
+def _legacy_cep_aberto(content: bytes) -> Address:
+	"""Old CepAberto path: json.loads and SQLModel instances."""
+	data: dict[str, Any] = loads(content)
+	acronym = data['estado']['sigla']
+	return Address(
+		zipcode=int(data['cep']),
+		state=StateCreate(
+			acronym=StateAcronym(acronym),
+			name=getattr(StateAcronymName, acronym).value,
+		),
+		city=City(
+			ibge=int(data['cidade']['ibge']),
+			name=data['cidade']['nome'],
+			ddd=data['cidade']['ddd'],
+		),
+		neighborhood=data['bairro'],
+		complement=f'{data['logradouro']} {data['complemento']}'.strip(),
+		coordinates={
+			'latitude': float(data['latitude']),
+			'longitude': float(data['longitude']),
+			'altitude': data['altitude'],
+		},
+	)
+
+
+def main() -> None:
+	"""
+	Decode plus conversion cost per provider payload.
+
+	Compares the old path (json -> SQLModel Address/City/StateCreate) with
+	the msgspec path (json -> Struct -> AddressRecord) and the ORM
+	materialization that only happens when the row is persisted.
+
+	Run with: python -m benchmarks.bench_plugins
+	"""
+	for name, plugin, legacy, payload in (
+		('viacep', ViaCep, _legacy_viacep, VIACEP_PAYLOAD),
+		('cep_aberto', CepAberto, _legacy_cep_aberto, CEP_ABERTO_PAYLOAD),
+	):
+		record = plugin._request_to_record(payload)
+		report(
+			name,
+			{
+				'json + sqlmodel (old)': measure(lambda: legacy(payload)),
+				'msgspec decode + record': measure(
+					lambda: plugin._request_to_record(payload)
+				),
+				'record.to_model (ingest)': measure(record.to_model),
+			},
+		)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,211 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from argparse import ArgumentParser
+from asyncio import gather, run
+from collections.abc import AsyncGenerator, Mapping
+from hashlib import sha256
+from json import dumps
+from time import perf_counter
+from typing import Self
+from unittest.mock import patch
+
+from httpx import ASGITransport, AsyncClient, Request
+
+from api.app import app
+from database.engine import get_session
+from database.models.brazil import Address, City, State, StateAcronym
+
+QUERY = """
+query ($zipcode: Int!) {
+	allAddress(filter: {zipcode: $zipcode}) {
+		zipcode
+		neighborhood
+		complement
+		coordinates
+		city { ibge name ddd }
+		state { acronym name }
+	}
+}
+"""
+
+EXTENSIONS = {
+	'persistedQuery': {
+		'version': 1,
+		'sha256Hash': sha256(QUERY.encode()).hexdigest(),
+	}
+}
+
+ADDRESS = Address(
+	zipcode=1001000,
+	neighborhood='Sé',
+	complement='Praça da Sé - lado ímpar',
+	state=State(acronym=StateAcronym.SP, name='São Paulo'),
+	city=City(ibge=3550308, name='São Paulo', ddd=11),
+)
+
+
+async def stored_address(*_: object, **__: object) -> list[Address]:
+	"""Stand in for the database query, always the same row."""
+	return [ADDRESS]
+
+
+ROW = {
+	'zipcode': ADDRESS.zipcode,
+	'provider': None,
+	'updated_at': None,
+	'neighborhood': ADDRESS.neighborhood,
+	'complement': ADDRESS.complement,
+	'coordinates': None,
+	'city_ibge': ADDRESS.city.ibge,
+	'city_name': ADDRESS.city.name,
+	'city_ddd': ADDRESS.city.ddd,
+	'state_acronym': ADDRESS.state.acronym,
+	'state_name': ADDRESS.state.name,
+}
+
+
+class StoredRow:
+	"""Row as returned by SQLAlchemy: attributes and _mapping."""
+
+	__slots__ = ('_mapping', 'provider', 'updated_at', 'zipcode')
+
+	def __init__(self: Self, row: Mapping[str, object]) -> None:
+		"""
+		Wrap a mapping.
+
+		Args:
+				self (Self): scope of the class
+				row (Mapping[str, object]): column label -> value
+
+		"""
+		self._mapping = row
+		self.zipcode = row['zipcode']
+		self.provider = row['provider']
+		self.updated_at = row['updated_at']
+
+
+async def stored_rows(*_: object, **__: object) -> list[StoredRow]:
+	"""Stand in for the projected query of allAddress, always the same row."""
+	return [StoredRow(ROW)]
+
+
+async def no_session() -> AsyncGenerator[None, None]:
+	"""Stand in for get_session, the query above does not use it."""
+	yield None
+
+
+async def send_all(
+	client: AsyncClient, requests: int, concurrency: int
+) -> None:
+	"""
+	Send every route through the client and print requests/s.
+
+	Args:
+			client (AsyncClient): client bound to the app
+			requests (int): requests per route
+			concurrency (int): requests in flight at the same time
+
+	"""
+	# requests are built once, so the client cost is not measured
+	routes = {
+		'rest': client.build_request('GET', '/zipcode/1001000'),
+		'graphql': client.build_request(
+			'POST',
+			'/graphql',
+			json={'query': QUERY, 'variables': {'zipcode': 1001000}},
+		),
+		'apq': client.build_request(
+			'GET',
+			'/graphql',
+			params={
+				'extensions': dumps(EXTENSIONS),
+				'variables': dumps({'zipcode': 1001000}),
+			},
+			headers={'accept': 'application/json'},
+		),
+	}
+	print(f'{requests} requests per route, concurrency {concurrency}')
+	await client.post(
+		'/graphql',
+		json={
+			'query': QUERY,
+			'variables': {'zipcode': 1001000},
+			'extensions': EXTENSIONS,
+		},
+	)
+	for name, request in routes.items():
+		response = await client.send(request)
+		assert response.status_code == 200  # noqa: PLR2004
+		# GraphQL errors are 200 too, and cheaper than the query
+		assert 'errors' not in response.json(), response.text
+
+		async def worker(count: int, request: Request = request) -> None:
+			for _ in range(count):
+				await client.send(request)
+
+		start = perf_counter()
+		await gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+		elapsed = perf_counter() - start
+		done = requests // concurrency * concurrency
+		size = len(request.url.query) + len(request.content)
+		print(f'  {name:<8}  {done / elapsed:>10.1f} req/s  {size:>5} B sent')
+
+
+async def drive(requests: int, concurrency: int) -> None:
+	"""
+	Send the same lookup through REST and GraphQL and print requests/s.
+
+	Args:
+			requests (int): requests per route
+			concurrency (int): requests in flight at the same time
+
+	"""
+	app.dependency_overrides[get_session] = no_session
+	transport = ASGITransport(app=app)  # type: ignore[arg-type]
+	with (
+		patch(
+			'database.functions.get_address_by_dc_join_state_join_city',
+			stored_address,
+		),
+		patch('database.functions.get_address_rows', stored_rows),
+	):
+		async with AsyncClient(
+			transport=transport, base_url='http://bench'
+		) as client:
+			await send_all(client, requests, concurrency)
+
+
+def main() -> None:
+	"""
+	REST fast path against GraphQL (full query and persisted query hash)
+	for one zipcode, in a single worker.
+
+	The database is replaced by a fixed row, so this measures the HTTP,
+	GraphQL and serialization overhead only. Run with:
+	python -m benchmarks.bench_rest
+	"""
+	parser = ArgumentParser(description=main.__doc__)
+	parser.add_argument('--requests', type=int, default=5_000)
+	parser.add_argument('--concurrency', type=int, default=10)
+	args = parser.parse_args()
+	run(drive(args.requests, args.concurrency))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,101 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import run
+from time import process_time
+from unittest.mock import patch
+
+from graphql import parse, validate
+from strawberry import Schema
+
+from api import schema as api_schema
+from api.document_cache import DocumentCache
+from benchmarks.bench_rest import ADDRESS, QUERY
+from benchmarks.timer import measure, report
+
+VARIABLES = {'zipcode': 1001000}
+
+
+class Context:
+	session = None
+
+
+async def stored_address(*_: object, **__: object) -> dict[str, object]:
+	"""Stand in for get_address, always the same row."""
+	return {'data': [ADDRESS], 'provider': 'local'}
+
+
+async def execute(schema: Schema, number: int) -> float:
+	"""
+	Execute QUERY number times.
+
+	Args:
+			schema (Schema): schema under test
+			number (int): executions
+
+	Raises:
+			GraphQLError: If QUERY fails
+
+	Returns:
+			float: CPU time per execution in microseconds
+
+	"""
+	result = await schema.execute(
+		QUERY, variable_values=VARIABLES, context_value=Context()
+	)
+	# an error costs less than the query, it would pass for a speedup
+	if result.errors:
+		raise result.errors[0]
+	start = process_time()
+	for _ in range(number):
+		await schema.execute(
+			QUERY, variable_values=VARIABLES, context_value=Context()
+		)
+	return (process_time() - start) / number * 1e6
+
+
+def main() -> None:
+	"""
+	CPU per allAddress execution with and without the document cache.
+
+	Run with: python -m benchmarks.bench_schema
+	"""
+	plain = Schema(query=api_schema.Query, mutation=api_schema.Mutation)
+	cached = Schema(
+		query=api_schema.Query,
+		mutation=api_schema.Mutation,
+		extensions=[DocumentCache],
+	)
+	document = parse(QUERY)
+
+	with patch('api.schema.get_address', stored_address):
+		report(
+			'allAddress by zipcode',
+			{
+				'parse': measure(lambda: parse(QUERY), number=1_000),
+				'validate': measure(
+					lambda: validate(plain._schema, document), number=1_000
+				),
+				'execute': run(execute(plain, 2_000)),
+				'execute + DocumentCache': run(execute(cached, 2_000)),
+			},
+		)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,122 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import run
+from time import process_time
+from typing import Self
+from unittest.mock import patch
+
+from strawberry import Info, Schema, field, type
+
+from api.address.graphql_types import AddressType
+from api.cost import PageSizeLimit
+from api.schema import Mutation, Query
+from benchmarks.bench_rest import ADDRESS
+from benchmarks.timer import report
+from database.models.records import AddressRecord
+
+PAGE_SIZE = 100
+
+QUERY = """
+query ($pageSize: Int!) {
+	allAddress(filter: {}, pageSize: $pageSize) {
+		zipcode
+		neighborhood
+		complement
+		coordinates
+		city { ibge name ddd }
+		state { acronym name }
+	}
+}
+"""
+
+RECORD = AddressRecord.from_model(ADDRESS)
+
+
+class Context:
+	session = None
+
+
+@type(name='Query')
+class FromPydanticQuery:
+	"""allAddress as it was: every row copied by from_pydantic."""
+
+	@field(extensions=[PageSizeLimit()])  # type: ignore[misc]
+	async def all_address(
+		self: Self, info: Info, page_size: int = 10
+	) -> list[AddressType]:
+		"""Convert each stored row to the strawberry type first."""
+		return [AddressType.from_pydantic(ADDRESS) for _ in range(page_size)]
+
+
+def page(row: object) -> object:
+	"""Stand in for get_address, a full page of the same row."""
+
+	async def get_address(*_: object, **__: object) -> dict[str, object]:
+		return {'data': [row] * PAGE_SIZE, 'provider': 'local'}
+
+	return get_address
+
+
+async def execute(schema: Schema, query: str, number: int) -> float:
+	"""
+	Execute query number times.
+
+	Args:
+			schema (Schema): schema under test
+			query (str): operation
+			number (int): executions
+
+	Returns:
+			float: CPU time per row in microseconds
+
+	"""
+	variables = {'pageSize': PAGE_SIZE}
+	await schema.execute(
+		query, variable_values=variables, context_value=Context()
+	)
+	start = process_time()
+	for _ in range(number):
+		result = await schema.execute(
+			query, variable_values=variables, context_value=Context()
+		)
+	assert result.errors is None, result.errors
+	return (process_time() - start) / number / PAGE_SIZE * 1e6
+
+
+def main() -> None:
+	"""
+	CPU per row of an allAddress page, by the way rows reach strawberry.
+
+	Run with: python -m benchmarks.bench_serialization
+	"""
+	schema = Schema(query=Query, mutation=Mutation)
+	from_pydantic = Schema(query=FromPydanticQuery)
+	legacy_query = QUERY.replace('filter: {}, ', '')
+
+	results = {'from_pydantic': run(execute(from_pydantic, legacy_query, 200))}
+	with patch('api.schema.get_address', page(ADDRESS)):
+		results['db model, direct'] = run(execute(schema, QUERY, 200))
+	with patch('api.schema.get_address', page(RECORD)):
+		results['record, direct'] = run(execute(schema, QUERY, 200))
+
+	report(f'allAddress pageSize={PAGE_SIZE}, per row', results)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,563 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+from argparse import ArgumentParser, ArgumentTypeError
+from asyncio import create_task, gather, run, sleep, to_thread
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager, suppress
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from itertools import count
+from multiprocessing import get_context
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from random import Random
+from time import perf_counter
+from typing import Any, Self
+from urllib.parse import urlsplit
+
+from httpx import AsyncClient, Response, TransportError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel
+
+from benchmarks.simulator import SCENARIOS, ProviderSimulator, ProviderStats
+from benchmarks.timer import percentiles
+from database.models.backfill import BackfillJob, ProviderUsage  # noqa: F401
+from database.models.brazil import StateAcronym, StateAcronymName
+
+KINDS = ('hit', 'miss', 'filter', 'mutation')
+
+SEEDED_ZIPCODES = 10_000_000  # seeded addresses are 10_000_001 and up
+MISS_ZIPCODES = 80_000_000  # never seeded, served by the simulator
+MUTATION_ZIPCODES = 90_000_000  # inserted by createAddress
+FIRST_IBGE = 1_000_000
+READY_TIMEOUT = 60  # seconds for the server process to warm up
+
+ALL_ADDRESS = """
+query ($filter: AddressFilterInput!, $pageSize: Int!) {
+	allAddress(filter: $filter, pageSize: $pageSize) {
+		zipcode neighborhood complement
+		city { ibge name ddd }
+		state { acronym name }
+	}
+}
+"""
+
+CREATE_ADDRESS = """
+mutation ($address: AddressInsertInput!) {
+	createAddress(address: $address) { zipcode }
+}
+"""
+
+
+def parse_mix(value: str) -> dict[str, int]:
+	"""
+	Parse --mix, e.g. hit=70,miss=10,filter=15,mutation=5.
+
+	Args:
+			value (str): comma separated kind=weight pairs, missing kinds weigh 0
+
+	Raises:
+			ArgumentTypeError: unknown kind, bad weight or all weights 0
+
+	Returns:
+			dict[str, int]: weight of every kind
+
+	"""
+	mix = dict.fromkeys(KINDS, 0)
+	for pair in value.split(','):
+		kind, _, weight = pair.partition('=')
+		if kind.strip() not in mix or not weight.strip().isdigit():
+			raise ArgumentTypeError(f'invalid mix entry {pair!r}')
+		mix[kind.strip()] = int(weight)
+	if not any(mix.values()):
+		raise ArgumentTypeError('at least one kind needs a weight')
+	return mix
+
+
+@contextmanager
+def postgres(url: str | None) -> Iterator[str]:
+	"""
+	Yield a database url, starting a throwaway container when url is None.
+
+	Same image as tests/integration/conftest.py, removed on exit.
+
+	Args:
+			url (str | None): existing postgresql+psycopg url, it is not cleaned up
+
+	"""
+	if url:
+		yield url
+		return
+
+	from testcontainers.postgres import PostgresContainer
+
+	with PostgresContainer(
+		'docker.io/library/postgres:16-alpine', driver='psycopg'
+	) as container:
+		yield container.get_connection_url()
+
+
+def configure(url: str) -> None:
+	"""
+	Point the app settings at the load test database.
+
+	Must run before anything imports utils.settings, the app engine reads
+	them on import. Background jobs stay off unless already configured.
+
+	Args:
+			url (str): postgresql+psycopg url
+
+	"""
+	parts = urlsplit(url)
+	os.environ.update(
+		DATABASE_USER=parts.username or '',
+		DATABASE_PASSWORD=parts.password or '',
+		DATABASE_HOST=parts.hostname or '',
+		DATABASE_PORT=str(parts.port or 5432),
+		DATABASE_NAME=parts.path.lstrip('/'),
+	)
+	os.environ.setdefault('DEV', '0')
+	os.environ.setdefault('BACKFILL_ENABLED', '0')
+	# the simulator does not check it, it just has to exist
+	os.environ.setdefault('CEP_ABERTO_TOKEN', 'simulated')
+
+
+async def seed(engine: AsyncEngine, addresses: int, cities: int) -> None:
+	"""
+	Create the tables and seed states, cities and addresses.
+
+	Every table of the app is created, the backfill ones too: the app
+	syncs the providers usage into provider_usage while it runs.
+
+	Rows are generated by postgres (generate_series) so millions of
+	addresses take seconds, not a round trip per batch. Seeding an
+	already seeded database is a no-op.
+
+	Args:
+			engine (AsyncEngine): load test database
+			addresses (int): addresses to seed, zipcodes from SEEDED_ZIPCODES + 1
+			cities (int): cities the addresses are spread over
+
+	"""
+	async with engine.begin() as conn:
+		await conn.run_sync(SQLModel.metadata.create_all)
+		if (await conn.execute(text('SELECT 1 FROM states LIMIT 1'))).first():
+			return
+
+		await conn.execute(
+			text(
+				'INSERT INTO states (id, acronym, name) '
+				'VALUES (gen_random_uuid(), :acronym, :name)'
+			),
+			[
+				{'acronym': acronym.name, 'name': StateAcronymName[acronym.name]}
+				for acronym in StateAcronym
+			],
+		)
+		await conn.execute(
+			text(
+				'INSERT INTO cities (id, ibge, name, ddd) '
+				"SELECT gen_random_uuid(), :first + g, 'City ' || g, 11 + g % 89 "
+				'FROM generate_series(1, :cities) AS g'
+			),
+			{'first': FIRST_IBGE, 'cities': cities},
+		)
+		await conn.execute(
+			text(
+				'INSERT INTO addresses (id, zipcode, state_id, city_id, '
+				'neighborhood, provider, updated_at) '
+				'SELECT gen_random_uuid(), :base + g, '
+				'state.ids[1 + g % array_length(state.ids, 1)], cities.id, '
+				"'Neighborhood ' || g % 500, 'viacep', now() "
+				'FROM generate_series(1, :addresses) AS g '
+				'CROSS JOIN (SELECT array_agg(id ORDER BY acronym) AS ids '
+				'FROM states) AS state '
+				'JOIN cities ON cities.ibge = :first + 1 + g % :cities'
+			),
+			{
+				'base': SEEDED_ZIPCODES,
+				'addresses': addresses,
+				'first': FIRST_IBGE,
+				'cities': cities,
+			},
+		)
+	async with engine.connect() as conn:
+		await conn.execute(text('ANALYZE'))
+
+
+class PoolWatch:
+	"""
+	Time connection checkouts of a sqlalchemy pool.
+
+	Info:
+			Wraps the pool _do_get, the wait includes opening a new
+			connection when the pool is not full yet.
+	"""
+
+	__slots__ = ('peak', 'pool', 'waits')
+
+	def __init__(self: Self, engine: AsyncEngine) -> None:
+		"""
+		Start watching the engine pool.
+
+		Args:
+				self (Self): scope of the class
+				engine (AsyncEngine): engine used by the app
+
+		"""
+		self.pool: Any = engine.sync_engine.pool
+		self.waits: list[float] = []
+		self.peak = 0
+		do_get = self.pool._do_get
+
+		def timed_get() -> Any:
+			start = perf_counter()
+			try:
+				return do_get()
+			finally:
+				self.waits.append(perf_counter() - start)
+				self.peak = max(self.peak, self.pool.checkedout())
+
+		self.pool._do_get = timed_get
+
+
+@dataclass(slots=True)
+class ServerStats:
+	"""What the server process measured, sent back when it stops."""
+
+	waits: list[float]
+	peak: int
+	providers: dict[str, ProviderStats]
+
+
+@dataclass(slots=True)
+class Traffic:
+	"""Request builders for every kind of traffic, reproducible by seed."""
+
+	addresses: int
+	cities: int
+	api: str
+	rng: Random
+	misses: Iterator[int] = field(default_factory=count)
+	inserts: Iterator[int] = field(default_factory=count)
+
+	def lookup(
+		self: Self, client: AsyncClient, zipcode: int
+	) -> Awaitable[Response]:
+		"""
+		Look up one zipcode through the REST or GraphQL api.
+
+		Args:
+				self (Self): scope of the class
+				client (AsyncClient): client bound to the app
+				zipcode (int): zipcode
+
+		Returns:
+				Awaitable[Response]: the request
+
+		"""
+		if self.api == 'rest':
+			return client.get(f'/zipcode/{zipcode}')
+		return client.post(
+			'/graphql',
+			json={
+				'query': ALL_ADDRESS,
+				'variables': {'filter': {'zipcode': zipcode}, 'pageSize': 1},
+			},
+		)
+
+	def hit(self: Self, client: AsyncClient) -> Awaitable[Response]:
+		"""Look up a stored zipcode, answered by the database."""
+		zipcode = SEEDED_ZIPCODES + self.rng.randint(1, self.addresses)
+		return self.lookup(client, zipcode)
+
+	def miss(self: Self, client: AsyncClient) -> Awaitable[Response]:
+		"""Look up a never seen zipcode, answered by the simulated providers."""
+		return self.lookup(client, MISS_ZIPCODES + next(self.misses))
+
+	def filter(self: Self, client: AsyncClient) -> Awaitable[Response]:
+		"""Query the addresses of a city, a page of 20."""
+		ibge = FIRST_IBGE + self.rng.randint(1, self.cities)
+		return client.post(
+			'/graphql',
+			json={
+				'query': ALL_ADDRESS,
+				'variables': {'filter': {'city': {'ibge': ibge}}, 'pageSize': 20},
+			},
+		)
+
+	def mutation(self: Self, client: AsyncClient) -> Awaitable[Response]:
+		"""Create an address in a seeded city."""
+		city = self.rng.randint(1, self.cities)
+		address = {
+			'zipcode': MUTATION_ZIPCODES + next(self.inserts),
+			'state': {'acronym': 'SP', 'name': 'São Paulo'},
+			'city': {'ibge': FIRST_IBGE + city, 'name': f'City {city}'},
+			'neighborhood': 'Load test',
+		}
+		return client.post(
+			'/graphql',
+			json={'query': CREATE_ADDRESS, 'variables': {'address': address}},
+		)
+
+
+def failed(response: Response) -> bool:
+	"""Server errors and GraphQL errors, a 404 miss is an answer."""
+	if response.status_code >= 500:  # noqa: PLR2004
+		return True
+	return response.request.method == 'POST' and 'errors' in response.json()
+
+
+async def drive(
+	client: AsyncClient,
+	traffic: Traffic,
+	mix: dict[str, int],
+	rps: float,
+	duration: float,
+) -> tuple[dict[str, list[float]], Counter[str], float]:
+	"""
+	Send requests open loop: on schedule, whether or not earlier ones finished.
+
+	A slow server shows up as latency, not as a lower request rate
+	hiding it (coordinated omission).
+
+	Args:
+			client (AsyncClient): client bound to the app
+			traffic (Traffic): request builders
+			mix (dict[str, int]): weight of every kind
+			rps (float): target requests per second
+			duration (float): seconds to send requests for
+
+	Returns:
+			tuple[dict[str, list[float]], Counter[str], float]: latencies
+					by kind, errors by kind and seconds until the last answer
+
+	"""
+	builders: dict[str, Callable[[AsyncClient], Awaitable[Response]]] = {
+		kind: getattr(traffic, kind) for kind in KINDS
+	}
+	kinds = [kind for kind in KINDS if mix[kind]]
+	weights = [mix[kind] for kind in kinds]
+	latencies: dict[str, list[float]] = defaultdict(list)
+	errors: Counter[str] = Counter()
+
+	async def send(kind: str, scheduled: float) -> None:
+		try:
+			response = await builders[kind](client)
+			if failed(response):
+				errors[kind] += 1
+		except Exception:
+			errors[kind] += 1
+		# from when it should have been sent, not from when it was sent
+		latencies[kind].append(perf_counter() - scheduled)
+
+	tasks = []
+	start = perf_counter()
+	for sent in range(int(rps * duration)):
+		scheduled = start + sent / rps
+		if (delay := scheduled - perf_counter()) > 0:
+			await sleep(delay)
+		kind = traffic.rng.choices(kinds, weights)[0]
+		tasks.append(create_task(send(kind, scheduled)))
+	await gather(*tasks)
+	return latencies, errors, perf_counter() - start
+
+
+def report(
+	latencies: dict[str, list[float]],
+	errors: Counter[str],
+	elapsed: float,
+	rps: float,
+	server: ServerStats,
+) -> None:
+	"""Print throughput, latency by kind, pool wait and provider calls."""
+	total = sum(len(samples) for samples in latencies.values())
+	print(f'{total} requests in {elapsed:.2f}s, target {rps:g} rps')
+	print(f'  throughput  {total / elapsed:>10.1f} rps')
+	for kind in KINDS:
+		if samples := latencies.get(kind):
+			cuts = '  '.join(
+				f'{name} {value:>8.1f}' for name, value in percentiles(samples).items()
+			)
+			print(f'  {kind:<9} {len(samples):>7} req {errors[kind]:>5} err  {cuts} ms')
+	cuts = '  '.join(
+		f'{name} {value:>8.1f}' for name, value in percentiles(server.waits).items()
+	)
+	checkouts = len(server.waits)
+	print(f'  pool wait {checkouts:>7} checkouts, peak {server.peak}  {cuts} ms')
+	for host, stats in server.providers.items():
+		print(f'  {host}: {stats.calls} calls {dict(stats.outcomes)}')
+
+
+def serve(args: Any, conn: Connection) -> None:
+	"""
+	Serve the app with uvicorn and the simulated providers until told to stop.
+
+	Runs in its own process: any message on conn (or the load generator
+	going away) stops the server, then its ServerStats are sent back.
+
+	Args:
+			args (Any): parsed command line
+			conn (Connection): pipe to the load generator
+
+	"""
+	# imported in the server process, they read the settings on import
+	from uvicorn import Config, Server
+
+	from api.app import app
+	from database.engine import engine
+	from plugins.client import http_client
+
+	profiles = SCENARIOS[args.scenario]
+	simulator = ProviderSimulator(
+		viacep=profiles.get('viacep'),
+		cep_aberto=profiles.get('cep_aberto'),
+		seed=args.seed,
+	)
+	http_client.transport = simulator
+	pool = PoolWatch(engine)
+	server = Server(
+		Config(app, host='127.0.0.1', port=args.port, log_level='warning')
+	)
+
+	async def until_stopped() -> None:
+		serving = create_task(server.serve())
+		with suppress(EOFError):
+			await to_thread(conn.recv)
+		server.should_exit = True
+		await serving
+
+	run(until_stopped())
+	conn.send(ServerStats(pool.waits, pool.peak, simulator.stats))
+	conn.close()
+
+
+async def send_traffic(
+	args: Any, server: BaseProcess
+) -> tuple[dict[str, list[float]], Counter[str], float]:
+	"""
+	Wait for the server to be ready, then drive the traffic.
+
+	Args:
+			args (Any): parsed command line
+			server (BaseProcess): process running serve
+
+	Raises:
+			RuntimeError: If the server exits or is not ready in time
+
+	Returns:
+			tuple[dict[str, list[float]], Counter[str], float]: see drive
+
+	"""
+	traffic = Traffic(args.addresses, args.cities, args.api, Random(args.seed))
+	async with AsyncClient(
+		base_url=f'http://127.0.0.1:{args.port}', timeout=args.timeout
+	) as client:
+		deadline = perf_counter() + READY_TIMEOUT
+		while True:
+			if not server.is_alive():
+				raise RuntimeError('the server process exited')
+			if perf_counter() > deadline:
+				raise RuntimeError(f'the server was not ready in {READY_TIMEOUT}s')
+			try:
+				if (await client.get('/ready')).status_code == HTTPStatus.OK:
+					break
+			except TransportError:
+				pass
+			await sleep(0.1)
+		return await drive(client, traffic, args.mix, args.rps, args.duration)
+
+
+def load_test(url: str, args: Any) -> None:
+	"""
+	Seed the database, serve the app in a process and drive the traffic.
+
+	The server (uvicorn, the app and the simulated providers) runs in its
+	own process, so the load generator does not compete for its event
+	loop. Both share the machine: compare runs made on the same one only.
+
+	Args:
+			url (str): load test database url, settings already point at it
+			args (Any): parsed command line
+
+	"""
+	seed_engine = create_async_engine(url)
+	start = perf_counter()
+	run(seed(seed_engine, args.addresses, args.cities))
+	run(seed_engine.dispose())
+	print(f'seeded {args.addresses} addresses in {perf_counter() - start:.1f}s')
+
+	# spawn, not fork: the server imports the app in a clean interpreter
+	context = get_context('spawn')
+	conn, server_conn = context.Pipe()
+	server = context.Process(
+		target=serve, args=(args, server_conn), name='server'
+	)
+	server.start()
+	server_conn.close()
+	try:
+		results = run(send_traffic(args, server))
+	finally:
+		# not a signal, uvicorn raises it again once shut down
+		conn.send('stop')
+	stats: ServerStats = conn.recv()
+	server.join()
+	report(*results, args.rps, stats)
+
+
+def main() -> None:
+	"""
+	End-to-end load test against a throwaway Postgres and simulated providers.
+
+	Needs docker (or podman, see the test task) unless --database-url is given.
+
+	Run with: python -m benchmarks.load_test --addresses 1000000 --rps 300
+	"""
+	parser = ArgumentParser(description=main.__doc__)
+	parser.add_argument('--addresses', type=int, default=100_000)
+	parser.add_argument('--cities', type=int, default=5_570)
+	parser.add_argument('--rps', type=float, default=100)
+	parser.add_argument('--duration', type=float, default=30)
+	parser.add_argument(
+		'--mix',
+		type=parse_mix,
+		default=parse_mix('hit=70,miss=10,filter=15,mutation=5'),
+	)
+	parser.add_argument('--api', choices=('rest', 'graphql'), default='rest')
+	parser.add_argument('--scenario', choices=SCENARIOS, default='healthy')
+	parser.add_argument(
+		'--database-url', help='use this database, not a container'
+	)
+	parser.add_argument('--port', type=int, default=8765)
+	parser.add_argument('--timeout', type=float, default=30)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+	if args.addresses >= MISS_ZIPCODES - SEEDED_ZIPCODES:
+		parser.error('--addresses would overlap the zipcodes used for misses')
+
+	with postgres(args.database_url) as url:
+		configure(url)
+		load_test(url, args)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,256 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep
+from collections import Counter, deque
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+from math import log
+from random import Random
+from time import monotonic
+from typing import Self, TypeAlias
+
+from httpx import AsyncBaseTransport, ReadTimeout, Request, Response
+
+from database.models.brazil import StateAcronym, StateAcronymName
+
+# mypy does not support the type statement yet
+Latency: TypeAlias = Callable[[Random], float]  # noqa: UP040
+
+VIACEP_HOST = 'viacep.com.br'
+CEP_ABERTO_HOST = 'www.cepaberto.com'
+
+
+def constant(seconds: float) -> Latency:
+	"""Return the same latency every time."""
+	return lambda _: seconds
+
+
+def uniform(low: float, high: float) -> Latency:
+	"""Sample latency uniformly between low and high seconds."""
+	return lambda rng: rng.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Latency:
+	"""
+	Long tailed latency, the usual shape of a public api.
+
+	Args:
+			median (float): median latency in seconds
+			sigma (float, optional): spread of the tail. Defaults to 0.5.
+
+	Returns:
+			Latency: sampler
+
+	"""
+	mu = log(median) if median > 0 else 0.0
+	return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+@dataclass(slots=True)
+class ProviderProfile:
+	"""
+	Behavior of one simulated provider.
+
+	Info:
+			Every request sleeps latency(rng) and then, in this order, may be
+			throttled (403 when more than rate_limit requests arrived in the
+			last second), time out (sleeps timeout and raises ReadTimeout),
+			fail (500) or miss (ViaCep {"erro": true} / CepAberto {}).
+	"""
+
+	latency: Latency = field(default_factory=lambda: lognormal(0.08))
+	error_rate: float = 0.0
+	timeout_rate: float = 0.0
+	not_found_rate: float = 0.0
+	rate_limit: int | None = None
+	timeout: float = 5.0
+
+
+@dataclass(slots=True)
+class ProviderStats:
+	calls: int = 0
+	outcomes: Counter[str] = field(default_factory=Counter)
+
+
+class ProviderSimulator(AsyncBaseTransport):
+	"""
+	Httpx transport serving ViaCep and CepAberto shaped responses offline.
+
+	Use it with plugins.client.http_client.transport = ProviderSimulator()
+	"""
+
+	__slots__ = ('_rng', '_windows', 'profiles', 'stats')
+
+	def __init__(
+		self: Self,
+		viacep: ProviderProfile | None = None,
+		cep_aberto: ProviderProfile | None = None,
+		seed: int = 0,
+	) -> None:
+		"""
+		Configure both providers.
+
+		Args:
+				viacep (ProviderProfile | None, optional): ViaCep behavior.
+						Defaults to a healthy provider.
+				cep_aberto (ProviderProfile | None, optional): CepAberto behavior.
+						Defaults to a healthy provider limited to 1 request/second,
+						like the real service.
+				seed (int, optional): random seed, runs are reproducible.
+						Defaults to 0.
+
+		"""
+		self.profiles = {
+			VIACEP_HOST: viacep or ProviderProfile(),
+			CEP_ABERTO_HOST: cep_aberto or ProviderProfile(rate_limit=1),
+		}
+		self.stats = {host: ProviderStats() for host in self.profiles}
+		self._windows: dict[str, deque[float]] = {
+			host: deque() for host in self.profiles
+		}
+		self._rng = Random(seed)
+
+	def _throttled(self: Self, host: str, limit: int | None) -> bool:
+		"""Sliding one second window, True if the request is over the limit."""
+		if limit is None:
+			return False
+		now = monotonic()
+		window = self._windows[host]
+		while window and now - window[0] >= 1:
+			window.popleft()
+		if len(window) >= limit:
+			return True
+		window.append(now)
+		return False
+
+	async def handle_async_request(self: Self, request: Request) -> Response:
+		"""
+		Answer like the provider behind request.url.host.
+
+		Args:
+				request (Request): request made by a plugin
+
+		Raises:
+				ReadTimeout: when the request is chosen to time out
+
+		Returns:
+				Response: provider shaped response
+
+		"""
+		host = request.url.host
+		if host not in self.profiles:
+			return Response(404, request=request)
+
+		profile = self.profiles[host]
+		stats = self.stats[host]
+		stats.calls += 1
+		await sleep(profile.latency(self._rng))
+
+		roll = self._rng.random()
+		timeout = profile.timeout_rate
+		error = timeout + profile.error_rate
+		not_found = error + profile.not_found_rate
+		if self._throttled(host, profile.rate_limit):
+			outcome, response = 'throttled', Response(403, request=request)
+		elif roll < timeout:
+			stats.outcomes['timeout'] += 1
+			await sleep(profile.timeout)
+			raise ReadTimeout('Simulated timeout', request=request)
+		elif roll < error:
+			outcome, response = 'error', Response(500, request=request)
+		elif roll < not_found:
+			body: Mapping[str, object] = {'erro': True} if host == VIACEP_HOST else {}
+			outcome, response = 'not_found', Response(200, json=body, request=request)
+		else:
+			zipcode = int(
+				request.url.params['cep']
+				if host == CEP_ABERTO_HOST
+				else request.url.path.split('/')[2]
+			)
+			if host == VIACEP_HOST:
+				body = _viacep_body(zipcode)
+			else:
+				body = _cep_aberto_body(zipcode)
+			outcome, response = 'ok', Response(200, json=body, request=request)
+
+		stats.outcomes[outcome] += 1
+		return response
+
+
+def _state(zipcode: int) -> StateAcronym:
+	"""Deterministic state for a zipcode, spreads the load over all states."""
+	states = list(StateAcronym)
+	return StateAcronym(states[zipcode % len(states)])
+
+
+def _viacep_body(zipcode: int) -> dict[str, str]:
+	"""ViaCep shaped payload."""
+	acronym = _state(zipcode)
+	return {
+		'cep': f'{zipcode:08}'[:5] + '-' + f'{zipcode:08}'[5:],
+		'logradouro': f'Rua {zipcode}',
+		'complemento': '',
+		'bairro': 'Centro',
+		'localidade': getattr(StateAcronymName, acronym).value,
+		'uf': acronym.value,
+		'ibge': str(1_000_000 + zipcode % 8_999_999),
+		'gia': '',
+		'ddd': str(11 + zipcode % 89),
+		'siafi': '0000',
+	}
+
+
+def _cep_aberto_body(zipcode: int) -> dict[str, object]:
+	"""CepAberto shaped payload."""
+	acronym = _state(zipcode)
+	return {
+		'altitude': 760.0,
+		'cep': f'{zipcode:08}',
+		'latitude': '-23.5479099981',
+		'longitude': '-46.636',
+		'logradouro': f'Rua {zipcode}',
+		'bairro': 'Centro',
+		'complemento': '',
+		'cidade': {
+			'ddd': 11 + zipcode % 89,
+			'ibge': str(1_000_000 + zipcode % 8_999_999),
+			'nome': getattr(StateAcronymName, acronym).value,
+		},
+		'estado': {'sigla': acronym.value},
+	}
+
+
+# named provider behaviors shared by the benchmarks
+SCENARIOS: dict[str, dict[str, ProviderProfile]] = {
+	'healthy': {},
+	'slow_viacep': {
+		'viacep': ProviderProfile(latency=lognormal(0.6, 0.8)),
+	},
+	'flaky': {
+		'viacep': ProviderProfile(error_rate=0.1, timeout_rate=0.02, timeout=2),
+		'cep_aberto': ProviderProfile(rate_limit=1, error_rate=0.1),
+	},
+	'viacep_down': {
+		'viacep': ProviderProfile(latency=constant(0.01), error_rate=1),
+	},
+	'no_results': {
+		'viacep': ProviderProfile(not_found_rate=1),
+		'cep_aberto': ProviderProfile(rate_limit=1, not_found_rate=1),
+	},
+}
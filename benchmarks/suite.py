@@ -0,0 +1,304 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import platform
+import sys
+from argparse import ArgumentParser
+from asyncio import run
+from collections.abc import Awaitable, Callable
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Self
+from unittest.mock import patch
+
+from httpx import ASGITransport, AsyncClient
+from strawberry import Schema
+
+from api.address.graphql_inputs import AddressFilterInput, StateInput
+from api.address.graphql_types import AddressType
+from api.app import app
+from api.document_cache import DocumentCache
+from api.schema import Mutation, Query
+from benchmarks.bench_plugins import CEP_ABERTO_PAYLOAD, VIACEP_PAYLOAD
+from benchmarks.bench_rest import (
+	ADDRESS,
+	QUERY,
+	ROW,
+	no_session,
+	stored_address,
+	stored_rows,
+)
+from benchmarks.timer import measure, measure_async
+from database import functions
+from database.engine import get_session
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord
+from plugins.cep_aberto.cep_aberto import CepAberto
+from plugins.viacep.viacep import ViaCep
+
+BASELINES = Path(__file__).parent / 'baselines'
+
+FILTER = AddressFilterInput(
+	neighborhood='Sé', state=StateInput(acronym=StateAcronym.SP, name=None)
+)
+FIELDS = frozenset({'zipcode', 'neighborhood', 'city', 'city.name'})
+VARIABLES = {'zipcode': 1001000}
+
+SyncCase = tuple[Callable[[], object], int]
+AsyncCase = tuple[Callable[[], Awaitable[object]], int]
+
+
+class EmptySession:
+	"""Session that runs nothing, so only the query construction is timed."""
+
+	async def exec(self: Self, _: object) -> Self:
+		"""Return itself as the result."""
+		return self
+
+	def unique(self: Self) -> Self:
+		"""Return itself as the result."""
+		return self
+
+	def all(self: Self) -> list[Any]:
+		"""No rows."""
+		return []
+
+
+class Context:
+	session = None
+
+
+def sync_cases() -> dict[str, SyncCase]:
+	"""Hot functions, fixed inputs: name -> (function, calls per round)."""
+	record = ViaCep._request_to_record(VIACEP_PAYLOAD)
+	return {
+		'viacep._request_to_record': (
+			lambda: ViaCep._request_to_record(VIACEP_PAYLOAD),
+			10_000,
+		),
+		'cep_aberto._request_to_record': (
+			lambda: CepAberto._request_to_record(CEP_ABERTO_PAYLOAD),
+			10_000,
+		),
+		'AddressRecord.to_model': (record.to_model, 10_000),
+		'AddressRecord.from_model': (
+			lambda: AddressRecord.from_model(ADDRESS),
+			10_000,
+		),
+		'AddressRecord.from_row': (lambda: AddressRecord.from_row(ROW), 10_000),
+		'AddressType.from_pydantic': (
+			lambda: AddressType.from_pydantic(ADDRESS),
+			2_000,
+		),
+		'functions.address_conditions': (
+			lambda: functions.address_conditions(FILTER),
+			10_000,
+		),
+	}
+
+
+def query_cases() -> dict[str, AsyncCase]:
+	"""Query builders, nothing is executed: name -> (coroutine, calls)."""
+	session = EmptySession()
+	return {
+		'functions.get_address_by_dc_join_state_join_city': (
+			lambda: functions.get_address_by_dc_join_state_join_city(
+				session,  # type: ignore[arg-type]
+				FILTER,
+			),
+			2_000,
+		),
+		'functions.get_address_rows': (
+			lambda: functions.get_address_rows(
+				session,  # type: ignore[arg-type]
+				FILTER,
+				FIELDS,
+			),
+			2_000,
+		),
+	}
+
+
+def lookup_cases(client: AsyncClient, schema: Schema) -> dict[str, AsyncCase]:
+	"""
+	Full lookups, the database replaced by fixed rows.
+
+	Args:
+			client (AsyncClient): client of the FastAPI app
+			schema (Schema): schema with the document cache
+
+	Returns:
+			dict[str, AsyncCase]: name -> (coroutine function, calls per round)
+
+	"""
+	graphql = client.build_request(
+		'POST', '/graphql', json={'query': QUERY, 'variables': VARIABLES}
+	)
+	rest = client.build_request('GET', '/zipcode/1001000')
+	return {
+		'schema.execute allAddress': (
+			lambda: schema.execute(
+				QUERY, variable_values=VARIABLES, context_value=Context()
+			),
+			1_000,
+		),
+		'app POST /graphql': (lambda: client.send(graphql), 500),
+		'app GET /zipcode': (lambda: client.send(rest), 500),
+	}
+
+
+async def run_async(pattern: str, rounds: int) -> dict[str, float]:
+	"""
+	Time the async cases matching pattern.
+
+	Args:
+			pattern (str): only names containing it
+			rounds (int): rounds per case, the best one is kept
+
+	Returns:
+			dict[str, float]: name -> microseconds per call
+
+	"""
+	results = {}
+	for name, (func, number) in query_cases().items():
+		if pattern in name:
+			results[name] = await measure_async(func, number, rounds)
+
+	with ExitStack() as stack:
+		stack.enter_context(
+			patch.object(
+				functions,
+				'get_address_by_dc_join_state_join_city',
+				stored_address,
+			)
+		)
+		stack.enter_context(patch.object(functions, 'get_address_rows', stored_rows))
+		stack.enter_context(
+			patch.dict(app.dependency_overrides, {get_session: no_session})
+		)
+		schema = Schema(query=Query, mutation=Mutation, extensions=[DocumentCache])
+		transport = ASGITransport(app=app)  # type: ignore[arg-type]
+		async with AsyncClient(
+			transport=transport, base_url='http://bench'
+		) as client:
+			for name, (func, number) in lookup_cases(client, schema).items():
+				if pattern in name:
+					await func()
+					results[name] = await measure_async(func, number, rounds)
+			return results
+
+
+def run_suite(pattern: str = '', rounds: int = 5) -> dict[str, float]:
+	"""
+	Time every case whose name contains pattern.
+
+	Args:
+			pattern (str, optional): only names containing it. Defaults to ''.
+			rounds (int, optional): rounds per case, the best one is kept.
+					Defaults to 5.
+
+	Returns:
+			dict[str, float]: name -> microseconds per call
+
+	"""
+	results = {
+		name: measure(func, number, rounds)
+		for name, (func, number) in sync_cases().items()
+		if pattern in name
+	}
+	results.update(run(run_async(pattern, rounds)))
+	return results
+
+
+def compare(
+	results: dict[str, float], baseline: dict[str, float], threshold: float
+) -> list[str]:
+	"""
+	Print results next to the baseline and flag the regressions.
+
+	Args:
+			results (dict[str, float]): name -> microseconds per call
+			baseline (dict[str, float]): same, saved before
+			threshold (float): slowdown allowed, 0.15 = 15%
+
+	Returns:
+			list[str]: names slower than the baseline beyond threshold
+
+	"""
+	regressions = []
+	width = max(map(len, results))
+	print(f'  {"case":<{width}}  {"us/op":>10}  {"baseline":>10}  change')
+	for name, value in results.items():
+		before = baseline.get(name)
+		if before is None:
+			print(f'  {name:<{width}}  {value:>10.2f}  {"-":>10}')
+			continue
+		change = value / before - 1
+		flag = ''
+		if change > threshold:
+			regressions.append(name)
+			flag = '  REGRESSION'
+		print(
+			f'  {name:<{width}}  {value:>10.2f}  {before:>10.2f}  {change:>+6.1%}{flag}'
+		)
+	return regressions
+
+
+def main() -> None:
+	"""
+	Microbenchmarks of the hot paths, with saved baselines.
+
+	Save a baseline on a release, then compare a change against it, on the
+	same machine (the exit status is 1 when something regressed):
+	python -m benchmarks.suite --save main
+	python -m benchmarks.suite --compare main
+	"""
+	parser = ArgumentParser(description=main.__doc__)
+	parser.add_argument('-k', '--filter', default='', help='only cases with it')
+	parser.add_argument('--rounds', type=int, default=5)
+	parser.add_argument('--save', metavar='NAME', help='save as a baseline')
+	parser.add_argument('--compare', metavar='NAME', help='compare to a baseline')
+	parser.add_argument(
+		'--threshold', type=float, default=0.15, help='slowdown allowed'
+	)
+	args = parser.parse_args()
+
+	baseline: dict[str, Any] = {'results': {}}
+	if args.compare:
+		baseline = json.loads((BASELINES / f'{args.compare}.json').read_text())
+		if baseline['python'] != platform.python_version():
+			print(f'baseline ran on python {baseline["python"]}')
+
+	results = run_suite(args.filter, args.rounds)
+	regressions = compare(results, baseline['results'], args.threshold)
+
+	if args.save:
+		BASELINES.mkdir(exist_ok=True)
+		(BASELINES / f'{args.save}.json').write_text(
+			json.dumps(
+				{'python': platform.python_version(), 'results': results}, indent=2
+			)
+		)
+	if regressions:
+		print(f'{len(regressions)} regression(s) over {args.threshold:.0%}')
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
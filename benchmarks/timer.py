@@ -0,0 +1,109 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import gc
+from collections.abc import Awaitable, Callable
+from statistics import quantiles
+from time import perf_counter
+from timeit import repeat
+
+
+def measure(
+	func: Callable[[], object], number: int = 10_000, rounds: int = 5
+) -> float:
+	"""
+	Time a callable the way timeit does, keeping the best round.
+
+	Args:
+			func (Callable[[], object]): code under test, called without arguments
+			number (int, optional): calls per round. Defaults to 10_000.
+			rounds (int, optional): how many rounds. Defaults to 5.
+
+	Returns:
+			float: best time per call in microseconds
+
+	"""
+	return min(repeat(func, number=number, repeat=rounds)) / number * 1e6
+
+
+async def measure_async(
+	func: Callable[[], Awaitable[object]], number: int = 1_000, rounds: int = 5
+) -> float:
+	"""
+	Async version of measure, awaited on the running loop with gc off.
+
+	Args:
+			func (Callable[[], Awaitable[object]]): code under test, called
+					without arguments
+			number (int, optional): calls per round. Defaults to 1_000.
+			rounds (int, optional): how many rounds. Defaults to 5.
+
+	Returns:
+			float: best time per call in microseconds
+
+	"""
+	best = float('inf')
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		for _ in range(rounds):
+			start = perf_counter()
+			for _ in range(number):
+				await func()
+			best = min(best, perf_counter() - start)
+	finally:
+		if enabled:
+			gc.enable()
+	return best / number * 1e6
+
+
+def report(title: str, results: dict[str, float]) -> None:
+	"""
+	Print one line per result, in microseconds per call.
+
+	Args:
+			title (str): benchmark name
+			results (dict[str, float]): label -> microseconds per call
+
+	"""
+	print(title)
+	width = max(map(len, results))
+	for label, value in results.items():
+		print(f'  {label:<{width}}  {value:>10.2f} us/op')
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+	"""
+	Summarize latency samples.
+
+	Args:
+			samples (list[float]): latencies in seconds
+
+	Returns:
+			dict[str, float]: p50, p95, p99 and max in milliseconds
+
+	"""
+	if len(samples) < 2:  # noqa: PLR2004
+		samples = samples * 2 or [0.0, 0.0]
+	cuts = quantiles(samples, n=100, method='inclusive')
+	return {
+		'p50': cuts[49] * 1e3,
+		'p95': cuts[94] * 1e3,
+		'p99': cuts[98] * 1e3,
+		'max': max(samples) * 1e3,
+	}
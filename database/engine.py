@@ -21,6 +21,7 @@ from collections.abc import AsyncGenerator
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from database.slow_queries import slow_queries
 from utils.settings import settings
 
 engine = create_async_engine(
@@ -31,6 +32,7 @@ engine = create_async_engine(
 	max_overflow=20,
 	pool_recycle=3600,
 )
+slow_queries.instrument(engine)
 
 
 async def get_session() -> (
@@ -16,13 +16,28 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from collections.abc import AsyncIterator, Collection, Mapping, Sequence
+from datetime import date, datetime, timedelta
+from typing import Any
+from uuid import UUID
+
 from fastapi import HTTPException
-from pydantic import PositiveInt
-from sqlmodel import select
+from pydantic import PositiveInt, ValidationError
+from sqlalchemy import ColumnElement, Row
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import col, func, or_, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from api.address.graphql_inputs import AddressFilterInput, AddressInsertInput
-from database.models.brazil import Address, City, State
+from database.models.backfill import (
+	BackfillJob,
+	BackfillPredicate,
+	BackfillStatus,
+	ProviderUsage,
+)
+from database.models.brazil import Address, AddressBase, City, State
+from database.models.records import AddressRecord, CityRecord, StateRecord
+from database.reference import reference
 
 
 async def page_to_offset(
@@ -44,6 +59,38 @@ async def page_to_offset(
 	return page_size * (page_number - 1)
 
 
+def address_conditions(
+	filter: AddressFilterInput,
+) -> list[ColumnElement[bool]]:
+	"""
+	Translate the strawberry filter into where clauses.
+
+	A zipcode is unique, so the other filters are ignored when it is set.
+	City and state clauses need their tables joined by the caller.
+
+	Args:
+			filter (AddressFilterInput): Strawberry input dataclass,
+					everything can be None (based on sqlmodel model)
+
+	Returns:
+			list[ColumnElement[bool]]: clauses, all of them must match
+
+	"""
+	if filter.zipcode:
+		return [Address.zipcode == filter.zipcode]
+
+	conditions: list[ColumnElement[bool]] = []
+	if filter.neighborhood:
+		conditions.append(Address.neighborhood == filter.neighborhood)
+	if filter.complement:
+		conditions.append(Address.complement == filter.complement)
+	if filter.city:
+		conditions.append(City.ibge == filter.city.ibge)
+	if filter.state:
+		conditions.append(State.acronym == filter.state.acronym.value)
+	return conditions
+
+
 async def get_address_by_dc_join_state_join_city(
 	session: AsyncSession,
 	filter: AddressFilterInput,
@@ -74,23 +121,79 @@ async def get_address_by_dc_join_state_join_city(
 		.offset(await page_to_offset(page_size, page_number))
 	)
 
-	if filter.zipcode:
-		query = query.where(Address.zipcode == filter.zipcode)
-	else:
-		if filter.neighborhood:
-			query = query.where(Address.neighborhood == filter.neighborhood)
-		if filter.complement:
-			query = query.where(Address.complement == filter.complement)
+	if not filter.zipcode:
 		if filter.city:
-			query = query.join(City).where(City.ibge == filter.city.ibge)
+			query = query.join(City)
 		if filter.state:
-			query = query.join(State).where(State.acronym == filter.state.acronym.value)
+			query = query.join(State)
+	query = query.where(*address_conditions(filter))
 	adresses_result = await session.exec(query)
 	addresses = adresses_result.unique().all()
 
 	return list(addresses)
 
 
+# GraphQL field path -> column, labels as in AddressRecord.from_row
+PROJECTIONS: dict[str, ColumnElement[Any]] = {
+	'neighborhood': col(Address.neighborhood).label('neighborhood'),
+	'complement': col(Address.complement).label('complement'),
+	'coordinates': col(Address.coordinates).label('coordinates'),
+	'city': col(City.ibge).label('city_ibge'),
+	'city.name': col(City.name).label('city_name'),
+	'city.ddd': col(City.ddd).label('city_ddd'),
+	'state': col(State.acronym).label('state_acronym'),
+	'state.name': col(State.name).label('state_name'),
+}
+
+
+async def get_address_rows(
+	session: AsyncSession,
+	filter: AddressFilterInput,
+	fields: Collection[str],
+	page_size: PositiveInt = 10,
+	page_number: PositiveInt = 1,
+) -> Sequence[Row[Any]]:
+	"""
+	Query addresses by the strawberry dataclass, reading only some columns.
+
+	Cities and states are joined only when selected or filtered. zipcode,
+	provider and updated_at are always read, refresh needs them.
+
+	Args:
+			session (AsyncSession): get the session of database from get_session
+			filter (AddressFilterInput): Strawberry input dataclass,
+					everything can be None (based on sqlmodel model)
+			fields (Collection[str]): selected fields, see api.lookahead
+			page_size (PositiveInt, optional): How many elements in each page.
+					Defaults to 10.
+			page_number (PositiveInt, optional): Number of the page. Defaults to 1.
+
+	Returns:
+			Sequence[Row[Any]]: rows for AddressRecord.from_row
+
+	"""
+	columns: list[ColumnElement[Any]] = [
+		col(Address.zipcode).label('zipcode'),
+		col(Address.provider).label('provider'),
+		col(Address.updated_at).label('updated_at'),
+	]
+	columns += [column for path, column in PROJECTIONS.items() if path in fields]
+	query = (
+		select(*columns)
+		.limit(page_size)
+		.offset(await page_to_offset(page_size, page_number))
+	)
+
+	filtered = not filter.zipcode
+	if 'city' in fields or (filtered and filter.city):
+		query = query.join(City)
+	if 'state' in fields or (filtered and filter.state):
+		query = query.join(State)
+	query = query.where(*address_conditions(filter))
+	result = await session.exec(query)
+	return result.all()
+
+
 async def insert_address_by_dc(
 	session: AsyncSession, address: AddressInsertInput
 ) -> Address:
@@ -132,15 +235,22 @@ async def insert_address_by_dc(
 	return address_model
 
 
-async def insert_address(session: AsyncSession, address: Address) -> None:
+async def insert_address(
+	session: AsyncSession, address_record: AddressRecord, provider: str
+) -> None:
 	"""
 	Insert addresses and city if not exists in background.
 
 	Args:
 			session (AsyncSession): the session of database from get_session
-			address (Address): Address instance based on database models
+			address_record (AddressRecord): Address record from plugins,
+					the database model is only materialized here
+			provider (str): plugin that found the address
 
 	"""
+	address = address_record.to_model()
+	address.provider = provider
+
 	state_query = select(State).where(
 		State.acronym == address.state.acronym.value
 	)
@@ -156,3 +266,367 @@ async def insert_address(session: AsyncSession, address: Address) -> None:
 
 	session.add(address)
 	await session.commit()
+
+
+async def insert_addresses(
+	session: AsyncSession, addresses: Sequence[AddressInsertInput]
+) -> list[AddressRecord | str]:
+	"""
+	Create many addresses by the strawberry dataclasses, in one transaction.
+
+	States and cities are read with one query each (none once
+	database.reference is loaded), and every valid address
+	is written with a single multi-row INSERT ... ON CONFLICT DO NOTHING,
+	so a zipcode already stored is reported instead of failing the batch.
+
+	Args:
+			session (AsyncSession): get the session of database from get_session
+			addresses (Sequence[AddressInsertInput]): Strawberry input
+					dataclasses, strict (based on sqlmodel model)
+
+	Returns:
+			list[AddressRecord | str]: for each address, in the same order,
+					the inserted record or the error message
+
+	"""
+	results: list[AddressRecord | str] = []
+	models: list[Address] = []
+	seen: set[int] = set()
+	for address in addresses:
+		model = address.to_pydantic()
+		try:
+			AddressBase.model_validate(
+				model.model_dump(
+					include={'zipcode', 'neighborhood', 'complement', 'coordinates'}
+				)
+			)
+		except ValidationError as error:
+			results.append(
+				'; '.join(
+					f'{".".join(map(str, detail["loc"]))}: {detail["msg"]}'
+					for detail in error.errors()
+				)
+			)
+			continue
+		if model.zipcode in seen:
+			results.append('Duplicated zipcode')
+			continue
+		seen.add(model.zipcode)
+		results.append('')
+		models.append(model)
+
+	states = await reference.get_states(
+		session, {model.state.acronym for model in models}
+	)
+	cities = await reference.get_cities(
+		session, {model.city.ibge for model in models}
+	)
+
+	rows: list[dict[str, object]] = []
+	records: dict[int, AddressRecord] = {}
+	for model in models:
+		city = cities.get(model.city.ibge)
+		if not city:
+			continue
+		state = states[model.state.acronym]
+		rows.append(
+			{
+				'id': model.id,
+				'zipcode': model.zipcode,
+				'state_id': state.id,
+				'city_id': city.id,
+				'neighborhood': model.neighborhood,
+				'complement': model.complement,
+				'coordinates': model.coordinates,
+				'updated_at': model.updated_at,
+			}
+		)
+		records[model.zipcode] = AddressRecord(
+			zipcode=model.zipcode,
+			state=StateRecord(acronym=state.acronym, name=state.name),
+			city=CityRecord(ibge=city.ibge, name=city.name, ddd=city.ddd),
+			neighborhood=model.neighborhood,
+			complement=model.complement,
+			coordinates=model.coordinates,
+			updated_at=model.updated_at,
+		)
+
+	inserted: set[int] = set()
+	if rows:
+		query = (
+			insert(Address)
+			.on_conflict_do_nothing(index_elements=['zipcode'])
+			.returning(col(Address.zipcode))
+		)
+		inserted = set((await session.execute(query, rows)).scalars())
+		await session.commit()
+
+	it = iter(models)
+	for index, result in enumerate(results):
+		if result:
+			continue
+		model = next(it)
+		if model.city.ibge not in cities:
+			results[index] = 'City not found'
+		elif model.zipcode not in inserted:
+			results[index] = 'Address already exists'
+		else:
+			results[index] = records[model.zipcode]
+	return results
+
+
+async def update_address(
+	session: AsyncSession, address_record: AddressRecord, provider: str
+) -> bool:
+	"""
+	Update a stored address with a plugin result, only if something changed.
+
+	Fields the plugin does not have (None) never erase stored values.
+
+	Args:
+			session (AsyncSession): the session of database
+			address_record (AddressRecord): Address record from plugins
+			provider (str): plugin that found the address
+
+	Returns:
+			bool: True if the address was changed and committed
+
+	"""
+	query = select(Address).where(Address.zipcode == address_record.zipcode)
+	address_result = await session.exec(query)
+	address = address_result.one_or_none()
+	if not address:
+		return False
+
+	changes: dict[str, object] = {
+		field: value
+		for field, value in (
+			('neighborhood', address_record.neighborhood),
+			('complement', address_record.complement),
+			('coordinates', address_record.coordinates),
+		)
+		if value is not None and value != getattr(address, field)
+	}
+
+	if address_record.city and address_record.city.ibge != address.city.ibge:
+		city_query = select(City).where(City.ibge == address_record.city.ibge)
+		city_result = await session.exec(city_query)
+		changes['city'] = city_result.one_or_none() or City(
+			ibge=address_record.city.ibge,
+			name=address_record.city.name,
+			ddd=address_record.city.ddd,
+		)
+
+	if (
+		address_record.state
+		and address_record.state.acronym != address.state.acronym
+	):
+		state_query = select(State).where(
+			State.acronym == address_record.state.acronym.value
+		)
+		state_result = await session.exec(state_query)
+		changes['state'] = state_result.one()
+
+	if not changes:
+		return False
+
+	for field, value in changes.items():
+		setattr(address, field, value)
+	address.provider = provider
+
+	session.add(address)
+	await session.commit()
+
+	return True
+
+
+async def address_exists(session: AsyncSession, zipcode: int) -> bool:
+	"""
+	Check if a zipcode is stored.
+
+	Args:
+			session (AsyncSession): the session of database
+			zipcode (int): zipcode to look for
+
+	Returns:
+			bool: True if there is an address with this zipcode
+
+	"""
+	query = select(Address.id).where(Address.zipcode == zipcode)
+	result = await session.exec(query)
+	return result.first() is not None
+
+
+async def get_backfill_zipcodes(
+	session: AsyncSession,
+	predicate: BackfillPredicate,
+	after: int,
+	limit: PositiveInt,
+) -> list[int]:
+	"""
+	Page through stored zipcodes matching a backfill predicate.
+
+	Keyset pagination on zipcode, so the last zipcode of a page is the
+	checkpoint of the job and rows changed by the backfill itself do not
+	shift the pages.
+
+	Args:
+			session (AsyncSession): the session of database
+			predicate (BackfillPredicate): filters, all of them must match
+			after (int): last zipcode already processed
+			limit (PositiveInt): page size
+
+	Returns:
+			list[int]: next zipcodes, in order, empty when finished
+
+	"""
+	query = (
+		select(Address.zipcode)
+		.where(Address.zipcode > after)
+		.order_by(col(Address.zipcode))
+		.limit(limit)
+	)
+	if predicate.get('missing_coordinates'):
+		# None may be stored as SQL NULL or as JSON null
+		query = query.where(
+			or_(
+				col(Address.coordinates).is_(None),
+				func.jsonb_typeof(Address.coordinates) == 'null',
+			)
+		)
+	if provider := predicate.get('provider'):
+		query = query.where(Address.provider == provider)
+	if days := predicate.get('older_than_days'):
+		older = datetime.now() - timedelta(days=days)
+		query = query.where(col(Address.updated_at) < older)
+
+	result = await session.exec(query)
+	return list(result.all())
+
+
+async def get_unfinished_backfill_jobs(
+	session: AsyncSession,
+) -> list[BackfillJob]:
+	"""
+	Get backfill jobs not done yet, oldest first.
+
+	Args:
+			session (AsyncSession): the session of database
+
+	Returns:
+			list[BackfillJob]: pending and running (interrupted) jobs
+
+	"""
+	query = (
+		select(BackfillJob)
+		.where(BackfillJob.status != BackfillStatus.DONE)
+		.order_by(col(BackfillJob.created_at))
+	)
+	result = await session.exec(query)
+	return list(result.all())
+
+
+async def get_backfill_job(
+	session: AsyncSession, job_id: UUID
+) -> BackfillJob | None:
+	"""
+	Read a backfill job again, e.g. after waiting for its lock.
+
+	Args:
+			session (AsyncSession): the session of database
+			job_id (UUID): job id
+
+	Returns:
+			BackfillJob | None: the job with its last checkpoint
+
+	"""
+	return await session.get(BackfillJob, job_id, populate_existing=True)
+
+
+async def save_backfill_job(session: AsyncSession, job: BackfillJob) -> None:
+	"""
+	Insert or checkpoint a backfill job.
+
+	Args:
+			session (AsyncSession): the session of database
+			job (BackfillJob): job with its current cursor and counters
+
+	"""
+	session.add(job)
+	await session.commit()
+
+
+async def add_provider_usage(
+	session: AsyncSession, usage: Mapping[str, tuple[date, int]]
+) -> dict[str, tuple[date, int]]:
+	"""
+	Add the requests of this process to the stored usage of each provider.
+
+	One upsert per provider, atomic, so every process adds its own
+	requests and reads the total of all of them.
+
+	Args:
+			session (AsyncSession): the session of database
+			usage (Mapping[str, tuple[date, int]]): provider -> (day,
+					requests not stored yet), 0 only reads the total
+
+	Returns:
+			dict[str, tuple[date, int]]: provider -> (day, total used)
+
+	"""
+	totals: dict[str, tuple[date, int]] = {}
+	for provider, (day, used) in usage.items():
+		upsert = insert(ProviderUsage).values(provider=provider, day=day, used=used)
+		query = upsert.on_conflict_do_update(
+			index_elements=['provider', 'day'],
+			set_={'used': col(ProviderUsage.used) + upsert.excluded.used},
+		).returning(col(ProviderUsage.used))
+		total = (await session.execute(query)).scalar_one()
+		totals[provider] = (day, total)
+	await session.commit()
+	return totals
+
+
+async def stream_addresses(
+	session: AsyncSession, filter: AddressFilterInput, chunk_size: PositiveInt
+) -> AsyncIterator[Sequence[Row[tuple[object, ...]]]]:
+	"""
+	Read every address matching the filter in chunks, as plain rows.
+
+	Runs on a server-side (named) psycopg cursor, so only chunk_size rows
+	are in memory at a time, and no ORM objects are built.
+
+	Args:
+			session (AsyncSession): the session of database
+			filter (AddressFilterInput): same filter as all_address
+			chunk_size (PositiveInt): rows fetched at a time
+
+	Yields:
+			Sequence[Row[tuple[object, ...]]]: rows with zipcode,
+					neighborhood, complement, coordinates, updated_at,
+					city_ibge, city_name, city_ddd, state_acronym and
+					state_name, ordered by zipcode
+
+	"""
+	query = (
+		select(  # type: ignore[call-overload]
+			Address.zipcode,
+			Address.neighborhood,
+			Address.complement,
+			Address.coordinates,
+			Address.updated_at,
+			col(City.ibge).label('city_ibge'),
+			col(City.name).label('city_name'),
+			col(City.ddd).label('city_ddd'),
+			col(State.acronym).label('state_acronym'),
+			col(State.name).label('state_name'),
+		)
+		.join(City)
+		.join(State)
+		.where(*address_conditions(filter))
+		.order_by(col(Address.zipcode))
+		.execution_options(yield_per=chunk_size)
+	)
+	result = await session.stream(query)
+	async for rows in result.partitions():
+		yield rows
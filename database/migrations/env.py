@@ -25,6 +25,7 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from sqlmodel import SQLModel
 
+from database.models.backfill import BackfillJob, ProviderUsage  # noqa: F401
 from database.models.brazil import Address, City, State  # noqa: F401
 from utils.settings import settings
 
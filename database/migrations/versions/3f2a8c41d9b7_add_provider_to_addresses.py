@@ -0,0 +1,51 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+"""
+Add provider to addresses.
+
+Revision ID: 3f2a8c41d9b7
+Revises: 16486dde779e
+Create Date: 2024-08-12 10:21:44.102318
+
+"""
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a8c41d9b7'
+down_revision: str | None = '16486dde779e'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+	"""Store which plugin the address came from (null = inserted manually)."""
+	op.add_column(
+		'addresses',
+		sa.Column('provider', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+	)
+
+
+def downgrade() -> None:
+	"""Drop addresses provider column."""
+	op.drop_column('addresses', 'provider')
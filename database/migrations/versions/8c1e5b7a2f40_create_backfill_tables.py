@@ -0,0 +1,88 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+"""
+Create backfill jobs and provider usage tables.
+
+Revision ID: 8c1e5b7a2f40
+Revises: 3f2a8c41d9b7
+Create Date: 2024-08-19 09:12:05.481297
+
+"""
+
+# revision identifiers, used by Alembic.
+revision: str = '8c1e5b7a2f40'
+down_revision: str | None = '3f2a8c41d9b7'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+	"""Create backfill_jobs (checkpoints) and provider_usage (daily budget)."""
+	op.create_table(
+		'backfill_jobs',
+		sa.Column('id', sa.Uuid(), nullable=False),
+		sa.Column(
+			'zipcodes',
+			postgresql.JSONB(astext_type=sa.Text()),
+			nullable=True,
+		),
+		sa.Column(
+			'predicate',
+			postgresql.JSONB(astext_type=sa.Text()),
+			nullable=True,
+		),
+		sa.Column(
+			'providers',
+			postgresql.JSONB(astext_type=sa.Text()),
+			nullable=True,
+		),
+		sa.Column(
+			'status',
+			sa.Enum('PENDING', 'RUNNING', 'DONE', name='backfillstatus'),
+			nullable=False,
+		),
+		sa.Column('cursor', sa.Integer(), nullable=False),
+		sa.Column('processed', sa.Integer(), nullable=False),
+		sa.Column('updated', sa.Integer(), nullable=False),
+		sa.Column('failed', sa.Integer(), nullable=False),
+		sa.Column('created_at', sa.DateTime(), nullable=False),
+		sa.Column('updated_at', sa.DateTime(), nullable=False),
+		sa.PrimaryKeyConstraint('id'),
+	)
+	op.create_table(
+		'provider_usage',
+		sa.Column('provider', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+		sa.Column('day', sa.Date(), nullable=False),
+		sa.Column('used', sa.Integer(), nullable=False),
+		sa.PrimaryKeyConstraint('provider', 'day'),
+	)
+
+
+def downgrade() -> None:
+	"""Drop backfill_jobs and provider_usage tables."""
+	op.drop_table('provider_usage')
+	op.drop_table('backfill_jobs')
+	op.execute('DROP TYPE public.backfillstatus')
@@ -0,0 +1,75 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import date, datetime
+from enum import StrEnum
+from typing import TypedDict
+from uuid import UUID, uuid4
+
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlmodel import Field, SQLModel
+
+
+class BackfillStatus(StrEnum):
+	PENDING = 'pending'
+	RUNNING = 'running'
+	DONE = 'done'
+
+
+class BackfillPredicate(TypedDict, total=False):
+	missing_coordinates: bool
+	provider: str
+	older_than_days: int
+
+
+class BackfillJob(SQLModel, table=True):
+	__tablename__ = 'backfill_jobs'
+
+	id: UUID = Field(default_factory=uuid4, primary_key=True)
+
+	# either a list of zipcodes or a predicate over stored addresses
+	zipcodes: list[int] | None = Field(None, nullable=True, sa_type=JSONB)
+	predicate: BackfillPredicate | None = Field(
+		None, nullable=True, sa_type=JSONB
+	)
+	# plugins to call, None = all
+	providers: list[str] | None = Field(None, nullable=True, sa_type=JSONB)
+
+	status: BackfillStatus = BackfillStatus.PENDING
+	# checkpoint: index of zipcodes or last zipcode matched by predicate
+	cursor: int = 0
+	processed: int = 0
+	updated: int = 0
+	failed: int = 0
+
+	created_at: datetime = Field(default_factory=datetime.now)
+	updated_at: datetime | None = Field(
+		default_factory=datetime.now,
+		nullable=False,
+		sa_column_kwargs={
+			'onupdate': datetime.now,
+		},
+	)
+
+
+class ProviderUsage(SQLModel, table=True):
+	__tablename__ = 'provider_usage'
+
+	provider: str = Field(primary_key=True)
+	day: date = Field(primary_key=True)
+	used: int = 0
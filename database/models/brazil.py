@@ -152,6 +152,7 @@ class Address(AddressBase, table=True):
 	neighborhood: str
 	complement: str | None = None
 	coordinates: Coordinates | None = Field(None, nullable=True, sa_type=JSONB)
+	provider: str | None = Field(None, nullable=True)
 
 	updated_at: datetime | None = Field(
 		default_factory=datetime.now,
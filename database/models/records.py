@@ -0,0 +1,139 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Self
+
+from msgspec import Struct
+
+from database.models.brazil import (
+	Address,
+	City,
+	Coordinates,
+	StateAcronym,
+	StateCreate,
+)
+
+
+class StateRecord(Struct, kw_only=True, gc=False):
+	acronym: StateAcronym
+	name: str | None = None
+
+
+class CityRecord(Struct, kw_only=True, gc=False):
+	ibge: int
+	name: str | None = None
+	ddd: int | None = None
+
+
+class AddressRecord(Struct, kw_only=True, gc=False):
+	"""
+	Lightweight, slotted address used on the hot path.
+
+	Plugins decode the provider payload straight into this struct, so the
+	validated SQLModel instances are only built by to_model when the row
+	is really going to be persisted.
+	"""
+
+	zipcode: int
+	state: StateRecord | None = None
+	city: CityRecord | None = None
+	neighborhood: str | None = None
+	complement: str | None = None
+	coordinates: Coordinates | None = None
+	updated_at: datetime | None = None
+
+	@classmethod
+	def from_model(cls, address: Address) -> Self:
+		"""
+		Copy a stored address into a record, e.g. to encode it with msgspec.
+
+		Args:
+				address (Address): database model with state and city loaded
+
+		Returns:
+				Self: record with the same values
+
+		"""
+		return cls(
+			zipcode=address.zipcode,
+			state=StateRecord(acronym=address.state.acronym, name=address.state.name),
+			city=CityRecord(
+				ibge=address.city.ibge, name=address.city.name, ddd=address.city.ddd
+			),
+			neighborhood=address.neighborhood,
+			complement=address.complement,
+			coordinates=address.coordinates,
+			updated_at=address.updated_at,
+		)
+
+	@classmethod
+	def from_row(cls, row: Mapping[Any, Any]) -> Self:
+		"""
+		Build a record from a column-projected row, missing columns are None.
+
+		Args:
+				row (Mapping[Any, Any]): row mapping with zipcode and any of
+						neighborhood, complement, coordinates, updated_at,
+						city_ibge, city_name, city_ddd, state_acronym, state_name
+
+		Returns:
+				Self: record, city and state only when their key was read
+
+		"""
+		return cls(
+			zipcode=row['zipcode'],
+			state=StateRecord(acronym=row['state_acronym'], name=row.get('state_name'))
+			if row.get('state_acronym')
+			else None,
+			city=CityRecord(
+				ibge=row['city_ibge'], name=row.get('city_name'), ddd=row.get('city_ddd')
+			)
+			if row.get('city_ibge')
+			else None,
+			neighborhood=row.get('neighborhood'),
+			complement=row.get('complement'),
+			coordinates=row.get('coordinates'),
+			updated_at=row.get('updated_at'),
+		)
+
+	def to_model(self: Self) -> Address:
+		"""
+		Materialize the database model of this record.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				Address: Database model, state and city are not bound to the
+						database yet (see database.functions.insert_address)
+
+		"""
+		return Address(
+			zipcode=self.zipcode,
+			state=StateCreate(acronym=self.state.acronym, name=self.state.name)
+			if self.state
+			else None,
+			city=City(ibge=self.city.ibge, name=self.city.name, ddd=self.city.ddd)
+			if self.city
+			else None,
+			neighborhood=self.neighborhood,
+			complement=self.complement,
+			coordinates=self.coordinates,
+		)
@@ -0,0 +1,105 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep, timeout
+from time import monotonic, perf_counter
+from typing import Self, TypedDict
+
+from sqlalchemy import text
+
+from database.engine import engine
+from utils.settings import settings
+
+
+class PingStatus(TypedDict):
+	"""Last database ping, as reported by /health."""
+
+	available: bool
+	latency: float | None
+	age: float | None
+	error: str | None
+
+
+class DatabasePing:
+	"""
+	Result of the last SELECT 1 through the pool.
+
+	Info:
+			The ping checks a connection out like a request does, so a
+			pool exhausted for longer than HEALTH_PING_TIMEOUT counts as
+			unavailable. A ping older than three intervals (the job
+			stopped) does too.
+	"""
+
+	__slots__ = ('checked', 'error', 'latency')
+
+	def __init__(self: Self) -> None:
+		"""
+		Start without pings, unavailable.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.checked: float | None = None
+		self.latency: float | None = None
+		self.error: str | None = None
+
+	async def ping(self: Self) -> None:
+		"""Run SELECT 1 and keep its latency or error class."""
+		start = perf_counter()
+		try:
+			async with timeout(settings.HEALTH_PING_TIMEOUT), engine.connect() as conn:
+				await conn.execute(text('SELECT 1'))
+		except Exception as exc:
+			self.latency, self.error = None, type(exc).__name__
+		else:
+			self.latency, self.error = round(perf_counter() - start, 6), None
+		self.checked = monotonic()
+
+	def status(self: Self) -> PingStatus:
+		"""
+		Read the last ping, without a database round trip.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				PingStatus: available, latency and age (seconds) and error
+						class of the last ping
+
+		"""
+		age = None if self.checked is None else monotonic() - self.checked
+		return {
+			'available': age is not None
+			and age <= 3 * settings.HEALTH_PING_INTERVAL
+			and self.error is None,
+			'latency': self.latency,
+			'age': None if age is None else round(age, 3),
+			'error': self.error,
+		}
+
+
+async def monitor() -> None:
+	"""Ping the database every HEALTH_PING_INTERVAL seconds, forever."""
+	while True:
+		await database.ping()
+		await sleep(settings.HEALTH_PING_INTERVAL)
+
+
+database = DatabasePing()
@@ -0,0 +1,119 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Collection
+from typing import Self
+
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database.models.brazil import City, State, StateAcronym
+
+
+class Reference:
+	"""
+	States and cities kept in memory, loaded once by the warm-up.
+
+	Info:
+			States only change with migrations. Cities are also created
+			at runtime (insert_address, update_address) and are not
+			added here, so get_cities queries the ones missing from
+			memory; existing cities are never changed. The instances are
+			detached: read their ids and names, never add them to a
+			session (concurrent requests share them).
+	"""
+
+	__slots__ = ('cities', 'states')
+
+	def __init__(self: Self) -> None:
+		"""
+		Start empty, callers query the database until load.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.states: dict[StateAcronym, State] = {}
+		self.cities: dict[int, City] = {}
+
+	async def load(self: Self, session: AsyncSession) -> None:
+		"""
+		Read every state and city.
+
+		Args:
+				self (Self): scope of the class
+				session (AsyncSession): the session of database
+
+		"""
+		states = {
+			state.acronym: state for state in await session.exec(select(State))
+		}
+		cities = {city.ibge: city for city in await session.exec(select(City))}
+		session.expunge_all()
+		self.states, self.cities = states, cities
+
+	async def get_states(
+		self: Self, session: AsyncSession, acronyms: Collection[StateAcronym]
+	) -> dict[StateAcronym, State]:
+		"""
+		Get states by acronym, from memory once loaded.
+
+		Args:
+				self (Self): scope of the class
+				session (AsyncSession): the session of database, used
+						before load
+				acronyms (Collection[StateAcronym]): wanted states
+
+		Returns:
+				dict[StateAcronym, State]: states found, by acronym
+
+		"""
+		if self.states:
+			return {
+				acronym: self.states[acronym]
+				for acronym in acronyms
+				if acronym in self.states
+			}
+		query = select(State).where(col(State.acronym).in_(acronyms))
+		return {state.acronym: state for state in await session.exec(query)}
+
+	async def get_cities(
+		self: Self, session: AsyncSession, ibges: Collection[int]
+	) -> dict[int, City]:
+		"""
+		Get cities by ibge, from memory once loaded.
+
+		Cities missing from memory are still queried.
+
+		Args:
+				self (Self): scope of the class
+				session (AsyncSession): the session of database
+				ibges (Collection[int]): wanted cities
+
+		Returns:
+				dict[int, City]: cities found, by ibge
+
+		"""
+		cities = {ibge: self.cities[ibge] for ibge in ibges if ibge in self.cities}
+		if missing := set(ibges) - cities.keys():
+			query = select(City).where(col(City.ibge).in_(missing))
+			cities.update((city.ibge, city) for city in await session.exec(query))
+		return cities
+
+
+reference = Reference()
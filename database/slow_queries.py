@@ -0,0 +1,279 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import re
+from logging import getLogger
+from random import random
+from time import perf_counter
+from typing import Any, Self, TypedDict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from jobs.tasks import spawn
+from utils import server_timing
+from utils.lru import LRUCache
+from utils.settings import settings
+
+logger = getLogger(__name__)
+
+_PLACEHOLDER = re.compile(
+	r"%\(\w+\)s|\$\d+|\?|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b"
+)
+_IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+_PARAMETERS_MAX_LENGTH = 500
+
+
+class SlowQuery(TypedDict):
+	statement: str
+	count: int
+	total_ms: float
+	mean_ms: float
+	max_ms: float
+	last_parameters: str
+	plan: Any
+
+
+class QueryStats:
+	"""Slow executions of one statement shape."""
+
+	__slots__ = ('count', 'last_parameters', 'max', 'plan', 'total')
+
+	def __init__(self: Self) -> None:
+		"""
+		Start with no executions.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.count = 0
+		self.total = 0.0
+		self.max = 0.0
+		self.last_parameters = ''
+		self.plan: Any = None
+
+
+def normalize(statement: str) -> str:
+	"""
+	Reduce a statement to its shape, without values.
+
+	Bound parameters and literals become ?, IN lists of any length become
+	(...), so the same filter combination with other values (or another
+	number of zipcodes) is one shape.
+
+	Args:
+			statement (str): SQL sent to the driver
+
+	Returns:
+			str: normalized statement, on one line
+
+	"""
+	shape = _PLACEHOLDER.sub('?', _SPACES.sub(' ', statement).strip())
+	return _IN_LIST.sub('IN (...)', shape)
+
+
+def format_parameters(parameters: Any, executemany: bool) -> str:
+	"""
+	Describe the parameters of a statement for logs, bounded in size.
+
+	Args:
+			parameters (Any): driver parameters
+			executemany (bool): parameters is a list of rows
+
+	Returns:
+			str: repr of the parameters, or the row count of executemany
+
+	"""
+	if executemany:
+		return f'<{len(parameters)} rows>'
+	text = repr(parameters)
+	if len(text) > _PARAMETERS_MAX_LENGTH:
+		return text[:_PARAMETERS_MAX_LENGTH] + '...'
+	return text
+
+
+class SlowQueryLog:
+	"""
+	Statements slower than SLOW_QUERY_THRESHOLD, aggregated by shape.
+
+	Info:
+			Every statement of the instrumented engine is timed between
+			before_cursor_execute and after_cursor_execute; only slow ones
+			are logged and kept, at most SLOW_QUERY_MAX_SHAPES shapes (least
+			recently slow shapes are dropped).
+
+			With SLOW_QUERY_EXPLAIN_RATE, a sample of slow SELECTs is run
+			again as EXPLAIN (ANALYZE, BUFFERS) in background, on another
+			connection, and the plan is kept with the shape.
+	"""
+
+	__slots__ = ('engine', 'shapes')
+
+	def __init__(self: Self, maxsize: int) -> None:
+		"""
+		Start empty, not attached to any engine.
+
+		Args:
+				self (Self): scope of the class
+				maxsize (int): shapes kept
+
+		"""
+		self.shapes: LRUCache[str, QueryStats] = LRUCache(maxsize)
+		self.engine: AsyncEngine | None = None
+
+	def instrument(self: Self, engine: AsyncEngine) -> None:
+		"""
+		Time every statement run by the engine.
+
+		Args:
+				self (Self): scope of the class
+				engine (AsyncEngine): engine to watch, also used by EXPLAIN
+
+		"""
+		self.engine = engine
+
+		@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+		def start(  # noqa: PLR0913
+			conn: Any,
+			cursor: Any,
+			statement: str,
+			parameters: Any,
+			context: Any,
+			executemany: bool,
+		) -> None:
+			context._query_start = perf_counter()
+
+		@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+		def stop(  # noqa: PLR0913
+			conn: Any,
+			cursor: Any,
+			statement: str,
+			parameters: Any,
+			context: Any,
+			executemany: bool,
+		) -> None:
+			elapsed = perf_counter() - context._query_start
+			server_timing.record('db', elapsed)
+			if elapsed >= settings.SLOW_QUERY_THRESHOLD:
+				self.record(statement, parameters, executemany, elapsed)
+
+	def record(
+		self: Self,
+		statement: str,
+		parameters: Any,
+		executemany: bool,
+		elapsed: float,
+	) -> QueryStats:
+		"""
+		Log and aggregate a slow statement.
+
+		Args:
+				self (Self): scope of the class
+				statement (str): SQL sent to the driver
+				parameters (Any): driver parameters
+				executemany (bool): parameters is a list of rows
+				elapsed (float): seconds to execute
+
+		Returns:
+				QueryStats: stats of the statement shape
+
+		"""
+		shape = normalize(statement)
+		described = format_parameters(parameters, executemany)
+		logger.warning(
+			'Slow query (%.1f ms): %s parameters=%s', elapsed * 1e3, shape, described
+		)
+
+		stats = self.shapes.get(shape) or self.shapes.put(shape, QueryStats())
+		stats.count += 1
+		stats.total += elapsed
+		stats.max = max(stats.max, elapsed)
+		stats.last_parameters = described
+
+		if (
+			self.engine is not None
+			and not executemany
+			and shape.upper().startswith('SELECT')
+			and random() < settings.SLOW_QUERY_EXPLAIN_RATE
+		):
+			spawn(
+				self.explain(stats, statement, parameters),
+				name='explain-slow-query',
+			)
+		return stats
+
+	async def explain(
+		self: Self, stats: QueryStats, statement: str, parameters: Any
+	) -> None:
+		"""
+		Run the statement again under EXPLAIN and keep its plan.
+
+		Only SELECTs get here, ANALYZE really executes the statement. The
+		connection is rolled back when closed.
+
+		Args:
+				self (Self): scope of the class
+				stats (QueryStats): stats of the statement shape
+				statement (str): SQL sent to the driver
+				parameters (Any): driver parameters
+
+		"""
+		if self.engine is None:
+			return
+		async with self.engine.connect() as conn:
+			result = await conn.exec_driver_sql(
+				f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}', parameters
+			)
+			stats.plan = result.scalar()
+
+	def top(self: Self, limit: int) -> list[SlowQuery]:
+		"""
+		Get the shapes with most time spent, slowest first.
+
+		Args:
+				self (Self): scope of the class
+				limit (int): shapes returned
+
+		Returns:
+				list[SlowQuery]: stats of each shape, times in milliseconds
+
+		"""
+		ranked = sorted(
+			self.shapes.items(), key=lambda item: item[1].total, reverse=True
+		)
+		return [
+			{
+				'statement': shape,
+				'count': stats.count,
+				'total_ms': stats.total * 1e3,
+				'mean_ms': stats.total / stats.count * 1e3,
+				'max_ms': stats.max * 1e3,
+				'last_parameters': stats.last_parameters,
+				'plan': stats.plan,
+			}
+			for shape, stats in ranked[:limit]
+		]
+
+	def clear(self: Self) -> None:
+		"""Forget every shape, e.g. after a deploy."""
+		self.shapes.clear()
+
+
+slow_queries = SlowQueryLog(settings.SLOW_QUERY_MAX_SHAPES)
@@ -0,0 +1,389 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from argparse import ArgumentParser, FileType
+from asyncio import run, sleep
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from logging import getLogger
+
+from sqlalchemy import text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import functions
+from database.engine import engine
+from database.models.backfill import (
+	BackfillJob,
+	BackfillPredicate,
+	BackfillStatus,
+)
+from jobs.enrichment import enrich
+from plugins.budget import budgets
+from plugins.plugins_controller import PLUGINS, get_zipcode_from_plugins
+from plugins.protocol import Plugin
+from utils import logs
+from utils.settings import settings
+
+logger = getLogger(__name__)
+
+
+def job_plugins(job: BackfillJob) -> tuple[type[Plugin], ...]:
+	"""
+	Get the plugins a job calls.
+
+	Args:
+			job (BackfillJob): backfill job
+
+	Returns:
+			tuple[type[Plugin], ...]: job providers, all plugins if None
+
+	"""
+	if job.providers is None:
+		return PLUGINS
+	return tuple(plugin for plugin in PLUGINS if plugin.provider in job.providers)
+
+
+async def next_zipcodes(session: AsyncSession, job: BackfillJob) -> list[int]:
+	"""
+	Get the next batch of zipcodes after the job checkpoint.
+
+	Args:
+			session (AsyncSession): the session of database
+			job (BackfillJob): backfill job
+
+	Returns:
+			list[int]: up to BACKFILL_BATCH zipcodes, empty when finished
+
+	"""
+	if job.zipcodes is not None:
+		return job.zipcodes[job.cursor : job.cursor + settings.BACKFILL_BATCH]
+	zipcodes = await functions.get_backfill_zipcodes(
+		session, job.predicate or {}, job.cursor, settings.BACKFILL_BATCH
+	)
+	# end the read transaction, the batch takes minutes and the
+	# connection would stay idle in transaction meanwhile
+	await session.commit()
+	return zipcodes
+
+
+async def sync_usage(session: AsyncSession) -> None:
+	"""
+	Add the providers usage of this process to Postgres, read the total.
+
+	Args:
+			session (AsyncSession): the session of database
+
+	"""
+	unsynced = budgets.take_unsynced()
+	try:
+		totals = await functions.add_provider_usage(session, unsynced)
+	except Exception:
+		budgets.give_back(unsynced)
+		raise
+	for provider, (day, used) in totals.items():
+		budgets.restore(provider, day, used)
+
+
+async def sync_budgets() -> None:
+	"""
+	Sync the providers usage every BUDGET_SYNC_INTERVAL seconds, forever.
+
+	Started with the app in every process, so all of them (live lookups
+	and backfill) count against the same daily budgets.
+	"""
+	while True:
+		try:
+			async with AsyncSession(engine, expire_on_commit=False) as session:
+				await sync_usage(session)
+		except Exception:
+			logger.exception('Providers usage sync failed, retrying')
+		await sleep(settings.BUDGET_SYNC_INTERVAL)
+
+
+async def checkpoint(session: AsyncSession, job: BackfillJob) -> None:
+	"""
+	Persist the job progress and the providers usage of the day.
+
+	Args:
+			session (AsyncSession): the session of database
+			job (BackfillJob): backfill job
+
+	"""
+	await functions.save_backfill_job(session, job)
+	await sync_usage(session)
+
+
+@asynccontextmanager
+async def claim(job: BackfillJob) -> AsyncIterator[bool]:
+	"""
+	Hold a Postgres advisory lock on a job, so one process runs it.
+
+	The lock belongs to a connection outside any transaction, and is
+	released with the connection if the process dies.
+
+	Args:
+			job (BackfillJob): backfill job
+
+	Yields:
+			bool: True if this process got the job
+
+	"""
+	key = int.from_bytes(job.id.bytes[:8], signed=True)
+	async with engine.connect() as connection:
+		conn = await connection.execution_options(isolation_level='AUTOCOMMIT')
+		claimed = bool(
+			await conn.scalar(text('SELECT pg_try_advisory_lock(:key)'), {'key': key})
+		)
+		try:
+			yield claimed
+		finally:
+			if claimed:
+				await conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': key})
+
+
+async def wait_for_budget(
+	session: AsyncSession, job: BackfillJob, plugins: tuple[type[Plugin], ...]
+) -> None:
+	"""
+	Wait until a job plugin has background budget and live traffic is idle.
+
+	The job is checkpointed before a long wait (budget used for the day),
+	so a restart does not repeat anything.
+
+	Args:
+			session (AsyncSession): the session of database
+			job (BackfillJob): backfill job
+			plugins (tuple[type[Plugin], ...]): plugins of the job
+
+	"""
+	while not any(
+		budgets.available(plugin.provider, background=True) for plugin in plugins
+	):
+		await checkpoint(session, job)
+		await sleep(settings.BACKFILL_POLL)
+	await budgets.idle()
+
+
+async def backfill_zipcode(
+	zipcode: int, plugins: tuple[type[Plugin], ...]
+) -> bool | None:
+	"""
+	Fetch a zipcode from plugins and insert or update it.
+
+	Args:
+			zipcode (int): zipcode to fetch
+			plugins (tuple[type[Plugin], ...]): plugins to call
+
+	Returns:
+			bool | None: True if the database changed, None if no plugin
+					found the zipcode
+
+	"""
+	result = await get_zipcode_from_plugins(zipcode, plugins, background=True)
+	if not result['data']:
+		return None
+
+	record, _ = await enrich(result)
+	provider = result['provider']
+	async with AsyncSession(engine, expire_on_commit=False) as session:
+		if await functions.address_exists(session, zipcode):
+			return await functions.update_address(session, record, provider)
+		await functions.insert_address(session, record, provider)
+	return True
+
+
+async def run_job(job: BackfillJob) -> BackfillJob:
+	"""
+	Run a backfill job from its checkpoint until the end.
+
+	Lookups go through the plugin layer as background calls, one every
+	BACKFILL_INTERVAL seconds, pausing while live lookups happen or the
+	background share of the providers budget is used up. Progress is
+	checkpointed every BACKFILL_BATCH zipcodes.
+
+	Args:
+			job (BackfillJob): pending or interrupted job
+
+	Returns:
+			BackfillJob: the job, done
+
+	"""
+	plugins = job_plugins(job)
+	async with AsyncSession(engine, expire_on_commit=False) as session:
+		job.status = BackfillStatus.RUNNING
+		await checkpoint(session, job)
+
+		while zipcodes := await next_zipcodes(session, job):
+			for zipcode in zipcodes:
+				await wait_for_budget(session, job, plugins)
+				try:
+					changed = await backfill_zipcode(zipcode, plugins)
+				except Exception:
+					logger.exception('Backfill of %s failed', zipcode)
+					changed = None
+				if changed is None:
+					job.failed += 1
+				elif changed:
+					job.updated += 1
+				job.processed += 1
+				job.cursor = zipcode if job.zipcodes is None else job.cursor + 1
+				await sleep(settings.BACKFILL_INTERVAL)
+			await checkpoint(session, job)
+
+		job.status = BackfillStatus.DONE
+		await checkpoint(session, job)
+	return job
+
+
+async def create_job(
+	zipcodes: list[int] | None = None,
+	predicate: BackfillPredicate | None = None,
+	providers: list[str] | None = None,
+) -> BackfillJob:
+	"""
+	Store a new backfill job, run later by the scheduler.
+
+	Args:
+			zipcodes (list[int] | None, optional): zipcodes to fetch.
+					Defaults to None.
+			predicate (BackfillPredicate | None, optional): filters of stored
+					addresses to fetch again. Defaults to None.
+			providers (list[str] | None, optional): plugins to call, None
+					for all. Defaults to None.
+
+	Raises:
+			ValueError: If both or none of zipcodes and predicate are given
+
+	Returns:
+			BackfillJob: the pending job
+
+	"""
+	if (zipcodes is None) == (predicate is None):
+		raise ValueError('Backfill needs either zipcodes or a predicate')
+
+	job = BackfillJob(zipcodes=zipcodes, predicate=predicate, providers=providers)
+	async with AsyncSession(engine, expire_on_commit=False) as session:
+		await functions.save_backfill_job(session, job)
+	return job
+
+
+async def run_claimed(job: BackfillJob) -> BackfillJob | None:
+	"""
+	Run a job if no other process is running it.
+
+	The job is read again under the claim, another process may have
+	finished it meanwhile.
+
+	Args:
+			job (BackfillJob): backfill job
+
+	Returns:
+			BackfillJob | None: the job once done, None if it was claimed
+					by another process or already done
+
+	"""
+	async with claim(job) as claimed:
+		if not claimed:
+			return None
+		async with AsyncSession(engine, expire_on_commit=False) as session:
+			current = await functions.get_backfill_job(session, job.id)
+		if current is None or current.status == BackfillStatus.DONE:
+			return None
+		return await run_job(current)
+
+
+async def scheduler() -> None:
+	"""
+	Run unfinished backfill jobs, one at a time, forever.
+
+	Started with the app in every process; each job is claimed (see
+	claim), so it runs in one of them. Jobs interrupted by a restart
+	continue from their checkpoint.
+	"""
+	while True:
+		try:
+			async with AsyncSession(engine, expire_on_commit=False) as session:
+				jobs = await functions.get_unfinished_backfill_jobs(session)
+			for job in jobs:
+				await run_claimed(job)
+		except Exception:
+			logger.exception('Backfill scheduler failed, retrying')
+		await sleep(settings.BACKFILL_POLL)
+
+
+def main() -> None:
+	"""
+	Create a backfill job from the command line.
+
+	Either a file of zipcodes (one per line) or filters of stored addresses,
+	e.g. coordinates missing from CepAberto:
+
+		python -m jobs.backfill --missing-coordinates --providers cep_aberto
+	"""
+	parser = ArgumentParser(description=main.__doc__)
+	parser.add_argument(
+		'--zipcodes', type=FileType(), help='file with one zipcode per line'
+	)
+	parser.add_argument('--missing-coordinates', action='store_true')
+	parser.add_argument('--provider', help='only addresses from this provider')
+	parser.add_argument('--older-than-days', type=int)
+	parser.add_argument(
+		'--providers',
+		nargs='+',
+		choices=[plugin.provider for plugin in PLUGINS],
+		help='plugins to call, all by default',
+	)
+	parser.add_argument(
+		'--run', action='store_true', help='run now instead of by the app'
+	)
+	args = parser.parse_args()
+
+	predicate: BackfillPredicate | None = None
+	zipcodes: list[int] | None = None
+	if args.zipcodes:
+		zipcodes = [int(line) for line in args.zipcodes if line.strip()]
+	else:
+		predicate = {}
+		if args.missing_coordinates:
+			predicate['missing_coordinates'] = True
+		if args.provider:
+			predicate['provider'] = args.provider
+		if args.older_than_days:
+			predicate['older_than_days'] = args.older_than_days
+
+	async def create() -> None:
+		job = await create_job(zipcodes, predicate, args.providers)
+		print('Backfill job', job.id)
+		if not args.run:
+			return
+		# the app scheduler may pick the job up too, one of them runs it
+		async with claim(job) as claimed:
+			if not claimed:
+				print('Backfill job already running in the app')
+				return
+			job = await run_job(job)
+		print(
+			f'{job.processed} processed, {job.updated} updated, {job.failed} failed'
+		)
+
+	with logs.pipeline():
+		run(create())
+
+
+if __name__ == '__main__':
+	main()
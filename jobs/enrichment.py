@@ -0,0 +1,182 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep, wait
+from collections.abc import Mapping
+
+from msgspec.structs import replace
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.address.graphql_types import DictResponse
+from database import functions
+from database.engine import engine
+from database.models.records import AddressRecord
+from plugins.plugins_controller import PLUGINS, get_zipcode_from_plugins
+from utils import tracing
+from utils.settings import settings
+
+EMPTY = (None, '')
+
+
+def _get(record: AddressRecord, field: str) -> object:
+	"""Read a dotted field ('city.ddd') from a record, None if missing."""
+	value: object = record
+	for part in field.split('.'):
+		value = getattr(value, part, None)
+	return value
+
+
+def merge_records(
+	base: AddressRecord,
+	other: AddressRecord,
+	rules: Mapping[str, str] | None = None,
+) -> AddressRecord:
+	"""
+	Merge other into base, field by field.
+
+	Rules per field (dotted for city and state, e.g. 'city.ddd'):
+	keep never changes base; fill only sets it when base is empty;
+	replace takes any non empty value of other. Fields without a rule
+	are kept.
+
+	Args:
+			base (AddressRecord): first answer, the one sent to the client
+			other (AddressRecord): answer of another plugin
+			rules (Mapping[str, str] | None, optional): field -> rule.
+					Defaults to settings.ENRICH_MERGE_RULES.
+
+	Returns:
+			AddressRecord: new merged record, base is not changed
+
+	"""
+	rules = settings.ENRICH_MERGE_RULES if rules is None else rules
+	updates: dict[str, dict[str, object]] = {}
+	for field, rule in rules.items():
+		incoming = _get(other, field)
+		if rule == 'keep' or incoming in EMPTY:
+			continue
+		if rule == 'fill' and _get(base, field) not in EMPTY:
+			continue
+		parent, _, name = field.rpartition('.')
+		updates.setdefault(parent, {})[name] = incoming
+
+	merged = base
+	for parent, values in updates.items():
+		if not parent:
+			merged = replace(merged, **values)
+		elif (nested := getattr(merged, parent)) is not None:
+			merged = replace(merged, **{parent: replace(nested, **values)})
+	return merged
+
+
+def has_gaps(record: AddressRecord) -> bool:
+	"""
+	Check if any field with a fill rule is still empty.
+
+	Args:
+			record (AddressRecord): merged record
+
+	Returns:
+			bool: True if another plugin could still add something
+
+	"""
+	return any(
+		rule == 'fill' and _get(record, field) in EMPTY
+		for field, rule in settings.ENRICH_MERGE_RULES.items()
+	)
+
+
+async def enrich(result: DictResponse) -> tuple[AddressRecord, set[str]]:
+	"""
+	Wait the plugins still running after the first answer and merge them.
+
+	Plugins slower than ENRICH_TIMEOUT are cancelled.
+
+	Args:
+			result (DictResponse): result of get_zipcode_from_plugins,
+					with at least one address
+
+	Returns:
+			tuple[AddressRecord, set[str]]: merged record and the providers
+					that answered
+
+	"""
+	record: AddressRecord = result['data'][0]  # type: ignore[assignment]
+	answered = {result['provider']}
+
+	pending = result.get('pending')
+	if pending:
+		done, not_done = await wait(pending, timeout=settings.ENRICH_TIMEOUT)
+		for task in not_done:
+			task.cancel()
+		for task in done:
+			if task.cancelled() or task.exception():
+				continue
+			other = task.result()
+			if other['data']:
+				record = merge_records(record, other['data'][0])  # type: ignore[arg-type]
+				answered.add(other['provider'])
+
+	return record, answered
+
+
+async def store(result: DictResponse) -> None:
+	"""
+	Store a plugin result and enrich it, off the request path.
+
+	The first answer is inserted right away, so repeated lookups find it
+	in the database; the plugins still running are merged into it when
+	they answer (within ENRICH_TIMEOUT). If fields with a fill rule are
+	still empty, plugins that failed (e.g. CepAberto 403 for requests
+	under 1 second apart) are called again after ENRICH_DEFER seconds
+	and merged into the stored address.
+
+	Args:
+			result (DictResponse): result of get_zipcode_from_plugins,
+					with at least one address
+
+	"""
+	first: AddressRecord = result['data'][0]  # type: ignore[assignment]
+	provider = result['provider']
+	with tracing.tracer.start_as_current_span(
+		'store', attributes={'zipcode': first.zipcode, 'provider': provider}
+	):
+		async with AsyncSession(engine, expire_on_commit=False) as session:
+			await functions.insert_address(session, first, provider)
+
+	record, answered = await enrich(result)
+	if record != first:
+		async with AsyncSession(engine, expire_on_commit=False) as session:
+			await functions.update_address(session, record, provider)
+
+	missing = [plugin for plugin in PLUGINS if plugin.provider not in answered]
+	if not missing or not settings.ENRICH_DEFER or not has_gaps(record):
+		return
+
+	await sleep(settings.ENRICH_DEFER)
+	deferred = await get_zipcode_from_plugins(
+		record.zipcode, missing, background=True
+	)
+	if not deferred['data']:
+		return
+
+	other, _ = await enrich(deferred)
+	merged = merge_records(record, other)
+	if merged != record:
+		async with AsyncSession(engine, expire_on_commit=False) as session:
+			await functions.update_address(session, merged, provider)
@@ -0,0 +1,150 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterable
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Protocol
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import functions
+from database.engine import engine
+from jobs.enrichment import enrich
+from jobs.tasks import spawn
+from plugins.plugins_controller import get_zipcode_from_plugins
+from utils.rate_limit import RateLimiter
+from utils.settings import settings
+
+# how many "checked, nothing changed" zipcodes are remembered
+CHECKED_MAX_SIZE = 100_000
+
+
+class StoredAddress(Protocol):
+	"""What the refresh policy reads: an Address or a projected row."""
+
+	zipcode: int
+	provider: str | None
+	updated_at: datetime | None
+
+
+limiter = RateLimiter(settings.REFRESH_RATE_LIMIT)
+_in_flight: set[int] = set()
+_checked: dict[int, float] = {}
+
+
+def max_age(address: StoredAddress) -> timedelta | None:
+	"""
+	Get the freshness policy of an address, based on its provider.
+
+	Args:
+			address (StoredAddress): stored address
+
+	Returns:
+			timedelta | None: max age, None if it is never refreshed
+					(inserted manually or provider not configured)
+
+	"""
+	return settings.REFRESH_MAX_AGE.get(address.provider or '')
+
+
+def is_stale(address: StoredAddress) -> bool:
+	"""
+	Check if the address is older than its provider max age.
+
+	Args:
+			address (StoredAddress): stored address
+
+	Returns:
+			bool: True if it should be re-fetched
+
+	"""
+	age = max_age(address)
+	if age is None or address.updated_at is None:
+		return False
+	return datetime.now() - address.updated_at > age
+
+
+def _recently_checked(zipcode: int, age: timedelta) -> bool:
+	"""Check if a refresh found no changes for zipcode less than age ago."""
+	checked_at = _checked.get(zipcode)
+	return (
+		checked_at is not None and monotonic() - checked_at < age.total_seconds()
+	)
+
+
+def _mark_checked(zipcode: int) -> None:
+	"""Remember that zipcode is up to date, dropping the oldest entry."""
+	_checked.pop(zipcode, None)
+	if len(_checked) >= CHECKED_MAX_SIZE:
+		del _checked[next(iter(_checked))]
+	_checked[zipcode] = monotonic()
+
+
+def schedule_refresh(addresses: Iterable[StoredAddress]) -> None:
+	"""
+	Re-fetch stale addresses in background, stale-while-revalidate.
+
+	The stored rows are still served, this only schedules the refresh.
+	A zipcode is never refreshed twice at the same time and at most
+	REFRESH_RATE_LIMIT refreshes start per second, the rest is retried by
+	a later read.
+
+	Args:
+			addresses (Iterable[StoredAddress]): addresses just read from
+					database, models or rows
+
+	"""
+	for address in addresses:
+		zipcode = address.zipcode
+		if zipcode in _in_flight or not is_stale(address):
+			continue
+		if _recently_checked(zipcode, max_age(address) or timedelta()):
+			continue
+		if not limiter.acquire():
+			return
+		_in_flight.add(zipcode)
+		spawn(refresh_address(zipcode), name=f'refresh-{zipcode}')
+
+
+async def refresh_address(zipcode: int) -> bool:
+	"""
+	Fetch zipcode from plugins and update the database if anything changed.
+
+	Args:
+			zipcode (int): zipcode of a stored address
+
+	Returns:
+			bool: True if the address was updated
+
+	"""
+	try:
+		result = await get_zipcode_from_plugins(zipcode, background=True)
+		if not result['data']:
+			return False
+
+		record, _ = await enrich(result)
+		async with AsyncSession(engine, expire_on_commit=False) as session:
+			changed = await functions.update_address(
+				session, record, result['provider']
+			)
+		if not changed:
+			_mark_checked(zipcode)
+		return changed
+	finally:
+		_in_flight.discard(zipcode)
@@ -0,0 +1,59 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import Task, create_task
+from collections.abc import Coroutine
+from logging import getLogger
+from typing import Any
+
+logger = getLogger(__name__)
+
+_running: set[Task[Any]] = set()
+
+
+def _done(task: Task[Any]) -> None:
+	"""Forget a finished task and report its error, if any."""
+	_running.discard(task)
+	if not task.cancelled() and (error := task.exception()):
+		logger.error('Background job %s failed', task.get_name(), exc_info=error)
+
+
+def spawn(coroutine: Coroutine[Any, Any, Any], name: str) -> Task[Any]:
+	"""
+	Run a coroutine off the request path.
+
+	The event loop only keeps weak references to tasks, so they are kept
+	here until done.
+
+	Args:
+			coroutine (Coroutine[Any, Any, Any]): the job
+			name (str): task name, used on errors
+
+	Returns:
+			Task[Any]: the running task
+
+	"""
+	task = create_task(coroutine, name=name)
+	_running.add(task)
+	task.add_done_callback(_done)
+	return task
+
+
+def pending() -> int:
+	"""Count background jobs not finished yet (queue depth)."""
+	return len(_running)
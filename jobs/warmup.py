@@ -0,0 +1,114 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import Event, gather
+from collections.abc import Iterable
+from contextlib import AsyncExitStack
+from logging import getLogger
+from time import perf_counter
+
+from sqlalchemy.pool import QueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from api.address.graphql_inputs import AddressFilterInput
+from database import functions
+from database.engine import engine
+from database.reference import reference
+from utils.settings import settings
+
+logger = getLogger(__name__)
+
+# set once warm-up finished (or failed), /ready answers 503 before
+ready = Event()
+
+# looked up when WARMUP_ZIPCODES is empty, only the statements matter
+PROBE_ZIPCODE = 1001000
+
+
+async def open_connections(count: int) -> int:
+	"""
+	Open pool connections at once, they go back to the pool idle.
+
+	Args:
+			count (int): connections, at most the pool size (overflow
+					connections are closed when returned)
+
+	Returns:
+			int: connections opened
+
+	"""
+	pool = engine.sync_engine.pool
+	if isinstance(pool, QueuePool):
+		count = min(count, pool.size())
+	async with AsyncExitStack() as stack:
+		await gather(
+			*(stack.enter_async_context(engine.connect()) for _ in range(count))
+		)
+	return count
+
+
+async def warm_queries(session: AsyncSession, zipcodes: Iterable[int]) -> None:
+	"""
+	Run the zipcode lookups of REST and GraphQL for some zipcodes.
+
+	The statements land in SQLAlchemy's compiled cache and the rows in
+	the database buffers, so the first requests skip both.
+
+	Args:
+			session (AsyncSession): the session of database
+			zipcodes (Iterable[int]): zipcodes to read
+
+	"""
+	for zipcode in zipcodes:
+		filter = AddressFilterInput(zipcode=zipcode)
+		await functions.get_address_by_dc_join_state_join_city(session, filter, 1, 1)
+		await functions.get_address_rows(
+			session, filter, {'zipcode', *functions.PROJECTIONS}, 1, 1
+		)
+		session.expunge_all()
+
+
+async def warm_up() -> None:
+	"""
+	Pay the cold start of a worker before it gets traffic.
+
+	Opens WARMUP_CONNECTIONS pool connections, loads states and cities
+	(see database.reference) and runs the lookups of WARMUP_ZIPCODES.
+	A failure is logged and the worker becomes ready anyway, cold.
+	"""
+	start = perf_counter()
+	try:
+		connections = await open_connections(settings.WARMUP_CONNECTIONS)
+		async with AsyncSession(engine) as session:
+			await reference.load(session)
+			await warm_queries(session, settings.WARMUP_ZIPCODES or [PROBE_ZIPCODE])
+	except Exception:
+		logger.exception('Warm-up failed, serving cold')
+	else:
+		logger.info(
+			'Warm-up done',
+			extra={
+				'connections': connections,
+				'states': len(reference.states),
+				'cities': len(reference.cities),
+				'zipcodes': len(settings.WARMUP_ZIPCODES),
+				'seconds': round(perf_counter() - start, 3),
+			},
+		)
+	finally:
+		ready.set()
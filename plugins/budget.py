@@ -0,0 +1,221 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep
+from collections.abc import Mapping
+from datetime import date
+from time import monotonic
+from typing import Self
+
+from utils.settings import settings
+
+
+class ProviderBudget:
+	"""
+	Requests per day of one provider, shared by live and background calls.
+
+	Info:
+			used counts every process: the total stored in Postgres at
+			the last sync plus the local requests not synced yet
+			(unsynced). Between syncs the processes may go over the limit
+			by the requests they made in that interval.
+	"""
+
+	__slots__ = ('day', 'limit', 'share', 'unsynced', 'used')
+
+	def __init__(self: Self, limit: int, share: float) -> None:
+		"""
+		Start the day with nothing used.
+
+		Args:
+				self (Self): scope of the class
+				limit (int): requests per day
+				share (float): part of limit background calls may use
+
+		"""
+		self.limit = limit
+		self.share = share
+		self.day = date.today()
+		self.used = 0
+		self.unsynced = 0
+
+	def roll(self: Self) -> None:
+		"""Reset the usage when the day changes."""
+		if (today := date.today()) != self.day:
+			self.day = today
+			self.used = 0
+			self.unsynced = 0
+
+	def remaining(self: Self, background: bool = False) -> int:
+		"""
+		Count the requests still allowed today.
+
+		Live calls may use the whole limit; background calls stop once the
+		day usage (live included) reaches share of the limit, so they give
+		way to live traffic instead of competing with it.
+
+		Args:
+				self (Self): scope of the class
+				background (bool, optional): caller is a background job.
+						Defaults to False.
+
+		Returns:
+				int: requests left
+
+		"""
+		self.roll()
+		cap = int(self.limit * self.share) if background else self.limit
+		return max(cap - self.used, 0)
+
+
+class Budgets:
+	"""Daily budgets of every limited provider."""
+
+	__slots__ = ('_last_live', 'providers')
+
+	def __init__(self: Self, limits: Mapping[str, int], share: float) -> None:
+		"""
+		Create one budget per provider.
+
+		Args:
+				self (Self): scope of the class
+				limits (Mapping[str, int]): provider -> requests per day
+				share (float): part of each limit background calls may use
+
+		"""
+		self.providers = {
+			provider: ProviderBudget(limit, share) for provider, limit in limits.items()
+		}
+		self._last_live = 0.0
+
+	def available(self: Self, provider: str, background: bool = False) -> bool:
+		"""
+		Check if provider can be called now, without using the budget.
+
+		Args:
+				self (Self): scope of the class
+				provider (str): plugin provider name
+				background (bool, optional): caller is a background job.
+						Defaults to False.
+
+		Returns:
+				bool: True if there is budget (or provider is unlimited)
+
+		"""
+		budget = self.providers.get(provider)
+		return budget is None or budget.remaining(background) > 0
+
+	def acquire(self: Self, provider: str, background: bool = False) -> bool:
+		"""
+		Use one request of provider budget.
+
+		Args:
+				self (Self): scope of the class
+				provider (str): plugin provider name
+				background (bool, optional): caller is a background job.
+						Defaults to False.
+
+		Returns:
+				bool: True if the call is allowed
+
+		"""
+		if not background:
+			self._last_live = monotonic()
+		if not self.available(provider, background):
+			return False
+		if budget := self.providers.get(provider):
+			budget.used += 1
+			budget.unsynced += 1
+		return True
+
+	async def idle(self: Self) -> None:
+		"""
+		Wait for BACKFILL_YIELD seconds without live lookups, at most as long.
+
+		A live lookup during the wait extends it, up to BACKFILL_YIELD
+		in total, so steady live misses slow the backfill down instead of
+		stopping it.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		deadline = monotonic() + settings.BACKFILL_YIELD
+		while (
+			wait := min(self._last_live + settings.BACKFILL_YIELD, deadline)
+			- monotonic()
+		) > 0:
+			await sleep(wait)
+
+	def take_unsynced(self: Self) -> dict[str, tuple[date, int]]:
+		"""
+		Get the requests not synced yet of each provider, resetting them.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				dict[str, tuple[date, int]]: provider -> (day, requests),
+						to be added to the stored usage
+
+		"""
+		unsynced: dict[str, tuple[date, int]] = {}
+		for provider, budget in self.providers.items():
+			budget.roll()
+			unsynced[provider] = (budget.day, budget.unsynced)
+			budget.unsynced = 0
+		return unsynced
+
+	def give_back(self: Self, unsynced: Mapping[str, tuple[date, int]]) -> None:
+		"""
+		Keep requests taken by take_unsynced whose sync failed.
+
+		Args:
+				self (Self): scope of the class
+				unsynced (Mapping[str, tuple[date, int]]): see take_unsynced
+
+		"""
+		for provider, (day, requests) in unsynced.items():
+			budget = self.providers.get(provider)
+			if budget is not None and day == budget.day:
+				budget.unsynced += requests
+
+	def restore(self: Self, provider: str, day: date, used: int) -> None:
+		"""
+		Load the usage stored by every process, if it is from today.
+
+		Requests made since take_unsynced are kept on top of it.
+
+		Args:
+				self (Self): scope of the class
+				provider (str): plugin provider name
+				day (date): day of the usage
+				used (int): requests used that day, all processes
+
+		"""
+		budget = self.providers.get(provider)
+		if budget is None:
+			return
+		budget.roll()
+		if day == budget.day:
+			budget.used = used + budget.unsynced
+
+
+budgets = Budgets(
+	settings.PROVIDER_DAILY_BUDGET, settings.BACKFILL_BUDGET_SHARE
+)
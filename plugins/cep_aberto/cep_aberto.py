@@ -16,43 +16,43 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Self, TypedDict
+from typing import Self
 
-from httpx import AsyncClient
+from msgspec import Struct, ValidationError
+from msgspec.json import Decoder, decode
 from pydantic import PositiveInt
 
 from api.address.graphql_types import DictResponse
-from database.models.brazil import (
-	Address,
-	City,
-	StateAcronym,
-	StateAcronymName,
-	StateCreate,
-)
+from database.models.brazil import StateAcronym, StateAcronymName
+from database.models.records import AddressRecord, CityRecord, StateRecord
+from plugins.client import http_client
 from plugins.protocol import Plugin
 from utils.settings import settings
 
 
-class CepAbertoState(TypedDict):
+class CepAbertoState(Struct, gc=False):
 	sigla: str
 
 
-class CepAbertoCity(TypedDict):
+class CepAbertoCity(Struct, gc=False):
 	ddd: int
 	ibge: str
 	nome: str
 
 
-class CepAbertoAddress(TypedDict):
-	altitude: float
+class CepAbertoAddress(Struct, gc=False):
 	cep: str
-	latitude: str
-	longitude: str
 	logradouro: str
 	bairro: str
-	complemento: str
 	cidade: CepAbertoCity
 	estado: CepAbertoState
+	complemento: str = ''
+	altitude: float | None = None
+	latitude: str | None = None
+	longitude: str | None = None
+
+
+_decoder = Decoder(CepAbertoAddress)
 
 
 class CepAberto(Plugin):
@@ -67,6 +67,8 @@ class CepAberto(Plugin):
 
 	__slots__ = ('token',)
 
+	provider = 'cep_aberto'
+
 	def __init__(self: Self) -> None:
 		"""
 		Set token attribute.
@@ -100,30 +102,33 @@ class CepAberto(Plugin):
 				HTTPStatusError: raise_for_status if there's any error status code
 
 		Returns:
-				DictResponse: data key have a valid address (db model);
-						provider key have 'cep_aberto' str
+				DictResponse: data key have a valid address (record), empty
+						when the zipcode does not exist; provider key have
+						'cep_aberto' str
 
 		"""
 		url = f'https://www.cepaberto.com/api/v3/cep?cep={zipcode:08}'
 		headers = {'Authorization': f'Token token={self.token}'}
-		async with AsyncClient() as client:
+		async with http_client() as client:
 			request = await client.get(url, headers=headers)
 		request.raise_for_status()
 
-		return {
-			'data': [await self._request_to_database_model(request.json())],
-			'provider': 'cep_aberto',
-		}
+		try:
+			data = [self._request_to_record(request.content)]
+		except ValidationError:
+			# unknown zipcodes are answered with 200 {}
+			if decode(request.content) != {}:
+				raise
+			data = []
+		return {'data': data, 'provider': self.provider}
 
 	@classmethod
-	async def _request_to_database_model(
-		cls, address_data: CepAbertoAddress
-	) -> Address:
+	def _request_to_record(cls, content: bytes) -> AddressRecord:
 		"""
-		Receive a json/dict and return an Address object.
+		Decode the response body straight into an AddressRecord.
 
 		Args:
-				address_data (CepAbertoAddress): here's a dict example:
+				content (bytes): raw json body, here's an example:
 						{
 							"altitude": 760.0,
 							"cep": "01001000",
@@ -142,37 +147,42 @@ class CepAberto(Plugin):
 							}
 						}
 
+		Raises:
+				ValidationError: if the body does not match CepAbertoAddress
+
 		Returns:
-				Address: Database model
+				AddressRecord: Lightweight address, see AddressRecord.to_model
 
 		"""
-		acronym = address_data['estado']['sigla']
-		state = StateCreate(
+		address_data = _decoder.decode(content)
+
+		acronym = address_data.estado.sigla
+		state = StateRecord(
 			acronym=StateAcronym(acronym),
 			name=getattr(StateAcronymName, acronym).value,
 		)
 
-		city = City(
-			ibge=int(address_data['cidade']['ibge']),
-			name=address_data['cidade']['nome'],
-			ddd=address_data['cidade']['ddd'],
+		city = CityRecord(
+			ibge=int(address_data.cidade.ibge),
+			name=address_data.cidade.nome,
+			ddd=address_data.cidade.ddd,
 		)
 
 		logradouro = (
-			f'{address_data['logradouro']} {address_data.get('complemento', '')}'
+			f'{address_data.logradouro} {address_data.complemento}'
 		).strip()
 
-		return Address(
-			zipcode=int(address_data['cep']),
+		return AddressRecord(
+			zipcode=int(address_data.cep),
 			state=state,
 			city=city,
-			neighborhood=address_data['bairro'],
+			neighborhood=address_data.bairro,
 			complement=logradouro,
 			coordinates={
-				'latitude': float(address_data['latitude']),
-				'longitude': float(address_data['longitude']),
-				'altitude': address_data.get('altitude'),
+				'latitude': float(address_data.latitude),
+				'longitude': float(address_data.longitude),
+				'altitude': address_data.altitude,
 			}
-			if address_data.get('latitude') and address_data.get('longitude')
+			if address_data.latitude and address_data.longitude
 			else None,
 		)
@@ -0,0 +1,217 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import deque
+from http import HTTPStatus
+from time import monotonic
+from typing import Literal, Self, TypedDict
+
+from httpx import HTTPStatusError, TransportError
+
+from utils.settings import settings
+
+CircuitState = Literal['closed', 'open', 'half_open']
+
+
+class CircuitStatus(TypedDict):
+	"""Circuit of a provider, as reported by /health."""
+
+	state: CircuitState
+	calls: int
+	error_rate: float
+
+
+def is_outage(error: BaseException | None) -> bool:
+	"""
+	Tell if a plugin error means the provider is down or refusing us.
+
+	Only transport errors (timeouts included), 5xx and 403 (rate limit)
+	count; unknown zipcodes are answers, not failures.
+
+	Args:
+			error (BaseException | None): what the plugin call raised
+
+	Returns:
+			bool: True if the call is a circuit failure
+
+	"""
+	if isinstance(error, HTTPStatusError):
+		response = error.response
+		return (
+			response.status_code == HTTPStatus.FORBIDDEN or response.is_server_error
+		)
+	return isinstance(error, TransportError)
+
+
+class ProviderCircuit:
+	"""
+	Recent calls of one provider, skipped while they mostly fail.
+
+	Info:
+			The circuit opens when at least CIRCUIT_MIN_CALLS calls in the
+			last CIRCUIT_WINDOW seconds failed at CIRCUIT_ERROR_RATE or
+			more. After CIRCUIT_COOLDOWN it is half open: one call goes
+			through per cooldown, a success closes it, a failure opens it
+			again.
+	"""
+
+	__slots__ = ('calls', 'opened')
+
+	def __init__(self: Self) -> None:
+		"""
+		Start closed, without calls.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.calls: deque[tuple[float, bool]] = deque()
+		self.opened: float | None = None
+
+	def trim(self: Self, now: float) -> None:
+		"""Forget calls older than CIRCUIT_WINDOW."""
+		while self.calls and self.calls[0][0] < now - settings.CIRCUIT_WINDOW:
+			self.calls.popleft()
+
+	def error_rate(self: Self) -> float:
+		"""Get the part of the recent calls that failed, 0 without calls."""
+		self.trim(monotonic())
+		if not self.calls:
+			return 0.0
+		return sum(failed for _, failed in self.calls) / len(self.calls)
+
+	def state(self: Self) -> CircuitState:
+		"""Tell if the circuit is closed, open or half open (cooldown over)."""
+		if self.opened is None:
+			return 'closed'
+		if monotonic() - self.opened < settings.CIRCUIT_COOLDOWN:
+			return 'open'
+		return 'half_open'
+
+	def allow(self: Self) -> bool:
+		"""
+		Check if the provider can be called now.
+
+		A half open circuit lets this call through and waits another
+		cooldown for the next one.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				bool: False while open
+
+		"""
+		state = self.state()
+		if state == 'half_open':
+			self.opened = monotonic()
+		return state != 'open'
+
+	def record(self: Self, failed: bool) -> None:
+		"""
+		Add a finished call, opening or closing the circuit.
+
+		Args:
+				self (Self): scope of the class
+				failed (bool): the call raised
+
+		"""
+		now = monotonic()
+		self.trim(now)
+		self.calls.append((now, failed))
+		if not failed:
+			if self.opened is not None:
+				self.opened = None
+				self.calls.clear()
+			return
+		if self.opened is not None or (
+			len(self.calls) >= settings.CIRCUIT_MIN_CALLS
+			and self.error_rate() >= settings.CIRCUIT_ERROR_RATE
+		):
+			self.opened = now
+
+
+class Circuits:
+	"""Circuits of every provider called so far."""
+
+	__slots__ = ('providers',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start without providers.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.providers: dict[str, ProviderCircuit] = {}
+
+	def allow(self: Self, provider: str) -> bool:
+		"""
+		Check if provider can be called now, see ProviderCircuit.allow.
+
+		Args:
+				self (Self): scope of the class
+				provider (str): plugin provider name
+
+		Returns:
+				bool: False while its circuit is open
+
+		"""
+		circuit = self.providers.get(provider)
+		return circuit is None or circuit.allow()
+
+	def record(self: Self, provider: str, failed: bool) -> None:
+		"""
+		Add a finished call of provider.
+
+		Args:
+				self (Self): scope of the class
+				provider (str): plugin provider name
+				failed (bool): the call raised
+
+		"""
+		circuit = self.providers.get(provider) or self.providers.setdefault(
+			provider, ProviderCircuit()
+		)
+		circuit.record(failed)
+
+	def status(self: Self) -> dict[str, CircuitStatus]:
+		"""
+		Read every circuit.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				dict[str, CircuitStatus]: provider -> state, recent calls
+						and error rate
+
+		"""
+		status: dict[str, CircuitStatus] = {}
+		for provider, circuit in self.providers.items():
+			error_rate = circuit.error_rate()
+			status[provider] = {
+				'state': circuit.state(),
+				'calls': len(circuit.calls),
+				'error_rate': round(error_rate, 3),
+			}
+		return status
+
+
+circuits = Circuits()
@@ -0,0 +1,127 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from httpx import (
+	AsyncBaseTransport,
+	AsyncClient,
+	AsyncHTTPTransport,
+	Request,
+	Response,
+)
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from utils import tracing
+
+
+class TracingTransport(AsyncBaseTransport):
+	"""
+	Wrap a transport with a span per HTTP request.
+
+	Info:
+			A transport (not event hooks) so failed requests (timeouts,
+			connection errors) end their span too, with the exception.
+	"""
+
+	__slots__ = ('transport',)
+
+	def __init__(self: Self, transport: AsyncBaseTransport) -> None:
+		"""
+		Wrap the transport.
+
+		Args:
+				self (Self): scope of the class
+				transport (AsyncBaseTransport): transport sending the requests
+
+		"""
+		self.transport = transport
+
+	async def handle_async_request(self: Self, request: Request) -> Response:
+		"""
+		Send the request inside a client span.
+
+		Args:
+				self (Self): scope of the class
+				request (Request): the request
+
+		Returns:
+				Response: the response, status code set on the span
+
+		"""
+		with tracing.tracer.start_as_current_span(
+			f'{request.method} {request.url.host}',
+			kind=SpanKind.CLIENT,
+			attributes={
+				'http.request.method': request.method,
+				'server.address': request.url.host,
+				'url.full': str(request.url),
+			},
+		) as span:
+			response = await self.transport.handle_async_request(request)
+			span.set_attribute('http.response.status_code', response.status_code)
+			if response.is_server_error:
+				span.set_status(Status(StatusCode.ERROR))
+			return response
+
+	async def aclose(self: Self) -> None:
+		"""Close the wrapped transport."""
+		await self.transport.aclose()
+
+
+class HttpClientFactory:
+	"""
+	Create the httpx client used by every plugin.
+
+	Info:
+			Setting transport routes all plugin requests through it, e.g. the
+			offline provider simulator in benchmarks/simulator.py or an
+			httpx.MockTransport. None means the real network.
+	"""
+
+	__slots__ = ('transport',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start with the default (network) transport.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self.transport: AsyncBaseTransport | None = None
+
+	def __call__(self: Self) -> AsyncClient:
+		"""
+		Create a new client.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				AsyncClient: client bound to the configured transport,
+						wrapped by TracingTransport when tracing is on
+
+		"""
+		transport = self.transport or AsyncHTTPTransport()
+		if tracing.enabled():
+			transport = TracingTransport(transport)
+		return AsyncClient(transport=transport)
+
+
+http_client = HttpClientFactory()
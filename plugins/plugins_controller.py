@@ -16,52 +16,141 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from asyncio import as_completed, create_task
+from asyncio import FIRST_COMPLETED, Task, create_task, wait
+from collections.abc import Iterable
+from functools import partial
+from logging import getLogger
+from time import perf_counter
 
 from pydantic import PositiveInt
 
 from api.address.graphql_types import DictResponse
+from plugins.budget import budgets
 from plugins.cep_aberto.cep_aberto import CepAberto
+from plugins.circuit import circuits, is_outage
+from plugins.protocol import Plugin
 from plugins.viacep.viacep import ViaCep
+from utils.metrics import PLUGIN_ERRORS, PLUGIN_LATENCY
+from utils.settings import settings
+
+PLUGINS: tuple[type[Plugin], ...] = (CepAberto, ViaCep)
+
+logger = getLogger(__name__)
+
+
+def observe(
+	zipcode: PositiveInt, provider: str, start: float, task: Task[DictResponse]
+) -> None:
+	"""
+	Record latency and errors of a finished plugin call.
+
+	Cancelled calls (another plugin answered first) are not recorded,
+	failed ones are logged too. Both feed the provider circuit, only
+	outages count as failures (see plugins.circuit.is_outage).
+
+	Args:
+			zipcode (PositiveInt): zipcode searched
+			provider (str): plugin provider name
+			start (float): perf_counter when the call started
+			task (Task[DictResponse]): the finished call
+
+	"""
+	if task.cancelled():
+		return
+	latency = perf_counter() - start
+	PLUGIN_LATENCY.labels(provider).observe(latency)
+	error = task.exception()
+	circuits.record(provider, is_outage(error))
+	if error:
+		PLUGIN_ERRORS.labels(provider, type(error).__name__).inc()
+		logger.warning(
+			'Plugin %s failed',
+			provider,
+			extra={
+				'zipcode': zipcode,
+				'provider': provider,
+				'latency': round(latency, 6),
+				'error': type(error).__name__,
+			},
+		)
 
 
 async def get_zipcode_from_plugins(
 	zipcode: PositiveInt,
+	plugins: Iterable[type[Plugin]] = PLUGINS,
+	background: bool = False,
 ) -> DictResponse:
 	"""
 	Async call to all plugins at decame time
-	The first task that returns successfully returns and cancels the others.
+	The first task that returns successfully returns.
+
+	The other tasks keep running in 'pending' when ENRICH_ENABLED (their
+	results are merged later by jobs.enrichment), otherwise they are
+	cancelled.
+
+	Plugins that are not configured, without daily budget left (see
+	plugins.budget) or with an open circuit (see plugins.circuit) are
+	skipped, background calls only use their share of the budget.
 
 	Args:
 			zipcode (PositiveInt): zipcode needed to search address on api's
+			plugins (Iterable[type[Plugin]], optional): plugins to call.
+					Defaults to PLUGINS.
+			background (bool, optional): called by a background job, not by
+					a client. Defaults to False.
 
 	Returns:
 			DictResponse: 'data' key has all addresses
 					(db model) based on filter or empty list;
-					'provider' key has the service provider plugin
+					'provider' key has the service provider plugin;
+					'pending' key has the plugins still running
 
 	Todo:
 			Create all tasks based on config
-			Add logs
 
 	"""
-	tasks = []
-	for service in [CepAberto, ViaCep]:
+	tasks: set[Task[DictResponse]] = set()
+	for service in plugins:
 		try:
 			service_instance = service()
-			tasks.append(create_task(service_instance.get_address_by_zipcode(zipcode)))
 		except Exception:
-			# async insert logs
-			...
+			# not configured (CepAberto without a token), skipped quietly
+			# before it takes budget or a circuit trial
+			continue
+		if not circuits.allow(service.provider) or not budgets.acquire(
+			service.provider, background
+		):
+			continue
+		task = create_task(
+			service_instance.get_address_by_zipcode(zipcode),
+			name=service.provider,
+		)
+		task.add_done_callback(
+			partial(observe, zipcode, service.provider, perf_counter())
+		)
+		tasks.add(task)
 
-	for task in as_completed(tasks):
-		try:
-			result = await task
-			break
-		except Exception as e:
-			print('Erro:', e)
-			result = {'data': [], 'provider': 'Plugins'}
-			# there is no address found in this task
-			# async insert logs
+	result: DictResponse = {'data': [], 'provider': 'Plugins'}
+	pending = tasks
+	answered: set[Task[DictResponse]] = set()
+	while pending and not result['data']:
+		done, pending = await wait(pending, return_when=FIRST_COMPLETED)
+		for task in done:
+			if task.exception():
+				# there is no address found in this task, logged by observe
+				continue
+			if not result['data']:
+				# an empty answer (unknown zipcode) waits for the others
+				if task.result()['data']:
+					result = task.result()
+			else:
+				answered.add(task)
+
+	pending |= answered
+	if pending and result['data'] and settings.ENRICH_ENABLED:
+		result['pending'] = pending
+	else:
+		for task in pending:
+			task.cancel()
 
 	return result
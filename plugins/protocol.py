@@ -17,7 +17,7 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from abc import abstractmethod
-from typing import Protocol, Self, runtime_checkable
+from typing import ClassVar, Protocol, Self, runtime_checkable
 
 from pydantic import PositiveInt
 
@@ -26,6 +26,8 @@ from api.address.graphql_types import DictResponse
 
 @runtime_checkable
 class Plugin(Protocol):
+	provider: ClassVar[str]
+
 	@abstractmethod
 	async def get_address_by_zipcode(
 		self: Self, zipcode: PositiveInt
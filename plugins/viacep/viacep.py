@@ -16,23 +16,20 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
-from typing import Self, TypedDict
+from typing import Self
 
-from httpx import AsyncClient
+from msgspec import Struct, ValidationError
+from msgspec.json import Decoder
 from pydantic import PositiveInt
 
 from api.address.graphql_types import DictResponse
-from database.models.brazil import (
-	Address,
-	City,
-	StateAcronym,
-	StateAcronymName,
-	StateCreate,
-)
+from database.models.brazil import StateAcronym, StateAcronymName
+from database.models.records import AddressRecord, CityRecord, StateRecord
+from plugins.client import http_client
 from plugins.protocol import Plugin
 
 
-class ViaCepAddress(TypedDict):
+class ViaCepAddress(Struct, gc=False):
 	cep: str
 	logradouro: str
 	complemento: str
@@ -45,9 +42,19 @@ class ViaCepAddress(TypedDict):
 	siafi: str
 
 
+class ViaCepNotFound(Struct, gc=False):
+	erro: bool | str
+
+
+_decoder = Decoder(ViaCepAddress)
+_not_found = Decoder(ViaCepNotFound)
+
+
 class ViaCep(Plugin):
 	"""The service of https://viacep.com.br/ api."""
 
+	provider = 'viacep'
+
 	async def get_address_by_zipcode(
 		self: Self, zipcode: PositiveInt
 	) -> DictResponse:
@@ -63,28 +70,30 @@ class ViaCep(Plugin):
 				HTTPStatusError: raise_for_status if there's any error status code
 
 		Returns:
-				DictResponse: data key have a valid address (db model);
-						provider key have 'viacep' str
+				DictResponse: data key have a valid address (record), empty
+						when the zipcode does not exist; provider key have
+						'viacep' str
 
 		"""
-		async with AsyncClient() as client:
+		async with http_client() as client:
 			request = await client.get(f'https://viacep.com.br/ws/{zipcode:08}/json/')
 		request.raise_for_status()
 
-		return {
-			'data': [await self._request_to_database_model(request.json())],
-			'provider': 'viacep',
-		}
+		try:
+			data = [self._request_to_record(request.content)]
+		except ValidationError:
+			# unknown zipcodes are answered with 200 {"erro": true}
+			_not_found.decode(request.content)
+			data = []
+		return {'data': data, 'provider': self.provider}
 
 	@classmethod
-	async def _request_to_database_model(
-		cls, address_data: ViaCepAddress
-	) -> Address:
+	def _request_to_record(cls, content: bytes) -> AddressRecord:
 		"""
-		Receive a json/dict and return an Address object.
+		Decode the response body straight into an AddressRecord.
 
 		Args:
-				address_data (ViaCepAddress): here's a dict example:
+				content (bytes): raw json body, here's an example:
 						{
 							"cep": "01001-000",
 							"logradouro": "Praça da Sé",
@@ -98,31 +107,36 @@ class ViaCep(Plugin):
 							"siafi": "7107"
 						}
 
+		Raises:
+				ValidationError: if the body does not match ViaCepAddress
+
 		Returns:
-				Address: Database model
+				AddressRecord: Lightweight address, see AddressRecord.to_model
 
 		"""
-		acronym = address_data['uf']
-		state = StateCreate(
+		address_data = _decoder.decode(content)
+
+		acronym = address_data.uf
+		state = StateRecord(
 			acronym=StateAcronym(acronym),
 			name=getattr(StateAcronymName, acronym).value,
 		)
 
-		city = City(
-			ibge=int(address_data['ibge']),
-			name=address_data['localidade'],
-			ddd=int(address_data['ddd']),
+		city = CityRecord(
+			ibge=int(address_data.ibge),
+			name=address_data.localidade,
+			ddd=int(address_data.ddd),
 		)
 		logradouro = None
-		if address_data['logradouro']:
+		if address_data.logradouro:
 			logradouro = (
-				f'{address_data['logradouro']} {address_data['complemento']}'
+				f'{address_data.logradouro} {address_data.complemento}'
 			).strip()
 
-		return Address(
-			zipcode=int(address_data['cep'].replace('-', '')),
+		return AddressRecord(
+			zipcode=int(address_data.cep.replace('-', '')),
 			state=state,
 			city=city,
-			neighborhood=address_data['bairro'],
+			neighborhood=address_data.bairro,
 			complement=logradouro,
 		)
@@ -40,6 +40,7 @@ class TestMutation:
 		address = address.model_dump()
 		address.pop('id')
 		address.pop('updated_at')
+		address.pop('provider')
 		address['state'] = state
 		address['city'] = city
 
@@ -75,3 +76,65 @@ class TestMutation:
 
 		assert response.status_code == HTTPStatus.OK
 		assert response.json() == {'data': {'createAddress': address}}
+
+	async def test_create_addresses_per_item_results(
+		self: Self, client: AsyncClient, city: City
+	):
+		address = AddressFactory()
+		state = {'acronym': address.state.acronym.value, 'name': None}
+		city = {'ibge': city.ibge, 'name': None, 'ddd': None}
+		item = {
+			'zipcode': address.zipcode,
+			'state': state,
+			'city': city,
+			'neighborhood': address.neighborhood,
+			'complement': address.complement,
+		}
+		unknown_city = {
+			**item,
+			'zipcode': address.zipcode + 1,
+			'city': {**city, 'ibge': 1},
+		}
+
+		mutation = """
+			mutation TestMutation($addresses: [AddressInsertInput!]!) {
+				createAddresses(addresses: $addresses) {
+					zipcode
+					address {
+						zipcode
+						city {
+							ibge
+						}
+					}
+					error
+				}
+			}
+		"""
+
+		response = await client.post(
+			'/graphql',
+			json={
+				'query': mutation,
+				'variables': {'addresses': [item, item, unknown_city]},
+				'operationName': 'TestMutation',
+			},
+		)
+
+		assert response.status_code == HTTPStatus.OK
+		assert response.json()['data']['createAddresses'] == [
+			{
+				'zipcode': address.zipcode,
+				'address': {'zipcode': address.zipcode, 'city': {'ibge': city['ibge']}},
+				'error': None,
+			},
+			{
+				'zipcode': address.zipcode,
+				'address': None,
+				'error': 'Duplicated zipcode',
+			},
+			{
+				'zipcode': address.zipcode + 1,
+				'address': None,
+				'error': 'City not found',
+			},
+		]
@@ -40,6 +40,7 @@ class TestQuery:
 		address.pop('state_id')
 		address.pop('city_id')
 		address.pop('updated_at')
+		address.pop('provider')
 		address['state'] = state
 		address['city'] = city
 
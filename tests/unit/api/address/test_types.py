@@ -16,10 +16,15 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from types import SimpleNamespace
 from typing import Self
 
+from strawberry import Schema
+
 from api.address.graphql_types import AddressType, CityType, StateType
-from database.models.brazil import StateAcronym
+from api.schema import Mutation, Query
+from database.models.brazil import Address, City, State, StateAcronym
+from database.models.records import AddressRecord, CityRecord, StateRecord
 
 
 class TestTypes:
@@ -56,7 +61,60 @@ class TestTypes:
 			'complement': 'Praça da Sé - lado ímpar',
 			'coordinates': None,
 			'id': address_model['id'],
+			'provider': None,
 			'updated_at': address_model['updated_at'],
 		}
 		assert address_filter_input.state == state_input
 		assert address_filter_input.city == city_input
+
+	async def test_resolves_records_and_models(self: Self, mocker):
+		record = AddressRecord(
+			zipcode=1001000,
+			state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+			city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+			neighborhood='Sé',
+		)
+		model = Address(
+			zipcode=1002000,
+			neighborhood='Sé',
+			state=State(acronym=StateAcronym.SP, name='São Paulo'),
+			city=City(ibge=3550308, name='São Paulo', ddd=11),
+		)
+		mocker.patch(
+			'api.schema.get_address',
+			return_value={'data': [record, model], 'provider': 'local'},
+		)
+		schema = Schema(query=Query, mutation=Mutation)
+
+		result = await schema.execute(
+			'{ allAddress(filter: {}) { zipcode neighborhood'
+			' city { name } state { acronym } } }',
+			context_value=SimpleNamespace(session=None),
+		)
+
+		assert result.errors is None
+		assert result.data == {
+			'allAddress': [
+				{
+					'zipcode': zipcode,
+					'neighborhood': 'Sé',
+					'city': {'name': 'São Paulo'},
+					'state': {'acronym': 'SP'},
+				}
+				for zipcode in (1001000, 1002000)
+			]
+		}
+
+	async def test_rejects_other_objects(self: Self, mocker):
+		mocker.patch(
+			'api.schema.get_address',
+			return_value={'data': [object()], 'provider': 'local'},
+		)
+		schema = Schema(query=Query, mutation=Mutation)
+
+		result = await schema.execute(
+			'{ allAddress(filter: {}) { zipcode } }',
+			context_value=SimpleNamespace(session=None),
+		)
+
+		assert 'Expected value of type' in result.errors[0].message
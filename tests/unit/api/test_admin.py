@@ -0,0 +1,93 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from api import admin
+from database.slow_queries import SlowQueryLog
+
+
+@pytest.fixture()
+async def client(mocker):
+	mocker.patch.object(admin, 'settings', mocker.Mock(ADMIN_TOKEN='secret'))
+	log = SlowQueryLog(10)
+	mocker.patch.object(admin, 'slow_queries', log)
+	mocker.patch(
+		'database.slow_queries.settings',
+		mocker.Mock(SLOW_QUERY_EXPLAIN_RATE=0.0),
+	)
+	log.record('SELECT 1', {}, False, 0.25)
+
+	app = FastAPI()
+	app.include_router(admin.router)
+	async with AsyncClient(
+		transport=ASGITransport(app), base_url='http://test'
+	) as test_client:
+		yield test_client
+
+
+class TestAdmin:
+	async def test_disabled_without_token(self: Self, client, mocker):
+		mocker.patch.object(admin, 'settings', mocker.Mock(ADMIN_TOKEN=None))
+
+		response = await client.get(
+			'/admin/slow-queries', headers={'Authorization': 'Bearer '}
+		)
+
+		assert response.status_code == 404
+
+	@pytest.mark.parametrize(
+		'authorization', [None, 'Bearer wrong', 'Basic secret', 'secret']
+	)
+	async def test_wrong_token(self: Self, client, authorization):
+		headers = {'Authorization': authorization} if authorization else {}
+
+		response = await client.get('/admin/slow-queries', headers=headers)
+
+		assert response.status_code == 401
+		assert response.headers['www-authenticate'] == 'Bearer'
+
+	async def test_slow_queries(self: Self, client):
+		headers = {'Authorization': 'Bearer secret'}
+
+		response = await client.get(
+			'/admin/slow-queries', params={'limit': 5}, headers=headers
+		)
+
+		assert response.status_code == 200
+		assert response.json() == [
+			{
+				'statement': 'SELECT ?',
+				'count': 1,
+				'total_ms': 250.0,
+				'mean_ms': 250.0,
+				'max_ms': 250.0,
+				'last_parameters': '{}',
+				'plan': None,
+			}
+		]
+
+		response = await client.delete('/admin/slow-queries', headers=headers)
+
+		assert response.status_code == 204
+		response = await client.get('/admin/slow-queries', headers=headers)
+		assert response.json() == []
@@ -0,0 +1,194 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import gzip
+from typing import Self
+
+import brotli
+import pytest
+import zstandard
+
+from api import compression
+
+BODY = b'{"data": "' + b'x' * 2048 + b'"}'
+
+
+def scope(accept_encoding: str | None = None, **request_headers: str) -> dict:
+	headers = []
+	if accept_encoding is not None:
+		headers.append((b'accept-encoding', accept_encoding.encode()))
+	headers += [
+		(k.replace('_', '-').encode(), v.encode())
+		for k, v in request_headers.items()
+	]
+	return {'type': 'http', 'headers': headers}
+
+
+def app(
+	*chunks: bytes, content_type: str = 'application/json', **headers: str
+):
+	async def asgi(scope, receive, send):
+		raw = [(b'content-type', content_type.encode())]
+		raw += [
+			(k.replace('_', '-').encode(), v.encode()) for k, v in headers.items()
+		]
+		if len(chunks) == 1:
+			raw.append((b'content-length', str(len(chunks[0])).encode()))
+		await send({'type': 'http.response.start', 'status': 200, 'headers': raw})
+		for i, chunk in enumerate(chunks):
+			await send(
+				{
+					'type': 'http.response.body',
+					'body': chunk,
+					'more_body': i < len(chunks) - 1,
+				}
+			)
+
+	return asgi
+
+
+async def call(
+	asgi, accept_encoding: str | None, **request_headers: str
+) -> tuple[dict, bytes]:
+	messages = []
+
+	async def send(message):
+		messages.append(message)
+
+	await compression.CompressionMiddleware(asgi)(
+		scope(accept_encoding, **request_headers), None, send
+	)
+	headers = {k.decode(): v.decode() for k, v in messages[0]['headers']}
+	return headers, b''.join(m['body'] for m in messages[1:])
+
+
+class TestNegotiate:
+	@pytest.mark.parametrize(
+		('accept_encoding', 'expected'),
+		[
+			('', None),
+			('identity', None),
+			('gzip', 'gzip'),
+			('gzip, br', 'br'),
+			('gzip, deflate, br, zstd', 'zstd'),
+			('zstd;q=0.5, gzip', 'gzip'),
+			('br;q=0, *', 'zstd'),
+			('*;q=0', None),
+			('gzip;q=abc', None),
+		],
+	)
+	def test_negotiate(self: Self, accept_encoding, expected):
+		assert compression.negotiate(accept_encoding) == expected
+
+	def test_disabled(self: Self, mocker):
+		mocker.patch.object(
+			compression, 'settings', mocker.Mock(COMPRESSION_ENCODINGS=[])
+		)
+
+		assert compression.negotiate('gzip, br, zstd') is None
+
+
+class TestCompressionMiddleware:
+	@pytest.mark.parametrize(
+		('encoding', 'decompress'),
+		[
+			('gzip', gzip.decompress),
+			('br', brotli.decompress),
+			(
+				'zstd',
+				lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+			),
+		],
+	)
+	async def test_compress(self: Self, encoding, decompress):
+		headers, body = await call(app(BODY, etag='"1"'), encoding)
+
+		assert headers['content-encoding'] == encoding
+		assert headers['vary'] == 'Accept-Encoding'
+		assert headers['etag'] == f'"1-{encoding}"'
+		assert headers['content-length'] == str(len(body))
+		assert len(body) < len(BODY)
+		assert decompress(body) == BODY
+
+	async def test_not_modified_keeps_encoded_tag(self: Self):
+		seen = []
+
+		async def conditional(scope, receive, send):
+			if_none_match = dict(scope['headers'])[b'if-none-match']
+			seen.append(if_none_match)
+			status = 304 if if_none_match == b'"1"' else 200
+			await send(
+				{
+					'type': 'http.response.start',
+					'status': status,
+					'headers': [(b'etag', b'"1"')],
+				}
+			)
+			await send({'type': 'http.response.body', 'body': b''})
+
+		headers, body = await call(conditional, 'gzip', if_none_match='"1-gzip"')
+
+		assert seen == [b'"1"']
+		assert headers['etag'] == '"1-gzip"'
+		assert body == b''
+
+	def test_decoded_if_none_match(self: Self):
+		assert compression.decoded_if_none_match('"a-br", W/"b-br", "c"', 'br') == (
+			'"a", W/"b", "c"',
+			True,
+		)
+		assert compression.decoded_if_none_match('"a-gzip"', 'br') == (
+			'"a-gzip"',
+			False,
+		)
+
+	async def test_not_accepted(self: Self):
+		headers, body = await call(app(BODY), None)
+
+		assert 'content-encoding' not in headers
+		assert body == BODY
+
+	async def test_small_body(self: Self):
+		headers, body = await call(app(b'{"zipcode": 1001000}'), 'gzip')
+
+		assert 'content-encoding' not in headers
+		assert headers['vary'] == 'Accept-Encoding'
+		assert body == b'{"zipcode": 1001000}'
+
+	async def test_not_compressible(self: Self):
+		headers, body = await call(app(BODY, content_type='image/png'), 'gzip')
+
+		assert 'content-encoding' not in headers
+		assert body == BODY
+
+	async def test_already_encoded(self: Self):
+		headers, body = await call(app(BODY, content_encoding='br'), 'gzip')
+
+		assert headers['content-encoding'] == 'br'
+		assert body == BODY
+
+	async def test_streaming(self: Self):
+		chunks = [b'{"zipcode": %d}\n' % i for i in range(3)]
+
+		headers, body = await call(
+			app(*chunks, content_type='application/x-ndjson'), 'gzip'
+		)
+
+		assert headers['content-encoding'] == 'gzip'
+		assert 'content-length' not in headers
+		assert gzip.decompress(body) == b''.join(chunks)
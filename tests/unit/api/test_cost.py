@@ -0,0 +1,166 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from pytest_mock import MockerFixture
+from strawberry import Schema
+from strawberry.extensions import QueryDepthLimiter
+
+from api import cost
+from api.cost import CostLimiter, all_address_cost, page_size_limit
+from api.schema import Mutation, Query
+
+
+class Context:
+	session = None
+
+
+@pytest.fixture
+def get_address(mocker: MockerFixture):
+	return mocker.patch(
+		'api.schema.get_address', return_value={'data': [], 'provider': 'local'}
+	)
+
+
+@pytest.fixture
+def schema() -> Schema:
+	return Schema(query=Query, mutation=Mutation, extensions=[CostLimiter])
+
+
+def limits(mocker: MockerFixture, **update: object) -> None:
+	mocker.patch.object(cost, 'settings', cost.settings.model_copy(update=update))
+
+
+class TestPageSize:
+	def test_clamp(self: Self, mocker: MockerFixture):
+		limits(mocker, MAX_PAGE_SIZE=100, PAGE_SIZE_OVER_MAX='clamp')
+
+		assert page_size_limit(10) == 10
+		assert page_size_limit(10_000_000) == 100
+
+	def test_reject(self: Self, mocker: MockerFixture):
+		limits(mocker, MAX_PAGE_SIZE=100, PAGE_SIZE_OVER_MAX='reject')
+
+		with pytest.raises(Exception, match='at most 100'):
+			page_size_limit(101)
+
+	async def test_resolver_gets_clamped_value(
+		self: Self, mocker: MockerFixture, schema: Schema, get_address
+	):
+		limits(mocker, MAX_PAGE_SIZE=100, PAGE_SIZE_OVER_MAX='clamp')
+
+		result = await schema.execute(
+			'{ allAddress(filter: {}, pageSize: 10000000) { zipcode } }',
+			context_value=Context(),
+		)
+
+		assert result.errors is None
+		assert get_address.call_args.args[2] == 100
+
+
+class TestCost:
+	def test_all_address_cost(self: Self):
+		assert all_address_cost({'filter': {'zipcode': 1001000}}) == 1
+		assert all_address_cost({'filter': {}, 'pageSize': 10}) == 10
+		assert (
+			all_address_cost({'filter': {}, 'pageSize': 100, 'pageNumber': 5}) == 500
+		)
+
+	async def test_rejects_before_resolver(
+		self: Self, mocker: MockerFixture, schema: Schema, get_address
+	):
+		limits(mocker, MAX_QUERY_COST=1000)
+
+		result = await schema.execute(
+			'query ($page: Int!) {'
+			' allAddress(filter: {}, pageSize: 100, pageNumber: $page)'
+			' { zipcode city { name } state { name } } }',
+			variable_values={'page': 15},
+			context_value=Context(),
+		)
+
+		assert result.errors[0].extensions == {
+			'code': 'QUERY_TOO_EXPENSIVE',
+			'cost': 1500,
+		}
+		get_address.assert_not_called()
+
+	async def test_invalid_variables_reported_by_execution(
+		self: Self, mocker: MockerFixture, schema: Schema, get_address
+	):
+		limits(mocker, MAX_QUERY_COST=1000)
+
+		result = await schema.execute(
+			'query ($p: Int!) { allAddress(filter: {}, pageSize: $p) { zipcode } }',
+			variable_values={'p': 'x'},
+			context_value=Context(),
+		)
+
+		assert len(result.errors) == 1
+		assert result.errors[0].message.startswith("Variable '$p' got invalid value")
+		get_address.assert_not_called()
+
+	async def test_aliases_and_fragments_add_up(
+		self: Self, mocker: MockerFixture, schema: Schema, get_address
+	):
+		limits(mocker, MAX_QUERY_COST=1000)
+		query = (
+			'fragment page on Query { allAddress(filter: {}, pageSize: 100)'
+			' { zipcode } }'
+			'{ ...page a: allAddress(filter: {}, pageSize: 100) { zipcode }'
+			+ ''.join(
+				f' b{i}: allAddress(filter: {{}}, pageSize: 100) {{ zipcode }}'
+				for i in range(9)
+			)
+			+ ' }'
+		)
+
+		result = await schema.execute(query, context_value=Context())
+
+		assert result.errors[0].extensions['cost'] == 1000 + 100
+		get_address.assert_not_called()
+
+	async def test_zipcode_is_cheap(
+		self: Self, mocker: MockerFixture, schema: Schema, get_address
+	):
+		limits(mocker, MAX_QUERY_COST=10)
+
+		result = await schema.execute(
+			'{ allAddress(filter: {zipcode: 1001000}, pageNumber: 1000)'
+			' { zipcode city { name } } }',
+			context_value=Context(),
+		)
+
+		assert result.errors is None
+		get_address.assert_called_once()
+
+
+class TestDepth:
+	async def test_depth_limit(self: Self, get_address):
+		schema = Schema(
+			query=Query, mutation=Mutation, extensions=[QueryDepthLimiter(max_depth=1)]
+		)
+
+		result = await schema.execute(
+			'{ allAddress(filter: {}) { city { name } } }', context_value=Context()
+		)
+
+		assert 'exceeds maximum operation depth' in result.errors[0].message
+		get_address.assert_not_called()
@@ -0,0 +1,80 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from pytest_mock import MockerFixture
+from strawberry import Schema
+
+from api import document_cache
+from api.document_cache import DocumentCache
+from api.schema import Mutation, Query
+from utils.lru import LRUCache
+
+QUERY = '{ allAddress(filter: {zipcode: 1001000}) { zipcode } }'
+
+
+class Context:
+	session = None
+
+
+@pytest.fixture
+def schema(mocker: MockerFixture) -> Schema:
+	mocker.patch.object(document_cache, 'documents', LRUCache(10))
+	mocker.patch(
+		'api.schema.get_address', return_value={'data': [], 'provider': 'local'}
+	)
+	return Schema(query=Query, mutation=Mutation, extensions=[DocumentCache])
+
+
+class TestDocumentCache:
+	async def test_repeat_skips_parse_and_validation(
+		self: Self, schema: Schema, mocker: MockerFixture
+	):
+		first = await schema.execute(QUERY, context_value=Context())
+		parse_document = mocker.patch('strawberry.schema.execute.parse_document')
+		validate = mocker.patch('strawberry.schema.execute.validate_document')
+
+		second = await schema.execute(QUERY, context_value=Context())
+
+		assert first.data == second.data == {'allAddress': []}
+		parse_document.assert_not_called()
+		validate.assert_not_called()
+		assert document_cache.documents.stats()['hits'] == 1
+
+	async def test_validation_errors_are_cached(
+		self: Self, schema: Schema, mocker: MockerFixture
+	):
+		query = '{ allAddress(filter: {}) { unknownField } }'
+		first = await schema.execute(query, context_value=Context())
+		validate = mocker.patch('strawberry.schema.execute.validate_document')
+
+		second = await schema.execute(query, context_value=Context())
+
+		validate.assert_not_called()
+		assert first.errors
+		assert [e.message for e in second.errors] == [
+			e.message for e in first.errors
+		]
+
+	async def test_syntax_errors_are_not_cached(self: Self, schema: Schema):
+		result = await schema.execute('{ allAddress(', context_value=Context())
+
+		assert result.errors
+		assert len(document_cache.documents) == 0
@@ -0,0 +1,130 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Self
+
+from msgspec.json import decode
+
+from api import export
+from database.models.brazil import StateAcronym
+
+DATA = {
+	'zipcode': 1001000,
+	'neighborhood': 'Sé',
+	'complement': 'Praça da Sé - lado ímpar',
+	'coordinates': {'latitude': -23.55, 'longitude': -46.63, 'altitude': None},
+	'updated_at': datetime(2024, 1, 2, 3, 4, 5),
+	'city_ibge': 3550308,
+	'city_name': 'São Paulo',
+	'city_ddd': 11,
+	'state_acronym': StateAcronym.SP,
+	'state_name': 'São Paulo',
+}
+ROW = SimpleNamespace(**DATA, _mapping=DATA)
+
+
+class Session:
+	closed = False
+
+	async def __aenter__(self: Self) -> Self:
+		return self
+
+	async def __aexit__(self: Self, *args) -> None:
+		self.closed = True
+
+
+class TestExport:
+	def test_ndjson_chunk(self: Self):
+		lines = export.ndjson_chunk([ROW, ROW]).splitlines()
+
+		assert len(lines) == 2
+		assert decode(lines[0]) == {
+			'zipcode': 1001000,
+			'state': {'acronym': 'SP', 'name': 'São Paulo'},
+			'city': {'ibge': 3550308, 'name': 'São Paulo', 'ddd': 11},
+			'neighborhood': 'Sé',
+			'complement': 'Praça da Sé - lado ímpar',
+			'coordinates': {'latitude': -23.55, 'longitude': -46.63, 'altitude': None},
+			'updated_at': '2024-01-02T03:04:05',
+		}
+
+	def test_csv_chunk(self: Self):
+		row = SimpleNamespace(**{**DATA, 'coordinates': None})
+
+		assert export.csv_chunk([row], header=True).decode().splitlines() == [
+			','.join(export.CSV_HEADER),
+			'1001000,SP,São Paulo,3550308,São Paulo,11,Sé,'
+			'Praça da Sé - lado ímpar,,,,2024-01-02T03:04:05',
+		]
+		assert export.csv_chunk([]) == b''
+
+	def test_export_filter(self: Self):
+		filter = export.export_filter(city=3550308, state=StateAcronym.SP)
+
+		assert filter.zipcode is None
+		assert filter.city.ibge == 3550308
+		assert filter.state.acronym == StateAcronym.SP
+		assert export.export_filter().city is None
+
+	async def test_export_chunks_csv_header_once(self: Self, mocker):
+		async def stream_addresses(session, filter, chunk_size):
+			yield [ROW]
+			yield [ROW]
+
+		mocker.patch('api.export.AsyncSession', return_value=Session())
+		mocker.patch('api.export.functions.stream_addresses', stream_addresses)
+
+		chunks = [
+			chunk async for chunk in export.export_chunks(export.export_filter(), 'csv')
+		]
+
+		assert len(chunks) == 2
+		assert chunks[0].startswith(b'zipcode,')
+		assert not chunks[1].startswith(b'zipcode,')
+
+	async def test_export_chunks_empty_csv(self: Self, mocker):
+		async def stream_addresses(session, filter, chunk_size):
+			return
+			yield
+
+		mocker.patch('api.export.AsyncSession', return_value=Session())
+		mocker.patch('api.export.functions.stream_addresses', stream_addresses)
+
+		chunks = [
+			chunk async for chunk in export.export_chunks(export.export_filter(), 'csv')
+		]
+
+		assert chunks == [f'{",".join(export.CSV_HEADER)}\r\n'.encode()]
+
+	async def test_export_chunks_closes_session_on_disconnect(self: Self, mocker):
+		session = Session()
+
+		async def stream_addresses(session, filter, chunk_size):
+			while True:
+				yield [ROW]
+
+		mocker.patch('api.export.AsyncSession', return_value=session)
+		mocker.patch('api.export.functions.stream_addresses', stream_addresses)
+
+		chunks = export.export_chunks(export.export_filter(), 'ndjson')
+		await anext(chunks)
+		await chunks.aclose()
+
+		assert session.closed
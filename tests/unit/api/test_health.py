@@ -0,0 +1,118 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+
+from api import health
+from jobs import warmup
+
+
+def client() -> AsyncClient:
+	app = FastAPI()
+	app.include_router(health.router)
+	return AsyncClient(transport=ASGITransport(app), base_url='http://test')
+
+
+@pytest.fixture
+def state(mocker: MockerFixture):
+	database = mocker.patch.object(health, 'database')
+	database.status.return_value = {
+		'available': True,
+		'latency': 0.001,
+		'age': 1.0,
+		'error': None,
+	}
+	circuits = mocker.patch.object(health, 'circuits')
+	circuits.status.return_value = {
+		'viacep': {'state': 'closed', 'calls': 3, 'error_rate': 0.0}
+	}
+	mocker.patch.object(health.tasks, 'pending', return_value=2)
+	warmup.ready.set()
+	yield database, circuits
+	warmup.ready.clear()
+
+
+class TestHealth:
+	async def test_ok(self: Self, state):
+		async with client() as test_client:
+			response = await test_client.get('/health')
+
+		body = response.json()
+		assert response.status_code == 200
+		assert body['status'] == 'ok'
+		assert body['ready'] is True
+		assert body['plugins']['viacep']['state'] == 'closed'
+		assert body['background_tasks'] == 2
+		assert set(body['pool']) == {'size', 'checked_out', 'overflow'}
+
+	async def test_degraded_still_alive(self: Self, state):
+		_, circuits = state
+		circuits.status.return_value = {
+			'viacep': {'state': 'open', 'calls': 10, 'error_rate': 1.0}
+		}
+
+		async with client() as test_client:
+			health_response = await test_client.get('/health')
+			ready_response = await test_client.get('/ready')
+
+		assert health_response.status_code == 200
+		assert health_response.json()['status'] == 'degraded'
+		# local lookups still work without providers
+		assert ready_response.status_code == 200
+
+	async def test_no_database_round_trip(self: Self, state, mocker):
+		engine = mocker.patch.object(health, 'engine')
+
+		async with client() as test_client:
+			response = await test_client.get('/health')
+
+		engine.connect.assert_not_called()
+		assert response.json()['pool'] is None
+
+
+class TestReady:
+	async def test_after_warm_up(self: Self, state):
+		warmup.ready.clear()
+		async with client() as test_client:
+			before = await test_client.get('/ready')
+			warmup.ready.set()
+			after = await test_client.get('/ready')
+
+		assert before.status_code == 503
+		assert after.status_code == 200
+		assert after.json()['ready'] is True
+
+	async def test_database_unavailable(self: Self, state):
+		database, _ = state
+		database.status.return_value = {
+			'available': False,
+			'latency': None,
+			'age': 1.0,
+			'error': 'OSError',
+		}
+
+		async with client() as test_client:
+			response = await test_client.get('/ready')
+
+		assert response.status_code == 503
+		assert response.json()['database']['error'] == 'OSError'
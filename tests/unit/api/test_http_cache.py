@@ -0,0 +1,87 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime, timedelta
+from email.utils import format_datetime
+from typing import Self
+
+from api.http_cache import cache_headers, is_not_modified
+from database.models.brazil import Address
+from database.models.records import AddressRecord
+
+UPDATED_AT = datetime(2024, 8, 20, 10, 30, 15, 123456)
+
+
+class TestCacheHeaders:
+	def test_stored_address(self: Self):
+		headers = cache_headers(Address(zipcode=1001000, updated_at=UPDATED_AT))
+
+		assert headers['Cache-Control'].startswith('public, max-age=')
+		assert headers['ETag'].startswith('"1001000-')
+		assert headers['Last-Modified'].endswith('GMT')
+
+	def test_etag_changes_with_updated_at(self: Self):
+		old = cache_headers(Address(zipcode=1001000, updated_at=UPDATED_AT))
+		new = cache_headers(
+			Address(zipcode=1001000, updated_at=UPDATED_AT + timedelta(seconds=1))
+		)
+
+		assert old['ETag'] != new['ETag']
+
+	def test_record_from_body(self: Self):
+		record = AddressRecord(zipcode=1001000)
+
+		assert 'ETag' not in cache_headers(record)
+		assert (
+			cache_headers(record, b'{}')['ETag'] != cache_headers(record, b'[]')['ETag']
+		)
+		assert 'Last-Modified' not in cache_headers(record, b'{}')
+
+
+class TestIsNotModified:
+	headers = cache_headers(Address(zipcode=1001000, updated_at=UPDATED_AT))
+
+	def test_no_conditional_headers(self: Self):
+		assert not is_not_modified({}, self.headers)
+
+	def test_if_none_match(self: Self):
+		etag = self.headers['ETag']
+
+		assert is_not_modified({'if-none-match': etag}, self.headers)
+		assert is_not_modified({'if-none-match': f'"a", W/{etag}'}, self.headers)
+		assert is_not_modified({'if-none-match': '*'}, self.headers)
+		assert not is_not_modified({'if-none-match': '"a"'}, self.headers)
+
+	def test_if_none_match_wins(self: Self):
+		assert not is_not_modified(
+			{
+				'if-none-match': '"a"',
+				'if-modified-since': self.headers['Last-Modified'],
+			},
+			self.headers,
+		)
+
+	def test_if_modified_since(self: Self):
+		last_modified = self.headers['Last-Modified']
+		before = format_datetime(
+			UPDATED_AT.astimezone() - timedelta(minutes=1), usegmt=False
+		)
+
+		assert is_not_modified({'if-modified-since': last_modified}, self.headers)
+		assert not is_not_modified({'if-modified-since': before}, self.headers)
+		assert not is_not_modified({'if-modified-since': 'nonsense'}, self.headers)
@@ -0,0 +1,58 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from pytest_mock import MockerFixture
+from strawberry import Schema
+
+from api.schema import Mutation, Query
+
+
+class Context:
+	session = None
+
+
+class TestSelectedPaths:
+	async def test_nested_fields_and_fragments(self: Self, mocker: MockerFixture):
+		get_address = mocker.patch(
+			'api.schema.get_address', return_value={'data': [], 'provider': 'local'}
+		)
+		schema = Schema(query=Query, mutation=Mutation)
+
+		result = await schema.execute(
+			"""
+			query {
+				allAddress(filter: {}) {
+					zipcode
+					...City
+					... on Address { neighborhood }
+				}
+			}
+			fragment City on Address { city { name } }
+			""",
+			context_value=Context(),
+		)
+
+		assert result.errors is None
+		assert get_address.call_args.kwargs['fields'] == {
+			'zipcode',
+			'neighborhood',
+			'city',
+			'city.name',
+		}
@@ -0,0 +1,118 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import strawberry
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from prometheus_client import REGISTRY
+
+from api import metrics
+
+LATENCY = 'jacobson_http_request_duration_seconds_count'
+
+
+def sample(name: str, **labels: str) -> float:
+	return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def client() -> AsyncClient:
+	app = FastAPI()
+	app.add_middleware(metrics.MetricsMiddleware)
+	app.include_router(metrics.router)
+
+	@app.get('/items/{item}')
+	async def item(item: int) -> dict:
+		return {'item': item}
+
+	return AsyncClient(transport=ASGITransport(app), base_url='http://test')
+
+
+class TestOperationLabel:
+	def test_bounded(self: Self, mocker):
+		mocker.patch.object(metrics, '_operations', set())
+		mocker.patch.object(
+			metrics, 'settings', mocker.Mock(METRICS_MAX_OPERATIONS=2)
+		)
+
+		labels = [
+			metrics.operation_label(name) for name in ('a', None, 'b', 'c', 'a', '')
+		]
+
+		assert labels == ['a', 'anonymous', 'b', 'other', 'a', 'anonymous']
+
+
+class TestOperationMetrics:
+	async def test_by_operation_name(self: Self):
+		@strawberry.type
+		class Query:
+			@strawberry.field
+			def ping(self) -> str:
+				return 'pong'
+
+		schema = strawberry.Schema(Query, extensions=[metrics.OperationMetrics])
+		name = 'jacobson_graphql_operation_duration_seconds_count'
+		before = sample(name, operation='Ping')
+
+		result = await schema.execute('query Ping { ping }', operation_name='Ping')
+
+		assert result.data == {'ping': 'pong'}
+		assert sample(name, operation='Ping') == before + 1
+
+
+class TestMetricsMiddleware:
+	async def test_route_template_and_status(self: Self):
+		ok = sample(LATENCY, method='GET', route='/items/{item}', status='200')
+		invalid = sample(LATENCY, method='GET', route='/items/{item}', status='422')
+		unmatched = sample(LATENCY, method='GET', route='unmatched', status='404')
+
+		async with client() as test_client:
+			await test_client.get('/items/1')
+			await test_client.get('/items/2')
+			await test_client.get('/items/x')
+			await test_client.get('/nothing')
+
+		assert (
+			sample(LATENCY, method='GET', route='/items/{item}', status='200') == ok + 2
+		)
+		assert (
+			sample(LATENCY, method='GET', route='/items/{item}', status='422')
+			== invalid + 1
+		)
+		assert (
+			sample(LATENCY, method='GET', route='unmatched', status='404')
+			== unmatched + 1
+		)
+
+
+class TestMetricsEndpoint:
+	async def test_scrape(self: Self, mocker):
+		mocker.patch.object(metrics.tasks, 'pending', return_value=3)
+
+		async with client() as test_client:
+			response = await test_client.get('/metrics')
+
+		assert response.status_code == 200
+		assert response.headers['content-type'].startswith('text/plain')
+		assert 'jacobson_background_tasks 3.0' in response.text
+		assert 'jacobson_db_pool_size 20.0' in response.text
+		assert 'jacobson_cache_entries{cache="documents"}' in response.text
+		assert 'jacobson_provider_budget_remaining{provider=' in response.text
+		# the scrape itself is not a request series
+		assert sample(LATENCY, method='GET', route='/metrics', status='200') == 0
@@ -0,0 +1,149 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import AsyncGenerator
+from hashlib import sha256
+from json import dumps
+from types import SimpleNamespace
+from typing import Self
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from pytest_mock import MockerFixture
+
+from api import persisted_queries
+from api.persisted_queries import (
+	PersistedQueryNotFoundError,
+	PersistedQueryStore,
+)
+from api.schema import graphql_app
+from database.engine import get_session
+from database.models.brazil import StateAcronym
+
+QUERY = '{ allAddress(filter: {zipcode: 1001000}) { zipcode neighborhood } }'
+HASH = sha256(QUERY.encode()).hexdigest()
+EXTENSIONS = {'persistedQuery': {'version': 1, 'sha256Hash': HASH}}
+
+
+async def no_session() -> AsyncGenerator[None, None]:
+	yield None
+
+
+@pytest.fixture
+async def client(mocker: MockerFixture) -> AsyncGenerator[AsyncClient, None]:
+	mocker.patch.object(
+		persisted_queries, 'persisted_queries', PersistedQueryStore(10)
+	)
+	row = {
+		'zipcode': 1001000,
+		'provider': None,
+		'updated_at': None,
+		'neighborhood': 'Sé',
+		'city_ibge': 3550308,
+		'city_name': 'São Paulo',
+		'city_ddd': 11,
+		'state_acronym': StateAcronym.SP,
+		'state_name': 'São Paulo',
+	}
+	mocker.patch(
+		'api.resolvers.functions.get_address_rows',
+		return_value=[SimpleNamespace(**row, _mapping=row)],
+	)
+	app = FastAPI()
+	app.include_router(graphql_app, prefix='/graphql')
+	app.dependency_overrides[get_session] = no_session
+	transport = ASGITransport(app=app)  # type: ignore[arg-type]
+	async with AsyncClient(transport=transport, base_url='http://test') as client:
+		yield client
+
+
+class TestPersistedQueryStore:
+	def test_resolve_without_hash(self: Self):
+		assert PersistedQueryStore(2).resolve(QUERY, None) == QUERY
+
+	def test_resolve_registers(self: Self):
+		store = PersistedQueryStore(2)
+
+		assert store.resolve(QUERY, EXTENSIONS) == QUERY
+		assert store.resolve(None, EXTENSIONS) == QUERY
+
+	def test_resolve_unknown_hash(self: Self):
+		with pytest.raises(PersistedQueryNotFoundError):
+			PersistedQueryStore(2).resolve(None, EXTENSIONS)
+
+	def test_resolve_wrong_hash(self: Self):
+		with pytest.raises(Exception, match='does not match'):
+			PersistedQueryStore(2).resolve('{ other }', EXTENSIONS)
+
+
+class TestPersistedQueryRouter:
+	async def test_post_protocol(self: Self, client: AsyncClient):
+		miss = await client.post('/graphql', json={'extensions': EXTENSIONS})
+
+		assert miss.status_code == 200
+		assert miss.json()['errors'][0]['message'] == 'PersistedQueryNotFound'
+
+		register = await client.post(
+			'/graphql', json={'query': QUERY, 'extensions': EXTENSIONS}
+		)
+		hit = await client.post('/graphql', json={'extensions': EXTENSIONS})
+
+		expected = {'allAddress': [{'zipcode': 1001000, 'neighborhood': 'Sé'}]}
+		assert register.json() == {'data': expected}
+		assert hit.json() == {'data': expected}
+
+	async def test_hit_skips_parse_and_validation(
+		self: Self, client: AsyncClient, mocker: MockerFixture
+	):
+		await client.post(
+			'/graphql', json={'query': QUERY, 'extensions': EXTENSIONS}
+		)
+		parse = mocker.patch('strawberry.schema.execute.parse_document')
+		validate = mocker.patch('strawberry.schema.execute.validate_document')
+
+		hit = await client.post('/graphql', json={'extensions': EXTENSIONS})
+
+		assert 'errors' not in hit.json()
+		parse.assert_not_called()
+		validate.assert_not_called()
+
+	async def test_get_is_cacheable(self: Self, client: AsyncClient):
+		await client.post(
+			'/graphql', json={'query': QUERY, 'extensions': EXTENSIONS}
+		)
+
+		response = await client.get(
+			'/graphql', params={'extensions': dumps(EXTENSIONS)}
+		)
+
+		assert response.json()['data']['allAddress'][0]['zipcode'] == 1001000
+		assert response.headers['cache-control'].startswith('public, max-age=')
+
+	async def test_wrong_hash(self: Self, client: AsyncClient):
+		response = await client.post(
+			'/graphql', json={'query': '{ __typename }', 'extensions': EXTENSIONS}
+		)
+
+		assert response.status_code == 400
+
+	async def test_plain_query(self: Self, client: AsyncClient):
+		response = await client.post('/graphql', json={'query': QUERY})
+
+		assert response.json()['data']['allAddress'][0]['neighborhood'] == 'Sé'
+		assert 'cache-control' not in response.headers
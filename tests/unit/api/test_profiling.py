@@ -0,0 +1,138 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+from pathlib import Path
+from typing import Self
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.datastructures import Headers
+
+from api import profiling
+
+
+@pytest.fixture()
+def settings(mocker):
+	return mocker.patch.object(
+		profiling,
+		'settings',
+		mocker.Mock(
+			PROFILING_ENABLED=True,
+			PROFILING_INTERVAL=0.001,
+			PROFILING_DIRECTORY=None,
+			ADMIN_TOKEN='secret',
+		),
+	)
+
+
+def client() -> AsyncClient:
+	app = FastAPI()
+	app.add_middleware(profiling.ProfilingMiddleware)
+
+	@app.get('/lookup')
+	async def lookup() -> dict:
+		return {'cep': '01001000'}
+
+	return AsyncClient(transport=ASGITransport(app), base_url='http://test')
+
+
+class TestProfileFormat:
+	@pytest.mark.parametrize(
+		('enabled', 'admin_token', 'headers', 'expected'),
+		[
+			(True, 'secret', {'x-profile-token': 'secret'}, 'html'),
+			(
+				True,
+				'secret',
+				{'x-profile-token': 'secret', 'x-profile-format': 'speedscope'},
+				'speedscope',
+			),
+			(
+				True,
+				'secret',
+				{'x-profile-token': 'secret', 'x-profile-format': 'other'},
+				'html',
+			),
+			(True, 'secret', {'x-profile-token': 'wrong'}, None),
+			(True, 'secret', {}, None),
+			(True, None, {'x-profile-token': 'secret'}, None),
+			(False, 'secret', {'x-profile-token': 'secret'}, None),
+		],
+	)
+	def test_profile_format(
+		self: Self, settings, enabled, admin_token, headers, expected
+	):
+		settings.PROFILING_ENABLED = enabled
+		settings.ADMIN_TOKEN = admin_token
+
+		assert profiling.profile_format(Headers(headers)) == expected
+
+
+class TestProfilingMiddleware:
+	async def test_not_profiled(self: Self, settings):
+		async with client() as test_client:
+			response = await test_client.get('/lookup')
+
+		assert response.json() == {'cep': '01001000'}
+
+	async def test_html(self: Self, settings):
+		async with client() as test_client:
+			response = await test_client.get(
+				'/lookup', headers={'X-Profile-Token': 'secret'}
+			)
+
+		assert response.headers['content-type'].startswith('text/html')
+		assert 'pyinstrument' in response.text
+
+	async def test_speedscope(self: Self, settings):
+		async with client() as test_client:
+			response = await test_client.get(
+				'/lookup',
+				headers={
+					'X-Profile-Token': 'secret',
+					'X-Profile-Format': 'speedscope',
+				},
+			)
+
+		assert response.headers['content-type'] == 'application/json'
+		assert 'speedscope' in response.json()['$schema']
+
+	async def test_stored(self: Self, settings, tmp_path):
+		settings.PROFILING_DIRECTORY = str(tmp_path)
+
+		async with client() as test_client:
+			response = await test_client.get(
+				'/lookup', headers={'X-Profile-Token': 'secret'}
+			)
+
+		file = Path(response.headers['x-profile-file'])
+		assert response.json() == {'cep': '01001000'}
+		assert file.parent == tmp_path
+		assert file.name.endswith('-lookup.html')
+		assert 'pyinstrument' in file.read_text()
+
+
+class TestRender:
+	def test_speedscope_is_json(self: Self):
+		profiler = profiling.Profiler()
+		profiler.start()
+		profiler.stop()
+
+		assert json.loads(profiling.render(profiler, 'speedscope'))
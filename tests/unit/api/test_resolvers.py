@@ -0,0 +1,120 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from types import SimpleNamespace
+from typing import Self
+
+import pytest
+from graphql import GraphQLError
+
+from api.address.graphql_inputs import AddressFilterInput
+from api.resolvers import get_address, insert_addresses
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord, StateRecord
+
+
+class TestResolvers:
+	async def test_get_address_local(self: Self, mocker):
+		mocker.patch(
+			'api.resolvers.functions.get_address_by_dc_join_state_join_city',
+			return_value=['address'],
+		)
+		schedule = mocker.patch('api.resolvers.refresh.schedule_refresh')
+		plugins = mocker.patch('api.resolvers.get_zipcode_from_plugins')
+		lookups = mocker.patch('api.resolvers.LOOKUPS')
+
+		result = await get_address(
+			'session', AddressFilterInput(zipcode=1001000), 1, 1
+		)
+
+		assert result == {'data': ['address'], 'provider': 'local'}
+		schedule.assert_called_once_with(['address'])
+		plugins.assert_not_called()
+		lookups.labels.assert_called_once_with('local')
+
+	async def test_get_address_stores_plugin_result(self: Self, mocker):
+		record = AddressRecord(
+			zipcode=1001000, state=StateRecord(acronym=StateAcronym.SP)
+		)
+		plugin_result = {'data': [record], 'provider': 'viacep'}
+		mocker.patch(
+			'api.resolvers.functions.get_address_by_dc_join_state_join_city',
+			return_value=[],
+		)
+		mocker.patch(
+			'api.resolvers.get_zipcode_from_plugins', return_value=plugin_result
+		)
+		spawn = mocker.patch('api.resolvers.spawn')
+		store = mocker.patch('api.resolvers.store', new=mocker.Mock())
+		lookups = mocker.patch('api.resolvers.LOOKUPS')
+
+		result = await get_address(
+			'session', AddressFilterInput(zipcode=1001000), 1, 1
+		)
+
+		assert result is plugin_result
+		lookups.labels.assert_called_once_with('viacep')
+		store.assert_called_once_with(plugin_result)
+		spawn.assert_called_once_with(store.return_value, name='store-1001000')
+
+	async def test_get_address_not_found(self: Self, mocker):
+		mocker.patch(
+			'api.resolvers.functions.get_address_by_dc_join_state_join_city',
+			return_value=[],
+		)
+		mocker.patch(
+			'api.resolvers.get_zipcode_from_plugins',
+			return_value={'data': [], 'provider': 'Plugins'},
+		)
+		spawn = mocker.patch('api.resolvers.spawn')
+		lookups = mocker.patch('api.resolvers.LOOKUPS')
+
+		await get_address('session', AddressFilterInput(zipcode=1001000), 1, 1)
+
+		spawn.assert_not_called()
+		lookups.labels.assert_called_once_with('not_found')
+
+	async def test_insert_addresses_limit(self: Self, mocker):
+		mocker.patch('api.resolvers.settings', mocker.Mock(MAX_BULK_ADDRESSES=1))
+		insert = mocker.patch('api.resolvers.functions.insert_addresses')
+
+		with pytest.raises(GraphQLError, match='at most 1 addresses'):
+			await insert_addresses('session', ['a', 'b'])
+
+		insert.assert_not_called()
+
+	async def test_get_address_projected(self: Self, mocker):
+		row = {'zipcode': 1001000, 'provider': None, 'updated_at': None}
+		rows = [SimpleNamespace(**row, _mapping=row)]
+		get_rows = mocker.patch(
+			'api.resolvers.functions.get_address_rows', return_value=rows
+		)
+		schedule = mocker.patch('api.resolvers.refresh.schedule_refresh')
+
+		result = await get_address(
+			'session', AddressFilterInput(), 10, 1, fields={'zipcode'}
+		)
+
+		assert result == {
+			'data': [AddressRecord(zipcode=1001000)],
+			'provider': 'local',
+		}
+		get_rows.assert_called_once_with(
+			'session', AddressFilterInput(), {'zipcode'}, 10, 1
+		)
+		schedule.assert_called_once_with(rows)
@@ -0,0 +1,118 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from fastapi import HTTPException
+from msgspec.json import decode
+
+from api import rest
+from database.models.brazil import Address, City, State, StateAcronym
+from database.models.records import AddressRecord, CityRecord, StateRecord
+
+
+class Request:
+	def __init__(self: Self, **headers: str):
+		self.headers = headers
+
+
+EXPECTED = {
+	'zipcode': 1001000,
+	'state': {'acronym': 'SP', 'name': 'São Paulo'},
+	'city': {'ibge': 3550308, 'name': 'São Paulo', 'ddd': 11},
+	'neighborhood': 'Sé',
+	'complement': 'Praça da Sé - lado ímpar',
+	'coordinates': None,
+}
+
+
+class TestRest:
+	async def test_get_zipcode_local(self: Self, mocker):
+		address = Address(
+			zipcode=1001000,
+			neighborhood='Sé',
+			complement='Praça da Sé - lado ímpar',
+			state=State(acronym=StateAcronym.SP, name='São Paulo'),
+			city=City(ibge=3550308, name='São Paulo', ddd=11),
+		)
+		get_address = mocker.patch(
+			'api.rest.get_address',
+			return_value={'data': [address], 'provider': 'local'},
+		)
+
+		response = await rest.get_zipcode(Request(), 1001000, 'session')
+
+		assert get_address.call_args.args[1].zipcode == 1001000
+		assert response.media_type == 'application/json'
+		body = decode(response.body)
+		assert body.pop('updated_at') == address.updated_at.isoformat()
+		assert body == EXPECTED
+		assert response.headers['etag'].startswith('"1001000-')
+		assert 'last-modified' in response.headers
+
+	async def test_get_zipcode_plugin(self: Self, mocker):
+		record = AddressRecord(
+			zipcode=1001000,
+			state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+			city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+			neighborhood='Sé',
+			complement='Praça da Sé - lado ímpar',
+		)
+		mocker.patch(
+			'api.rest.get_address',
+			return_value={'data': [record], 'provider': 'viacep'},
+		)
+
+		response = await rest.get_zipcode(Request(), 1001000, 'session')
+
+		assert decode(response.body) == {**EXPECTED, 'updated_at': None}
+		assert 'last-modified' not in response.headers
+
+	async def test_get_zipcode_not_modified(self: Self, mocker):
+		address = Address(
+			zipcode=1001000,
+			neighborhood='Sé',
+			state=State(acronym=StateAcronym.SP, name='São Paulo'),
+			city=City(ibge=3550308, name='São Paulo', ddd=11),
+		)
+		mocker.patch(
+			'api.rest.get_address',
+			return_value={'data': [address], 'provider': 'local'},
+		)
+		encode = mocker.spy(rest, 'encode_address')
+		first = await rest.get_zipcode(Request(), 1001000, 'session')
+
+		response = await rest.get_zipcode(
+			Request(**{'if-none-match': first.headers['etag']}), 1001000, 'session'
+		)
+
+		assert response.status_code == 304
+		assert response.body == b''
+		assert response.headers['etag'] == first.headers['etag']
+		assert encode.call_count == 1
+
+	async def test_get_zipcode_not_found(self: Self, mocker):
+		mocker.patch(
+			'api.rest.get_address',
+			return_value={'data': [], 'provider': 'Plugins'},
+		)
+
+		with pytest.raises(HTTPException) as error:
+			await rest.get_zipcode(Request(), 1001000, 'session')
+		assert error.value.status_code == 404
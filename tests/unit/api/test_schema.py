@@ -29,6 +29,7 @@ from database.models.brazil import (
 	StateCreate,
 	StateAcronym,
 )
+from database.models.records import AddressRecord, CityRecord, StateRecord
 
 
 class TestQuery:
@@ -49,6 +50,7 @@ class TestQuery:
 
 		class Info:
 			context = Session()
+			selected_fields: ClassVar[list] = []
 
 		mocker.patch(
 			'api.schema.get_address',
@@ -57,13 +59,46 @@ class TestQuery:
 		out = await Query().all_address(Info(), AddressFilterInput())
 		address_model = address.model_dump()
 		for i in out:
-			assert isinstance(i, AddressType)
-			address_response_model = i.to_pydantic().model_dump()
+			# resolved as it is, read by strawberry as an AddressType
+			assert AddressType.__strawberry_definition__.is_type_of(i, Info())
+			address_response_model = (
+				AddressType.from_pydantic(i).to_pydantic().model_dump()
+			)
 			address_model['id'] = address_response_model['id']
 			address_model['updated_at'] = address_response_model['updated_at']
 
 			assert address_response_model == address_model
 
+	async def test_all_address_from_plugin(self: Self, mocker):
+		record = AddressRecord(
+			zipcode=1001000,
+			state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+			city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+			neighborhood='Sé',
+			complement='Praça da Sé lado ímpar',
+		)
+
+		class Session:
+			session = ''
+
+		class Info:
+			context = Session()
+			selected_fields: ClassVar[list] = []
+
+		mocker.patch(
+			'api.schema.get_address',
+			return_value={'data': [record], 'provider': 'viacep'},
+		)
+		out = await Query().all_address(Info(), AddressFilterInput())
+
+		assert len(out) == 1
+		assert AddressType.__strawberry_definition__.is_type_of(out[0], Info())
+		assert out[0].zipcode == record.zipcode
+		assert out[0].state.acronym == StateAcronym.SP
+		assert out[0].city.ibge == record.city.ibge
+		assert out[0].neighborhood == record.neighborhood
+		assert out[0].complement == record.complement
+
 
 class TestMutation:
 	async def test_create_address(self: Self, mocker):
@@ -86,8 +121,10 @@ class TestMutation:
 		mocker.patch('api.schema.insert_address', return_value=address.to_pydantic())
 		out = await Mutation().create_address(Info(), address)
 
-		assert isinstance(out, AddressType)
-		address_response_model = out.to_pydantic().model_dump()
+		assert AddressType.__strawberry_definition__.is_type_of(out, Info())
+		address_response_model = (
+			AddressType.from_pydantic(out).to_pydantic().model_dump()
+		)
 		address_model = address.to_pydantic().model_dump()
 		address_model['id'] = address_response_model['id']
 		address_model['updated_at'] = address_response_model['updated_at']
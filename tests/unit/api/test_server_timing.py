@@ -0,0 +1,108 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+import strawberry
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from starlette.datastructures import Headers
+
+from api import server_timing
+from utils import server_timing as recorder
+
+
+@pytest.fixture()
+def settings(mocker):
+	return mocker.patch.object(
+		server_timing,
+		'settings',
+		mocker.Mock(SERVER_TIMING_ENABLED=True, SERVER_TIMING_SAMPLE_RATE=0.0),
+	)
+
+
+def client() -> AsyncClient:
+	app = FastAPI()
+	app.add_middleware(server_timing.ServerTimingMiddleware)
+
+	@app.get('/lookup')
+	async def lookup() -> dict:
+		recorder.record('db', 0.002)
+		recorder.record('plugins', 0.05, 'viacep')
+		return {}
+
+	return AsyncClient(transport=ASGITransport(app), base_url='http://test')
+
+
+class TestWantsTiming:
+	@pytest.mark.parametrize(
+		('enabled', 'rate', 'header', 'expected'),
+		[
+			(True, 0.0, '1', True),
+			(True, 0.0, '0', False),
+			(True, 0.0, None, False),
+			(False, 0.0, '1', False),
+			(False, 1.0, None, True),
+		],
+	)
+	def test_wants_timing(self: Self, settings, enabled, rate, header, expected):
+		settings.SERVER_TIMING_ENABLED = enabled
+		settings.SERVER_TIMING_SAMPLE_RATE = rate
+		headers = Headers({'x-server-timing': header} if header else {})
+
+		assert server_timing.wants_timing(headers) is expected
+
+
+class TestServerTimingMiddleware:
+	async def test_asked(self: Self, settings):
+		async with client() as test_client:
+			response = await test_client.get(
+				'/lookup', headers={'X-Server-Timing': '1'}
+			)
+
+		header = response.headers['server-timing']
+		assert header.startswith('db;dur=2.0, plugins;dur=50.0;desc="viacep"')
+		assert ', total;dur=' in header
+
+	async def test_not_asked(self: Self, settings):
+		async with client() as test_client:
+			response = await test_client.get('/lookup')
+
+		assert 'server-timing' not in response.headers
+
+
+class TestServerTimingExtension:
+	async def test_parse_and_validate(self: Self):
+		@strawberry.type
+		class Query:
+			@strawberry.field
+			def ping(self) -> str:
+				return 'pong'
+
+		schema = strawberry.Schema(
+			Query, extensions=[server_timing.ServerTimingExtension]
+		)
+
+		with recorder.timed() as timing:
+			await schema.execute('{ ping }')
+
+		assert [metric.split(';')[0] for metric in timing.header().split(', ')] == [
+			'parse',
+			'validate',
+		]
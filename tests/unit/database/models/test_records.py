@@ -0,0 +1,85 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from database.models.brazil import Address, City, StateAcronym, StateCreate
+from database.models.records import AddressRecord, CityRecord, StateRecord
+
+
+class TestAddressRecord:
+	def test_to_model(self: Self):
+		record = AddressRecord(
+			zipcode=1001000,
+			state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+			city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+			neighborhood='Sé',
+			complement='Praça da Sé - lado ímpar',
+			coordinates={'latitude': -23.5, 'longitude': -46.6, 'altitude': None},
+		)
+
+		address = record.to_model()
+
+		assert isinstance(address, Address)
+		assert address.state == StateCreate(
+			acronym=StateAcronym.SP, name='São Paulo'
+		)
+		assert isinstance(address.city, City)
+		assert address.city.ibge == 3550308
+		assert address.city.ddd == 11
+		assert address.zipcode == 1001000
+		assert address.neighborhood == 'Sé'
+		assert address.complement == 'Praça da Sé - lado ímpar'
+		assert address.coordinates == record.coordinates
+
+	def test_to_model_without_city_and_state(self: Self):
+		address = AddressRecord(zipcode=1001000, neighborhood='Sé').to_model()
+
+		assert address.state is None
+		assert address.city is None
+
+	def test_from_model(self: Self):
+		address = AddressRecord(
+			zipcode=1001000,
+			state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+			city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+			neighborhood='Sé',
+		).to_model()
+
+		record = AddressRecord.from_model(address)
+
+		assert record.state == StateRecord(acronym=StateAcronym.SP, name='São Paulo')
+		assert record.city == CityRecord(ibge=3550308, name='São Paulo', ddd=11)
+		assert record.neighborhood == 'Sé'
+		assert record.updated_at == address.updated_at
+
+	def test_from_row(self: Self):
+		record = AddressRecord.from_row(
+			{
+				'zipcode': 1001000,
+				'neighborhood': 'Sé',
+				'city_ibge': 3550308,
+				'city_name': 'São Paulo',
+			}
+		)
+
+		assert record.zipcode == 1001000
+		assert record.neighborhood == 'Sé'
+		assert record.complement is None
+		assert record.city == CityRecord(ibge=3550308, name='São Paulo')
+		assert record.state is None
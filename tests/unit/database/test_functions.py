@@ -0,0 +1,143 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from types import SimpleNamespace
+from typing import Self
+
+from api.address.graphql_inputs import (
+	AddressFilterInput,
+	AddressInsertInput,
+	CityInput,
+	StateInput,
+)
+from database import functions
+from database.models.brazil import City, State, StateAcronym
+from database.models.records import AddressRecord
+
+SP = State(acronym=StateAcronym.SP, name='São Paulo')
+SAO_PAULO = City(ibge=3550308, name='São Paulo', ddd=11)
+
+
+def address(zipcode: int, ibge: int = 3550308) -> AddressInsertInput:
+	return AddressInsertInput(
+		zipcode=zipcode,
+		state=StateInput(acronym=StateAcronym.SP, name=None),
+		city=CityInput(ibge=ibge, name=None, ddd=None),
+		neighborhood='Sé',
+		complement=None,
+	)
+
+
+class Result:
+	def __init__(self: Self, values: list):
+		self.values = values
+
+	def scalars(self: Self) -> list:
+		return self.values
+
+
+class Session:
+	def __init__(self: Self, stored: set[int]):
+		self.stored = stored
+		self.statements = []
+		self.committed = False
+
+	async def exec(self: Self, query):
+		self.statements.append(query)
+		entity = query.column_descriptions[0]['entity']
+		return [SP] if entity is State else [SAO_PAULO]
+
+	async def execute(self: Self, query, rows):
+		self.statements.append(query)
+		self.rows = rows
+		return Result(
+			[row['zipcode'] for row in rows if row['zipcode'] not in self.stored]
+		)
+
+	async def commit(self: Self):
+		self.committed = True
+
+
+class TestInsertAddresses:
+	async def test_per_item_results(self: Self):
+		session = Session(stored={1002000})
+
+		results = await functions.insert_addresses(
+			session,
+			[
+				address(1001000),
+				address(1001000),
+				address(5),
+				address(1002000),
+				address(1003000, ibge=1),
+			],
+		)
+
+		assert isinstance(results[0], AddressRecord)
+		assert results[0].city.name == 'São Paulo'
+		assert results[0].state.acronym == StateAcronym.SP
+		assert results[1] == 'Duplicated zipcode'
+		assert results[2].startswith('zipcode: ')
+		assert results[3] == 'Address already exists'
+		assert results[4] == 'City not found'
+		assert session.committed
+
+	async def test_set_based_queries(self: Self):
+		session = Session(stored=set())
+
+		await functions.insert_addresses(
+			session, [address(zipcode) for zipcode in range(1001000, 1001100)]
+		)
+
+		assert len(session.statements) == 3
+		assert len(session.rows) == 100
+		assert {row['city_id'] for row in session.rows} == {SAO_PAULO.id}
+
+	async def test_nothing_valid(self: Self):
+		session = Session(stored=set())
+
+		results = await functions.insert_addresses(session, [address(5)])
+
+		assert len(results) == 1
+		assert not session.committed
+
+
+class TestGetAddressRows:
+	async def test_joins_only_selected(self: Self):
+		class Session:
+			async def exec(self: Self, query):
+				self.sql = str(query)
+				return SimpleNamespace(all=list)
+
+		session = Session()
+
+		await functions.get_address_rows(
+			session, AddressFilterInput(neighborhood='Sé'), {'zipcode', 'neighborhood'}
+		)
+
+		assert 'JOIN' not in session.sql
+		assert 'addresses.neighborhood AS neighborhood' in session.sql
+		assert 'complement' not in session.sql
+
+		await functions.get_address_rows(
+			session, AddressFilterInput(zipcode=1001000), {'city', 'city.name'}
+		)
+
+		assert 'JOIN cities' in session.sql
+		assert 'JOIN states' not in session.sql
+		assert 'cities.name AS city_name' in session.sql
@@ -0,0 +1,83 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from pytest_mock import MockerFixture
+
+from database import ping
+
+
+@pytest.fixture
+def settings(mocker: MockerFixture):
+	return mocker.patch.object(
+		ping,
+		'settings',
+		mocker.Mock(HEALTH_PING_INTERVAL=5.0, HEALTH_PING_TIMEOUT=1.0),
+	)
+
+
+def engine(mocker: MockerFixture, error: Exception | None = None):
+	conn = mocker.AsyncMock()
+	if error:
+		conn.execute.side_effect = error
+	connect = mocker.MagicMock()
+	connect.return_value.__aenter__.return_value = conn
+	return mocker.patch.object(ping, 'engine', mocker.Mock(connect=connect))
+
+
+class TestDatabasePing:
+	def test_unavailable_before_ping(self: Self, settings):
+		assert ping.DatabasePing().status() == {
+			'available': False,
+			'latency': None,
+			'age': None,
+			'error': None,
+		}
+
+	async def test_available(self: Self, settings, mocker: MockerFixture):
+		engine(mocker)
+		database = ping.DatabasePing()
+
+		await database.ping()
+		status = database.status()
+
+		assert status['available']
+		assert status['latency'] >= 0
+		assert status['error'] is None
+
+	async def test_error(self: Self, settings, mocker: MockerFixture):
+		engine(mocker, OSError('refused'))
+		database = ping.DatabasePing()
+
+		await database.ping()
+
+		assert database.status()['available'] is False
+		assert database.status()['error'] == 'OSError'
+
+	async def test_stale(self: Self, settings, mocker: MockerFixture):
+		engine(mocker)
+		clock = mocker.patch.object(ping, 'monotonic', return_value=100.0)
+		database = ping.DatabasePing()
+		await database.ping()
+
+		clock.return_value = 116.0
+
+		assert database.status()['available'] is False
+		assert database.status()['age'] == 16.0
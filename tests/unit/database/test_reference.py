@@ -0,0 +1,77 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from database.models.brazil import City, State, StateAcronym
+from database.reference import Reference
+
+SP = State(acronym=StateAcronym.SP, name='São Paulo')
+RJ = State(acronym=StateAcronym.RJ, name='Rio de Janeiro')
+SAO_PAULO = City(ibge=3550308, name='São Paulo', ddd=11)
+RIO = City(ibge=3304557, name='Rio de Janeiro', ddd=21)
+
+
+class Session:
+	def __init__(self: Self, states: list, cities: list):
+		self.states = states
+		self.cities = cities
+		self.statements = []
+
+	async def exec(self: Self, query):
+		self.statements.append(query)
+		entity = query.column_descriptions[0]['entity']
+		return self.states if entity is State else self.cities
+
+	def expunge_all(self: Self):
+		pass
+
+
+class TestReference:
+	async def test_queries_before_load(self: Self):
+		session = Session([SP], [SAO_PAULO])
+		reference = Reference()
+
+		states = await reference.get_states(session, {StateAcronym.SP})
+		cities = await reference.get_cities(session, {3550308})
+
+		assert states == {StateAcronym.SP: SP}
+		assert cities == {3550308: SAO_PAULO}
+		assert len(session.statements) == 2
+
+	async def test_memory_after_load(self: Self):
+		reference = Reference()
+		await reference.load(Session([SP, RJ], [SAO_PAULO, RIO]))
+		session = Session([], [])
+
+		states = await reference.get_states(session, {StateAcronym.RJ})
+		cities = await reference.get_cities(session, {3304557, 3550308})
+
+		assert states == {StateAcronym.RJ: RJ}
+		assert cities == {3304557: RIO, 3550308: SAO_PAULO}
+		assert not session.statements
+
+	async def test_missing_city_queried(self: Self):
+		reference = Reference()
+		await reference.load(Session([SP], [SAO_PAULO]))
+		session = Session([], [RIO])
+
+		cities = await reference.get_cities(session, {3304557, 3550308})
+
+		assert cities == {3304557: RIO, 3550308: SAO_PAULO}
+		assert len(session.statements) == 1
@@ -0,0 +1,145 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database import slow_queries
+from database.slow_queries import SlowQueryLog, format_parameters, normalize
+
+SELECT = (
+	'SELECT addresses.zipcode \nFROM addresses JOIN cities ON cities.id = '
+	'addresses.city_id \nWHERE addresses.zipcode IN (%(zipcode_1_1)s, '
+	'%(zipcode_1_2)s) AND cities.name = %(name_1)s \n LIMIT %(param_1)s'
+)
+
+
+@pytest.fixture()
+def settings(mocker):
+	return mocker.patch.object(
+		slow_queries,
+		'settings',
+		mocker.Mock(SLOW_QUERY_THRESHOLD=0.0, SLOW_QUERY_EXPLAIN_RATE=0.0),
+	)
+
+
+class TestNormalize:
+	def test_parameters_and_in_lists(self: Self):
+		assert normalize(SELECT) == (
+			'SELECT addresses.zipcode FROM addresses JOIN cities ON '
+			'cities.id = addresses.city_id WHERE addresses.zipcode IN (...) '
+			'AND cities.name = ? LIMIT ?'
+		)
+
+	def test_literals(self: Self):
+		assert normalize("SELECT 1 FROM t_1 WHERE a = 'it''s' AND b > 2.5") == (
+			'SELECT ? FROM t_1 WHERE a = ? AND b > ?'
+		)
+
+	def test_same_shape(self: Self):
+		one = SELECT.replace(', %(zipcode_1_2)s', '')
+		assert normalize(one) == normalize(SELECT)
+
+
+class TestFormatParameters:
+	def test_bounded(self: Self):
+		assert format_parameters({'a': 1}, False) == "{'a': 1}"
+		assert format_parameters({'a': 'x' * 1000}, False).endswith('...')
+		assert len(format_parameters({'a': 'x' * 1000}, False)) == 503
+
+	def test_executemany(self: Self):
+		assert format_parameters([{'a': 1}, {'a': 2}], True) == '<2 rows>'
+
+
+class TestSlowQueryLog:
+	def test_record_aggregates_and_logs(self: Self, settings, caplog):
+		log = SlowQueryLog(10)
+
+		log.record(SELECT, {'name_1': 'Sé'}, False, 0.3)
+		stats = log.record(SELECT, {'name_1': 'Centro'}, False, 0.1)
+
+		assert stats.count == 2
+		assert stats.total == pytest.approx(0.4)
+		assert stats.max == 0.3
+		assert stats.last_parameters == "{'name_1': 'Centro'}"
+		assert 'Slow query (300.0 ms): SELECT addresses.zipcode' in caplog.text
+
+	def test_top(self: Self, settings):
+		log = SlowQueryLog(10)
+		log.record('SELECT 1 FROM states', {}, False, 0.1)
+		log.record(SELECT, {}, False, 0.5)
+		log.record('SELECT 2', {}, False, 0.2)
+
+		top = log.top(1)
+
+		assert len(top) == 1
+		assert top[0]['statement'] == normalize(SELECT)
+		assert top[0]['mean_ms'] == 500
+		assert [query['total_ms'] for query in log.top(5)] == [500, 200, 100]
+
+		log.clear()
+		assert log.top(5) == []
+
+	def test_explain_sampled_selects_only(self: Self, settings, mocker):
+		settings.SLOW_QUERY_EXPLAIN_RATE = 1.0
+		spawn = mocker.patch.object(slow_queries, 'spawn')
+		mocker.patch.object(SlowQueryLog, 'explain', new=mocker.Mock())
+		log = SlowQueryLog(10)
+		log.engine = mocker.Mock()
+
+		log.record(SELECT, {}, False, 1)
+		log.record('UPDATE addresses SET provider = %(p)s', {}, False, 1)
+		log.record(SELECT, [{}, {}], True, 1)
+
+		spawn.assert_called_once()
+		assert spawn.call_args.kwargs == {'name': 'explain-slow-query'}
+
+	async def test_explain_keeps_plan(self: Self, mocker):
+		conn = mocker.AsyncMock()
+		conn.exec_driver_sql.return_value = mocker.Mock(
+			scalar=mocker.Mock(return_value=[{'Plan': {}}])
+		)
+		engine = mocker.Mock()
+		engine.connect.return_value.__aenter__ = mocker.AsyncMock(return_value=conn)
+		engine.connect.return_value.__aexit__ = mocker.AsyncMock(return_value=None)
+		log = SlowQueryLog(10)
+		log.engine = engine
+		stats = slow_queries.QueryStats()
+
+		await log.explain(stats, SELECT, {'param_1': 10})
+
+		conn.exec_driver_sql.assert_awaited_once_with(
+			f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {SELECT}', {'param_1': 10}
+		)
+		assert stats.plan == [{'Plan': {}}]
+
+	def test_instrument(self: Self, settings, mocker):
+		engine = create_engine('sqlite://')
+		log = SlowQueryLog(10)
+		log.instrument(mocker.Mock(sync_engine=engine))
+
+		with engine.connect() as conn:
+			conn.execute(text('SELECT 1 WHERE 1 = :one'), {'one': 1})
+			settings.SLOW_QUERY_THRESHOLD = 60
+			conn.execute(text('SELECT 2'))
+
+		(query,) = log.top(5)
+		assert query['statement'] == 'SELECT ? WHERE ? = ?'
+		assert query['count'] == 1
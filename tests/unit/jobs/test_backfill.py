@@ -0,0 +1,201 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import CancelledError
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Self
+from uuid import uuid4
+
+import pytest
+from pytest_mock import MockerFixture
+
+from database.models.backfill import BackfillJob, BackfillStatus
+from jobs import backfill
+from plugins.cep_aberto.cep_aberto import CepAberto
+
+
+@pytest.fixture
+def checkpoint(mocker: MockerFixture):
+	mocker.patch('jobs.backfill.AsyncSession')
+	mocker.patch('jobs.backfill.sleep')
+	budgets = mocker.patch('jobs.backfill.budgets')
+	budgets.idle = mocker.AsyncMock()
+	return mocker.patch('jobs.backfill.checkpoint')
+
+
+class TestBackfill:
+	def test_job_plugins(self: Self):
+		assert backfill.job_plugins(BackfillJob(providers=['cep_aberto'])) == (
+			CepAberto,
+		)
+		assert backfill.job_plugins(BackfillJob()) == backfill.PLUGINS
+
+	async def test_run_zipcodes(self: Self, mocker: MockerFixture, checkpoint):
+		fetch = mocker.patch(
+			'jobs.backfill.backfill_zipcode', side_effect=[True, None, False]
+		)
+		job = BackfillJob(zipcodes=[1001000, 1001001, 1001002])
+
+		await backfill.run_job(job)
+
+		assert [call.args[0] for call in fetch.call_args_list] == [
+			1001000,
+			1001001,
+			1001002,
+		]
+		assert job.status == BackfillStatus.DONE
+		assert (job.cursor, job.processed, job.updated, job.failed) == (3, 3, 1, 1)
+
+	async def test_resume_predicate(
+		self: Self, mocker: MockerFixture, checkpoint
+	):
+		pages = mocker.patch(
+			'jobs.backfill.functions.get_backfill_zipcodes',
+			side_effect=[[1001005, 1001009], []],
+		)
+		fetch = mocker.patch('jobs.backfill.backfill_zipcode', return_value=True)
+		job = BackfillJob(
+			predicate={'missing_coordinates': True},
+			status=BackfillStatus.RUNNING,
+			cursor=1001004,
+		)
+
+		await backfill.run_job(job)
+
+		assert pages.call_args_list[0].args[1:3] == (
+			{'missing_coordinates': True},
+			1001004,
+		)
+		assert fetch.call_count == 2
+		assert job.cursor == 1001009
+		assert job.status == BackfillStatus.DONE
+
+	async def test_failure_does_not_stop(
+		self: Self, mocker: MockerFixture, checkpoint
+	):
+		mocker.patch(
+			'jobs.backfill.backfill_zipcode', side_effect=[ValueError, True]
+		)
+		job = BackfillJob(zipcodes=[1001000, 1001001])
+
+		await backfill.run_job(job)
+
+		assert (job.processed, job.updated, job.failed) == (2, 1, 1)
+
+	async def test_wait_for_budget(self: Self, mocker: MockerFixture, checkpoint):
+		backfill.budgets.available.side_effect = [False, False, True]
+		job = BackfillJob(zipcodes=[1001000])
+
+		await backfill.wait_for_budget(mocker.Mock(), job, (CepAberto,))
+
+		assert checkpoint.call_count == 2
+
+	async def test_backfill_zipcode(self: Self, mocker: MockerFixture):
+		mocker.patch('jobs.backfill.AsyncSession')
+		mocker.patch(
+			'jobs.backfill.get_zipcode_from_plugins',
+			return_value={'data': ['record'], 'provider': 'viacep'},
+		)
+		mocker.patch('jobs.backfill.enrich', return_value=('record', {'viacep'}))
+		mocker.patch('jobs.backfill.functions.address_exists', return_value=False)
+		insert = mocker.patch('jobs.backfill.functions.insert_address')
+
+		assert await backfill.backfill_zipcode(1001000, (CepAberto,))
+		assert insert.call_args.args[1:] == ('record', 'viacep')
+
+	async def test_backfill_not_found(self: Self, mocker: MockerFixture):
+		mocker.patch(
+			'jobs.backfill.get_zipcode_from_plugins',
+			return_value={'data': [], 'provider': 'Plugins'},
+		)
+
+		assert await backfill.backfill_zipcode(1001000, (CepAberto,)) is None
+
+	async def test_create_job_needs_one_source(self: Self):
+		with pytest.raises(ValueError):
+			await backfill.create_job()
+		with pytest.raises(ValueError):
+			await backfill.create_job([1001000], {'provider': 'viacep'})
+
+	async def test_sync_usage(self: Self, mocker: MockerFixture):
+		budgets = mocker.patch('jobs.backfill.budgets')
+		budgets.take_unsynced.return_value = {'cep_aberto': (date.today(), 2)}
+		add = mocker.patch(
+			'jobs.backfill.functions.add_provider_usage',
+			return_value={'cep_aberto': (date.today(), 7)},
+		)
+
+		await backfill.sync_usage(mocker.Mock())
+
+		assert add.call_args.args[1] == {'cep_aberto': (date.today(), 2)}
+		budgets.restore.assert_called_once_with('cep_aberto', date.today(), 7)
+
+	async def test_sync_usage_failure_keeps_counts(
+		self: Self, mocker: MockerFixture
+	):
+		budgets = mocker.patch('jobs.backfill.budgets')
+		budgets.take_unsynced.return_value = {'cep_aberto': (date.today(), 2)}
+		mocker.patch(
+			'jobs.backfill.functions.add_provider_usage', side_effect=OSError
+		)
+
+		with pytest.raises(OSError):
+			await backfill.sync_usage(mocker.Mock())
+
+		budgets.give_back.assert_called_once_with({'cep_aberto': (date.today(), 2)})
+		budgets.restore.assert_not_called()
+
+	@pytest.mark.parametrize(
+		('claimed', 'status', 'runs'),
+		[
+			(False, BackfillStatus.PENDING, 0),
+			(True, BackfillStatus.DONE, 0),
+			(True, BackfillStatus.RUNNING, 1),
+		],
+	)
+	async def test_scheduler_runs_claimed(
+		self: Self,
+		mocker: MockerFixture,
+		claimed: bool,
+		status: BackfillStatus,
+		runs: int,
+	):
+		@asynccontextmanager
+		async def claim(job):
+			yield claimed
+
+		job = BackfillJob(id=uuid4(), zipcodes=[1001000])
+		mocker.patch('jobs.backfill.AsyncSession')
+		mocker.patch('jobs.backfill.sleep', side_effect=CancelledError)
+		mocker.patch('jobs.backfill.claim', claim)
+		mocker.patch(
+			'jobs.backfill.functions.get_unfinished_backfill_jobs',
+			return_value=[job],
+		)
+		mocker.patch(
+			'jobs.backfill.functions.get_backfill_job',
+			return_value=BackfillJob(id=job.id, status=status),
+		)
+		run_job = mocker.patch('jobs.backfill.run_job')
+
+		with pytest.raises(CancelledError):
+			await backfill.scheduler()
+
+		assert run_job.call_count == runs
+		assert (await backfill.run_claimed(job) is None) == (not runs)
@@ -0,0 +1,191 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import Event, create_task, sleep
+from typing import Self
+
+from pytest_mock import MockerFixture
+
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord, CityRecord, StateRecord
+from jobs import enrichment
+
+VIACEP = AddressRecord(
+	zipcode=1001000,
+	state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+	city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+	neighborhood='Sé',
+	complement='Praça da Sé lado ímpar',
+)
+CEP_ABERTO = AddressRecord(
+	zipcode=1001000,
+	state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+	city=CityRecord(ibge=3550308, name='São Paulo', ddd=None),
+	neighborhood='Sé (centro)',
+	complement='Praça da Sé - lado ímpar',
+	coordinates={'latitude': -23.5, 'longitude': -46.6, 'altitude': 760.0},
+)
+
+
+async def answer(record: AddressRecord, provider: str):
+	return {'data': [record], 'provider': provider}
+
+
+class TestMergeRecords:
+	def test_fill_only_empty_fields(self: Self):
+		merged = enrichment.merge_records(
+			VIACEP,
+			CEP_ABERTO,
+			{'coordinates': 'fill', 'neighborhood': 'fill', 'city.ddd': 'fill'},
+		)
+
+		assert merged.coordinates == CEP_ABERTO.coordinates
+		assert merged.neighborhood == VIACEP.neighborhood
+		assert merged.city.ddd == 11
+		assert VIACEP.coordinates is None
+
+	def test_replace_and_keep(self: Self):
+		merged = enrichment.merge_records(
+			VIACEP,
+			CEP_ABERTO,
+			{'complement': 'replace', 'neighborhood': 'keep', 'city.ddd': 'replace'},
+		)
+
+		assert merged.complement == CEP_ABERTO.complement
+		assert merged.neighborhood == VIACEP.neighborhood
+		# empty values never replace
+		assert merged.city.ddd == 11
+
+	def test_nested_fill(self: Self):
+		merged = enrichment.merge_records(CEP_ABERTO, VIACEP, {'city.ddd': 'fill'})
+
+		assert merged.city.ddd == 11
+		assert merged.city.ibge == CEP_ABERTO.city.ibge
+
+	def test_has_gaps(self: Self):
+		assert enrichment.has_gaps(VIACEP)
+		assert not enrichment.has_gaps(enrichment.merge_records(VIACEP, CEP_ABERTO))
+
+
+class TestEnrich:
+	async def test_merges_pending(self: Self):
+		result = {
+			'data': [VIACEP],
+			'provider': 'viacep',
+			'pending': {create_task(answer(CEP_ABERTO, 'cep_aberto'))},
+		}
+
+		record, answered = await enrichment.enrich(result)
+
+		assert answered == {'viacep', 'cep_aberto'}
+		assert record.coordinates == CEP_ABERTO.coordinates
+
+	async def test_ignores_failed(self: Self):
+		async def fail():
+			raise ValueError
+
+		result = {
+			'data': [VIACEP],
+			'provider': 'viacep',
+			'pending': {create_task(fail())},
+		}
+
+		record, answered = await enrichment.enrich(result)
+
+		assert answered == {'viacep'}
+		assert record is VIACEP
+
+	async def test_cancels_slow(self: Self, mocker: MockerFixture):
+		mocker.patch.object(
+			enrichment,
+			'settings',
+			enrichment.settings.model_copy(update={'ENRICH_TIMEOUT': 0.01}),
+		)
+		slow = create_task(sleep(10))
+		result = {'data': [VIACEP], 'provider': 'viacep', 'pending': {slow}}
+
+		record, _ = await enrichment.enrich(result)
+		await sleep(0)
+
+		assert record is VIACEP
+		assert slow.cancelled()
+
+
+class TestStore:
+	async def test_inserts_first_then_merges(self: Self, mocker: MockerFixture):
+		mocker.patch('jobs.enrichment.AsyncSession')
+		answers = Event()
+		insert = mocker.patch(
+			'jobs.enrichment.functions.insert_address',
+			side_effect=lambda *_: answers.set(),
+		)
+		update = mocker.patch('jobs.enrichment.functions.update_address')
+
+		async def late() -> dict:
+			# other plugins answer only after the first one is stored
+			await answers.wait()
+			return {'data': [CEP_ABERTO], 'provider': 'cep_aberto'}
+
+		result = {
+			'data': [VIACEP],
+			'provider': 'viacep',
+			'pending': {create_task(late())},
+		}
+
+		await enrichment.store(result)
+
+		assert insert.call_args.args[1:] == (VIACEP, 'viacep')
+		record, provider = update.call_args.args[1:]
+		assert provider == 'viacep'
+		assert record.coordinates == CEP_ABERTO.coordinates
+
+	async def test_no_update_without_changes(self: Self, mocker: MockerFixture):
+		mocker.patch('jobs.enrichment.AsyncSession')
+		mocker.patch('jobs.enrichment.functions.insert_address')
+		update = mocker.patch('jobs.enrichment.functions.update_address')
+		result = {
+			'data': [VIACEP],
+			'provider': 'viacep',
+			'pending': {create_task(answer(VIACEP, 'cep_aberto'))},
+		}
+
+		await enrichment.store(result)
+
+		update.assert_not_called()
+
+	async def test_deferred_call(self: Self, mocker: MockerFixture):
+		mocker.patch.object(
+			enrichment,
+			'settings',
+			enrichment.settings.model_copy(update={'ENRICH_DEFER': 0.01}),
+		)
+		mocker.patch('jobs.enrichment.AsyncSession')
+		insert = mocker.patch('jobs.enrichment.functions.insert_address')
+		update = mocker.patch('jobs.enrichment.functions.update_address')
+		deferred = mocker.patch(
+			'jobs.enrichment.get_zipcode_from_plugins',
+			return_value={'data': [CEP_ABERTO], 'provider': 'cep_aberto'},
+		)
+
+		await enrichment.store({'data': [VIACEP], 'provider': 'viacep'})
+
+		assert insert.call_args.args[1] is VIACEP
+		assert [p.provider for p in deferred.call_args.args[1]] == ['cep_aberto']
+		record, provider = update.call_args.args[1:]
+		assert provider == 'viacep'
+		assert record.coordinates == CEP_ABERTO.coordinates
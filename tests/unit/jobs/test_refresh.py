@@ -0,0 +1,127 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime, timedelta
+from typing import Self
+
+import pytest
+from pytest_mock import MockerFixture
+
+from database.models.brazil import Address
+from database.models.records import AddressRecord
+from jobs import refresh
+
+
+@pytest.fixture(autouse=True)
+def _clean_state():
+	refresh._in_flight.clear()
+	refresh._checked.clear()
+	yield
+	refresh._in_flight.clear()
+	refresh._checked.clear()
+
+
+def make_address(provider: str | None, age: timedelta) -> Address:
+	return Address(
+		zipcode=1001000,
+		neighborhood='Sé',
+		provider=provider,
+		updated_at=datetime.now() - age,
+	)
+
+
+class TestIsStale:
+	def test_old_address_from_plugin(self: Self):
+		assert refresh.is_stale(make_address('viacep', timedelta(days=31)))
+
+	def test_fresh_address_from_plugin(self: Self):
+		assert not refresh.is_stale(make_address('viacep', timedelta(days=1)))
+
+	def test_manual_address_is_never_stale(self: Self):
+		assert not refresh.is_stale(make_address(None, timedelta(days=365)))
+
+
+class TestScheduleRefresh:
+	def test_schedules_stale_once(self: Self, mocker: MockerFixture):
+		spawn = mocker.patch('jobs.refresh.spawn')
+		mocker.patch('jobs.refresh.refresh_address', new=mocker.Mock())
+		address = make_address('viacep', timedelta(days=31))
+
+		refresh.schedule_refresh([address])
+		refresh.schedule_refresh([address])
+
+		spawn.assert_called_once()
+		assert refresh._in_flight == {address.zipcode}
+
+	def test_ignores_fresh(self: Self, mocker: MockerFixture):
+		spawn = mocker.patch('jobs.refresh.spawn')
+
+		refresh.schedule_refresh([make_address('viacep', timedelta(days=1))])
+
+		spawn.assert_not_called()
+
+	def test_rate_limited(self: Self, mocker: MockerFixture):
+		spawn = mocker.patch('jobs.refresh.spawn')
+		mocker.patch('jobs.refresh.refresh_address', new=mocker.Mock())
+		limiter = mocker.patch('jobs.refresh.limiter')
+		limiter.acquire.return_value = False
+
+		refresh.schedule_refresh([make_address('viacep', timedelta(days=31))])
+
+		spawn.assert_not_called()
+		assert not refresh._in_flight
+
+	def test_skips_recently_checked(self: Self, mocker: MockerFixture):
+		spawn = mocker.patch('jobs.refresh.spawn')
+		address = make_address('viacep', timedelta(days=31))
+		refresh._mark_checked(address.zipcode)
+
+		refresh.schedule_refresh([address])
+
+		spawn.assert_not_called()
+
+
+class TestRefreshAddress:
+	async def test_unchanged_is_remembered(self: Self, mocker: MockerFixture):
+		record = AddressRecord(zipcode=1001000, neighborhood='Sé')
+		mocker.patch(
+			'jobs.refresh.get_zipcode_from_plugins',
+			return_value={'data': [record], 'provider': 'viacep'},
+		)
+		update = mocker.patch(
+			'jobs.refresh.functions.update_address', return_value=False
+		)
+		mocker.patch('jobs.refresh.AsyncSession')
+		refresh._in_flight.add(record.zipcode)
+
+		assert not await refresh.refresh_address(record.zipcode)
+
+		assert update.call_args.args[1:] == (record, 'viacep')
+		assert record.zipcode in refresh._checked
+		assert not refresh._in_flight
+
+	async def test_not_found_on_plugins(self: Self, mocker: MockerFixture):
+		mocker.patch(
+			'jobs.refresh.get_zipcode_from_plugins',
+			return_value={'data': [], 'provider': 'Plugins'},
+		)
+		update = mocker.patch('jobs.refresh.functions.update_address')
+
+		assert not await refresh.refresh_address(1001000)
+
+		update.assert_not_called()
@@ -0,0 +1,46 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import sleep
+from typing import Self
+
+from jobs import tasks
+
+
+class TestTasks:
+	async def test_spawn_tracks_until_done(self: Self):
+		before = tasks.pending()
+		task = tasks.spawn(sleep(0), name='test')
+
+		assert tasks.pending() == before + 1
+		await task
+		await sleep(0)
+		assert tasks.pending() == before
+
+	async def test_failed_job_is_logged(self: Self, caplog):
+		async def fail() -> None:
+			raise ValueError('boom')
+
+		before = tasks.pending()
+		task = tasks.spawn(fail(), name='failing')
+		await sleep(0)
+		await sleep(0)
+
+		assert task.done()
+		assert tasks.pending() == before
+		assert 'Background job failing failed' in caplog.text
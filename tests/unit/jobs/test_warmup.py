@@ -0,0 +1,93 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from pytest_mock import MockerFixture
+
+from jobs import warmup
+
+
+@pytest.fixture
+def mocked(mocker: MockerFixture):
+	warmup.ready.clear()
+	mocker.patch('jobs.warmup.AsyncSession')
+	mocker.patch('jobs.warmup.reference', mocker.AsyncMock())
+	mocker.patch.object(
+		warmup,
+		'settings',
+		mocker.Mock(WARMUP_CONNECTIONS=3, WARMUP_ZIPCODES=[]),
+	)
+	yield mocker
+	warmup.ready.clear()
+
+
+class TestWarmUp:
+	async def test_ready_when_done(self: Self, mocked):
+		connections = mocked.patch('jobs.warmup.open_connections', return_value=3)
+		queries = mocked.patch('jobs.warmup.warm_queries')
+
+		await warmup.warm_up()
+
+		connections.assert_awaited_once_with(3)
+		assert queries.call_args.args[1] == [warmup.PROBE_ZIPCODE]
+		assert warmup.ready.is_set()
+
+	async def test_ready_when_failed(self: Self, mocked, caplog):
+		mocked.patch('jobs.warmup.open_connections', side_effect=OSError)
+
+		await warmup.warm_up()
+
+		assert warmup.ready.is_set()
+		assert 'Warm-up failed' in caplog.text
+
+	async def test_warm_queries(self: Self, mocker: MockerFixture):
+		full = mocker.patch(
+			'jobs.warmup.functions.get_address_by_dc_join_state_join_city'
+		)
+		rows = mocker.patch('jobs.warmup.functions.get_address_rows')
+		session = mocker.Mock()
+
+		await warmup.warm_queries(session, [1001000, 20040002])
+
+		assert [call.args[1].zipcode for call in full.call_args_list] == [
+			1001000,
+			20040002,
+		]
+		assert rows.call_args.args[2] == {'zipcode', *warmup.functions.PROJECTIONS}
+
+
+class TestOpenConnections:
+	async def test_held_at_once(self: Self, mocker: MockerFixture):
+		opened = []
+
+		class Connection:
+			async def __aenter__(self):
+				opened.append(self)
+				return self
+
+			async def __aexit__(self, *args):
+				assert len(opened) == 2
+				return False
+
+		engine = mocker.patch('jobs.warmup.engine')
+		engine.connect = Connection
+
+		assert await warmup.open_connections(2) == 2
+		assert len(opened) == 2
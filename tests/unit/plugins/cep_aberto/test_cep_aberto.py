@@ -17,20 +17,18 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
 from dataclasses import dataclass
+from json import dumps
 from re import escape
 from typing import Self
 
 import pytest
 from httpx import HTTPStatusError, Response
+from msgspec import ValidationError
 from pytest_mock import MockerFixture
 from respx import MockRouter
 
-from database.models.brazil import (
-	Address,
-	City,
-	StateAcronym,
-	StateCreate,
-)
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord, CityRecord, StateRecord
 from plugins.cep_aberto.cep_aberto import CepAberto
 
 
@@ -124,6 +122,34 @@ class TestCepAberto:
 		):
 			await CepAberto().get_address_by_zipcode(zipcode)
 
+	async def test_get_address_by_zipcode_method_not_found(
+		self: Self, mocker: MockerFixture, respx_mock: MockRouter
+	) -> None:
+		mocker.patch('plugins.cep_aberto.cep_aberto.settings', SettingsMock)
+
+		zipcode = 1001000
+		respx_mock.get(
+			f'https://www.cepaberto.com/api/v3/cep?cep={zipcode:08}'
+		).mock(return_value=Response(200, json={}))
+
+		assert await CepAberto().get_address_by_zipcode(zipcode) == {
+			'data': [],
+			'provider': 'cep_aberto',
+		}
+
+	async def test_get_address_by_zipcode_method_unexpected_body(
+		self: Self, mocker: MockerFixture, respx_mock: MockRouter
+	) -> None:
+		mocker.patch('plugins.cep_aberto.cep_aberto.settings', SettingsMock)
+
+		zipcode = 1001000
+		respx_mock.get(
+			f'https://www.cepaberto.com/api/v3/cep?cep={zipcode:08}'
+		).mock(return_value=Response(200, json={'cep': '01001000'}))
+
+		with pytest.raises(ValidationError):
+			await CepAberto().get_address_by_zipcode(zipcode)
+
 	async def test_get_address_by_zipcode_method_returns_address(
 		self: Self, mocker: MockerFixture, respx_mock: MockRouter
 	) -> None:
@@ -140,26 +166,29 @@ class TestCepAberto:
 		)
 		response = await CepAberto().get_address_by_zipcode(zipcode)
 
-		assert response['data'][0].state == StateCreate(
-			acronym=StateAcronym.SP, name='São Paulo', id=None
-		)
-		city_response_model = response['data'][0].city.model_dump()
-		city_model = City(
-			ibge=3550308, name='São Paulo', ddd=11, id=None
-		).model_dump()
-		city_model['id'] = city_response_model['id']
-		assert city_response_model == city_model
-		response_model = response['data'][0].model_dump()
-		address_model = Address(
-			zipcode=1001000,
-			neighborhood='Sé',
-			complement='Praça da Sé - lado ímpar',
-			coordinates={
-				'altitude': 760.0,
-				'latitude': -23.5479099981,
-				'longitude': -46.636,
-			},
-		).model_dump()
-		address_model['id'] = response_model['id']
-		address_model['updated_at'] = response_model['updated_at']
-		assert response_model == address_model
+		assert response == {
+			'data': [
+				AddressRecord(
+					zipcode=1001000,
+					state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+					city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+					neighborhood='Sé',
+					complement='Praça da Sé - lado ímpar',
+					coordinates={
+						'altitude': 760.0,
+						'latitude': -23.5479099981,
+						'longitude': -46.636,
+					},
+				)
+			],
+			'provider': 'cep_aberto',
+		}
+
+	def test_request_to_record_without_coordinates(self: Self) -> None:
+		for key in ('altitude', 'latitude', 'longitude', 'complemento'):
+			self._ADDRESS_MOCK.pop(key)
+
+		record = CepAberto._request_to_record(dumps(self._ADDRESS_MOCK).encode())
+
+		assert record.coordinates is None
+		assert record.complement == 'Praça da Sé'
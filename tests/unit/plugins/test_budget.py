@@ -0,0 +1,125 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from datetime import date, timedelta
+from typing import Self
+
+from pytest_mock import MockerFixture
+
+from plugins import budget
+from plugins.budget import Budgets, ProviderBudget
+
+
+class TestProviderBudget:
+	def test_live_uses_whole_limit(self: Self):
+		provider = ProviderBudget(10, 0.5)
+		provider.used = 6
+
+		assert provider.remaining() == 4
+		assert provider.remaining(background=True) == 0
+
+	def test_new_day_resets(self: Self):
+		provider = ProviderBudget(10, 0.5)
+		provider.used = 10
+		provider.day = date.today() - timedelta(days=1)
+
+		assert provider.remaining() == 10
+		assert provider.used == 0
+
+
+class TestBudgets:
+	def test_unlimited_provider(self: Self):
+		budgets = Budgets({'cep_aberto': 2}, 0.5)
+
+		assert all(budgets.acquire('viacep', background=True) for _ in range(5))
+
+	def test_background_gives_way(self: Self):
+		budgets = Budgets({'cep_aberto': 4}, 0.5)
+
+		assert budgets.acquire('cep_aberto', background=True)
+		assert budgets.acquire('cep_aberto')
+		assert not budgets.acquire('cep_aberto', background=True)
+		assert budgets.acquire('cep_aberto')
+		assert budgets.acquire('cep_aberto')
+		assert not budgets.acquire('cep_aberto')
+		assert budgets.take_unsynced() == {'cep_aberto': (date.today(), 4)}
+		assert budgets.take_unsynced() == {'cep_aberto': (date.today(), 0)}
+
+	def test_give_back(self: Self):
+		budgets = Budgets({'cep_aberto': 4}, 0.5)
+		budgets.acquire('cep_aberto')
+		unsynced = budgets.take_unsynced()
+
+		budgets.give_back(unsynced)
+
+		assert budgets.take_unsynced() == {'cep_aberto': (date.today(), 1)}
+
+	def test_restore_only_today(self: Self):
+		budgets = Budgets({'cep_aberto': 10}, 0.5)
+
+		budgets.restore('cep_aberto', date.today() - timedelta(days=1), 8)
+		assert budgets.providers['cep_aberto'].used == 0
+
+		budgets.restore('cep_aberto', date.today(), 8)
+		assert budgets.providers['cep_aberto'].used == 8
+
+		# lookups made after the sync are not in the total yet
+		budgets.acquire('cep_aberto')
+		budgets.restore('cep_aberto', date.today(), 8)
+		assert budgets.providers['cep_aberto'].used == 9
+
+		budgets.restore('viacep', date.today(), 8)
+		assert 'viacep' not in budgets.providers
+
+	async def test_idle_waits_live_lookups(self: Self, mocker: MockerFixture):
+		mocker.patch.object(
+			budget,
+			'settings',
+			budget.settings.model_copy(update={'BACKFILL_YIELD': 5.0}),
+		)
+		sleep = mocker.patch('plugins.budget.sleep')
+		mocker.patch(
+			'plugins.budget.monotonic', side_effect=[100.0, 101.0, 101.0, 105.0]
+		)
+		budgets = Budgets({}, 0.5)
+
+		budgets.acquire('viacep')
+		await budgets.idle()
+
+		sleep.assert_called_once_with(4.0)
+
+	async def test_idle_wait_is_capped(self: Self, mocker: MockerFixture):
+		mocker.patch.object(
+			budget,
+			'settings',
+			budget.settings.model_copy(update={'BACKFILL_YIELD': 5.0}),
+		)
+		clock = mocker.patch('plugins.budget.monotonic', return_value=100.0)
+		budgets = Budgets({}, 0.5)
+		budgets.acquire('viacep')
+
+		async def live_miss(seconds: float) -> None:
+			# a live lookup lands during every wait
+			clock.return_value += seconds
+			budgets.acquire('viacep')
+
+		sleep = mocker.patch('plugins.budget.sleep', side_effect=live_miss)
+
+		await budgets.idle()
+
+		assert sum(call.args[0] for call in sleep.call_args_list) == 5.0
@@ -0,0 +1,133 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from httpx import ConnectError, HTTPStatusError, ReadTimeout, Request, Response
+from msgspec import ValidationError
+from pytest_mock import MockerFixture
+
+from plugins import circuit
+
+
+@pytest.fixture
+def clock(mocker: MockerFixture):
+	mocker.patch.object(
+		circuit,
+		'settings',
+		mocker.Mock(
+			CIRCUIT_ERROR_RATE=0.5,
+			CIRCUIT_MIN_CALLS=4,
+			CIRCUIT_WINDOW=60.0,
+			CIRCUIT_COOLDOWN=30.0,
+		),
+	)
+	return mocker.patch.object(circuit, 'monotonic', return_value=1000.0)
+
+
+def status_error(status: int) -> HTTPStatusError:
+	request = Request('GET', 'https://viacep.com.br/ws/01001000/json/')
+	return HTTPStatusError(
+		'error', request=request, response=Response(status, request=request)
+	)
+
+
+class TestIsOutage:
+	@pytest.mark.parametrize(
+		('error', 'expected'),
+		[
+			(None, False),
+			(ValidationError('unknown body'), False),
+			(status_error(400), False),
+			(status_error(404), False),
+			(status_error(403), True),
+			(status_error(503), True),
+			(ConnectError('refused'), True),
+			(ReadTimeout('slow'), True),
+		],
+	)
+	def test_is_outage(self: Self, error, expected):
+		assert circuit.is_outage(error) is expected
+
+
+class TestProviderCircuit:
+	def test_opens_on_error_rate(self: Self, clock):
+		breaker = circuit.ProviderCircuit()
+
+		for failed in (False, True, False):
+			breaker.record(failed)
+		assert breaker.state() == 'closed'
+		breaker.record(True)
+
+		assert breaker.error_rate() == 0.5
+		assert breaker.state() == 'open'
+		assert not breaker.allow()
+
+	def test_needs_min_calls(self: Self, clock):
+		breaker = circuit.ProviderCircuit()
+
+		for _ in range(3):
+			breaker.record(True)
+
+		assert breaker.state() == 'closed'
+
+	def test_window(self: Self, clock):
+		breaker = circuit.ProviderCircuit()
+		for _ in range(3):
+			breaker.record(True)
+
+		clock.return_value = 1061.0
+		breaker.record(True)
+
+		assert breaker.error_rate() == 1.0
+		assert len(breaker.calls) == 1
+		assert breaker.state() == 'closed'
+
+	def test_half_open_probe(self: Self, clock):
+		breaker = circuit.ProviderCircuit()
+		for _ in range(4):
+			breaker.record(True)
+
+		clock.return_value = 1031.0
+		assert breaker.state() == 'half_open'
+		assert breaker.allow()
+		# one probe per cooldown
+		assert not breaker.allow()
+
+		breaker.record(True)
+		assert breaker.state() == 'open'
+
+		clock.return_value = 1062.0
+		assert breaker.allow()
+		breaker.record(False)
+		assert breaker.state() == 'closed'
+		assert breaker.error_rate() == 0.0
+
+
+class TestCircuits:
+	def test_status(self: Self, clock):
+		circuits = circuit.Circuits()
+
+		assert circuits.allow('viacep')
+		circuits.record('viacep', False)
+		circuits.record('viacep', True)
+
+		assert circuits.status() == {
+			'viacep': {'state': 'closed', 'calls': 2, 'error_rate': 0.5}
+		}
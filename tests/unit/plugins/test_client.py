@@ -0,0 +1,61 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from httpx import MockTransport, Request, Response
+from pytest_mock import MockerFixture
+
+from plugins.client import HttpClientFactory, http_client
+from plugins.viacep.viacep import ViaCep
+
+
+class TestHttpClientFactory:
+	def test_default_transport_is_network(self: Self):
+		assert HttpClientFactory().transport is None
+
+	async def test_plugins_use_configured_transport(
+		self: Self, mocker: MockerFixture
+	):
+		requests: list[Request] = []
+
+		def handler(request: Request) -> Response:
+			requests.append(request)
+			return Response(
+				200,
+				json={
+					'cep': '01001-000',
+					'logradouro': 'Praça da Sé',
+					'complemento': 'lado ímpar',
+					'bairro': 'Sé',
+					'localidade': 'São Paulo',
+					'uf': 'SP',
+					'ibge': '3550308',
+					'gia': '1004',
+					'ddd': '11',
+					'siafi': '7107',
+				},
+			)
+
+		mocker.patch.object(http_client, 'transport', MockTransport(handler))
+
+		response = await ViaCep().get_address_by_zipcode(1001000)
+
+		assert len(requests) == 1
+		assert requests[0].url == 'https://viacep.com.br/ws/01001000/json/'
+		assert response['data'][0].zipcode == 1001000
@@ -0,0 +1,182 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from asyncio import create_task, sleep
+from typing import Self
+
+import pytest
+from httpx import ConnectError, MockTransport, Request, Response
+from prometheus_client import REGISTRY
+
+from plugins import plugins_controller
+from plugins.client import http_client
+
+LATENCY = 'jacobson_plugin_request_duration_seconds_count'
+ERRORS = 'jacobson_plugin_errors_total'
+
+
+def sample(name: str, **labels: str) -> float:
+	return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def plugin(provider: str, result=None, error: Exception | None = None):
+	class Fake:
+		async def get_address_by_zipcode(self, zipcode):
+			if error:
+				raise error
+			if result is None:
+				await sleep(10)
+			return result
+
+	Fake.provider = provider
+	return Fake
+
+
+@pytest.fixture(autouse=True)
+def circuits():
+	plugins_controller.circuits.providers.clear()
+	yield plugins_controller.circuits
+	plugins_controller.circuits.providers.clear()
+
+
+class TestPluginMetrics:
+	async def test_answered_and_cancelled(self: Self):
+		fast = {'data': ['address'], 'provider': 'fast'}
+		before = sample(LATENCY, provider='fast'), sample(LATENCY, provider='slow')
+
+		result = await plugins_controller.get_zipcode_from_plugins(
+			1001000, (plugin('fast', fast), plugin('slow'))
+		)
+		await sleep(0)
+
+		assert result is fast
+		assert sample(LATENCY, provider='fast') == before[0] + 1
+		# cancelled once fast answered, not a finished call
+		assert sample(LATENCY, provider='slow') == before[1]
+
+	async def test_errors_by_class(self: Self):
+		before = sample(ERRORS, provider='broken', error='ValueError')
+
+		result = await plugins_controller.get_zipcode_from_plugins(
+			1001000, (plugin('broken', error=ValueError('bad')),)
+		)
+
+		assert result == {'data': [], 'provider': 'Plugins'}
+		assert sample(ERRORS, provider='broken', error='ValueError') == before + 1
+
+	async def test_errors_logged(self: Self, caplog):
+		await plugins_controller.get_zipcode_from_plugins(
+			1001000, (plugin('broken', error=ValueError('bad')),)
+		)
+
+		(record,) = caplog.records
+		assert record.levelname == 'WARNING'
+		assert record.zipcode == 1001000
+		assert record.provider == 'broken'
+		assert record.error == 'ValueError'
+		assert record.latency >= 0
+
+	async def test_observe_skips_cancelled(self: Self):
+		task = create_task(sleep(10))
+		task.cancel()
+		with pytest.raises(BaseException):
+			await task
+
+		plugins_controller.observe(1001000, 'gone', 0.0, task)
+
+		assert sample(LATENCY, provider='gone') == 0
+
+
+class TestCircuits:
+	async def test_calls_recorded(self: Self, circuits):
+		await plugins_controller.get_zipcode_from_plugins(
+			1001000, (plugin('broken', error=ValueError('bad')),)
+		)
+
+		# not an outage, e.g. an unexpected body
+		assert circuits.status()['broken'] == {
+			'state': 'closed',
+			'calls': 1,
+			'error_rate': 0.0,
+		}
+
+	async def test_not_found_never_opens(self: Self, circuits, mocker):
+		mocker.patch(
+			'plugins.cep_aberto.cep_aberto.settings',
+			mocker.Mock(CEP_ABERTO_TOKEN='token'),
+		)
+
+		def handler(request: Request) -> Response:
+			if request.url.host == 'viacep.com.br':
+				return Response(200, json={'erro': True})
+			return Response(200, json={})
+
+		mocker.patch.object(http_client, 'transport', MockTransport(handler))
+
+		for zipcode in range(99999900, 99999912):
+			result = await plugins_controller.get_zipcode_from_plugins(zipcode)
+			assert result == {'data': [], 'provider': 'Plugins'}
+		await sleep(0)
+
+		for provider in ('viacep', 'cep_aberto'):
+			assert circuits.status()[provider] == {
+				'state': 'closed',
+				'calls': 12,
+				'error_rate': 0.0,
+			}
+			assert circuits.allow(provider)
+
+	async def test_outages_open(self: Self, circuits):
+		error = ConnectError('refused')
+		for _ in range(10):
+			await plugins_controller.get_zipcode_from_plugins(
+				1001000, (plugin('down', error=error),)
+			)
+
+		assert circuits.status()['down']['state'] == 'open'
+
+	async def test_open_circuit_skipped(self: Self, mocker):
+		mocker.patch.object(
+			plugins_controller, 'circuits'
+		).allow.return_value = False
+		fast = {'data': ['address'], 'provider': 'fast'}
+
+		result = await plugins_controller.get_zipcode_from_plugins(
+			1001000, (plugin('fast', fast),)
+		)
+
+		assert result == {'data': [], 'provider': 'Plugins'}
+
+	async def test_unconfigured_skipped_quietly(self: Self, mocker, caplog):
+		class Unconfigured:
+			provider = 'unconfigured'
+
+			def __init__(self):
+				raise Exception('Token Inválido')
+
+		budgets = mocker.patch.object(plugins_controller, 'budgets')
+		circuits = mocker.patch.object(plugins_controller, 'circuits')
+
+		result = await plugins_controller.get_zipcode_from_plugins(
+			1001000, (Unconfigured,)
+		)
+
+		assert result == {'data': [], 'provider': 'Plugins'}
+		budgets.acquire.assert_not_called()
+		circuits.allow.assert_not_called()
+		assert not caplog.records
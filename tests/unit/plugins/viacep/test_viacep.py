@@ -21,14 +21,11 @@ from typing import Self
 
 import pytest
 from httpx import HTTPStatusError, Response
+from msgspec import ValidationError
 from respx import MockRouter
 
-from database.models.brazil import (
-	Address,
-	City,
-	StateAcronym,
-	StateCreate,
-)
+from database.models.brazil import StateAcronym
+from database.models.records import AddressRecord, CityRecord, StateRecord
 from plugins.viacep.viacep import ViaCep
 
 
@@ -92,21 +89,39 @@ class TestViaCep:
 		)
 		response = await ViaCep().get_address_by_zipcode(zipcode)
 
-		assert response['data'][0].state == StateCreate(
-			acronym=StateAcronym.SP, name='São Paulo', id=None
+		assert response == {
+			'data': [
+				AddressRecord(
+					zipcode=1001000,
+					state=StateRecord(acronym=StateAcronym.SP, name='São Paulo'),
+					city=CityRecord(ibge=3550308, name='São Paulo', ddd=11),
+					neighborhood='Sé',
+					complement='Praça da Sé lado ímpar',
+				)
+			],
+			'provider': 'viacep',
+		}
+
+	async def test_get_address_by_zipcode_method_not_found(
+		self: Self, respx_mock: MockRouter
+	) -> None:
+		zipcode = 1001000
+		respx_mock.get(f'https://viacep.com.br/ws/{zipcode:08}/json/').mock(
+			return_value=Response(200, json={'erro': True})
+		)
+
+		assert await ViaCep().get_address_by_zipcode(zipcode) == {
+			'data': [],
+			'provider': 'viacep',
+		}
+
+	async def test_get_address_by_zipcode_method_unexpected_body(
+		self: Self, respx_mock: MockRouter
+	) -> None:
+		zipcode = 1001000
+		respx_mock.get(f'https://viacep.com.br/ws/{zipcode:08}/json/').mock(
+			return_value=Response(200, json={'cep': '01001-000'})
 		)
-		city_response_model = response['data'][0].city.model_dump()
-		city_model = City(
-			ibge=3550308, name='São Paulo', ddd=11, id=None
-		).model_dump()
-		city_model['id'] = city_response_model['id']
-		assert city_response_model == city_model
-		address_response_model = response['data'][0].model_dump()
-		address_model = Address(
-			zipcode=1001000,
-			neighborhood='Sé',
-			complement='Praça da Sé lado ímpar',
-		).model_dump()
-		address_model['id'] = address_response_model['id']
-		address_model['updated_at'] = address_response_model['updated_at']
-		assert address_response_model == address_model
+
+		with pytest.raises(ValidationError):
+			await ViaCep().get_address_by_zipcode(zipcode)
@@ -0,0 +1,202 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import logging
+import sys
+from io import StringIO
+from typing import Self
+
+import pytest
+from prometheus_client import REGISTRY
+
+from utils import logs
+
+DROPPED = 'jacobson_log_records_dropped_total'
+
+
+def dropped(reason: str) -> float:
+	return REGISTRY.get_sample_value(DROPPED, {'reason': reason}) or 0.0
+
+
+def record(level: int = logging.INFO, **extra) -> logging.LogRecord:
+	entry = logging.LogRecord(
+		'test', level, __file__, 1, 'hi %s', ('there',), None
+	)
+	entry.__dict__.update(extra)
+	return entry
+
+
+@pytest.fixture()
+def settings(mocker):
+	return mocker.patch.object(
+		logs,
+		'settings',
+		mocker.Mock(
+			LOG_LEVEL='INFO',
+			LOG_FORMAT='json',
+			LOG_QUEUE_SIZE=100,
+			LOG_RATE_LIMIT=1000.0,
+			LOG_LOOKUP_SAMPLE_RATE=1.0,
+		),
+	)
+
+
+class TestJSONFormatter:
+	def test_extra_fields(self: Self):
+		line = logs.JSONFormatter().format(record(zipcode=1001000, cache='hit'))
+
+		entry = json.loads(line)
+		assert entry['level'] == 'INFO'
+		assert entry['logger'] == 'test'
+		assert entry['message'] == 'hi there'
+		assert entry['zipcode'] == 1001000
+		assert entry['cache'] == 'hit'
+		assert 'args' not in entry
+
+	def test_exception(self: Self):
+		try:
+			raise ValueError('bad')
+		except ValueError:
+			entry = record(logging.ERROR)
+			entry.exc_info = sys.exc_info()
+
+		assert (
+			'ValueError: bad'
+			in json.loads(logs.JSONFormatter().format(entry))['exception']
+		)
+
+
+class TestSample:
+	def test_keeps_warnings(self: Self):
+		sample = logs.Sample(0.0)
+
+		assert not sample.filter(record())
+		assert sample.filter(record(logging.WARNING))
+
+	def test_rate(self: Self, mocker):
+		mocker.patch.object(logs, 'random', return_value=0.3)
+
+		assert logs.Sample(0.5).filter(record())
+		assert not logs.Sample(0.2).filter(record())
+
+
+class TestRateLimit:
+	def test_burst_then_refill(self: Self, mocker):
+		clock = mocker.patch('utils.rate_limit.monotonic', return_value=100.0)
+		limit = logs.RateLimit(2)
+		before = dropped('rate_limit')
+
+		assert [limit.filter(record()) for _ in range(3)] == [True, True, False]
+		clock.return_value = 100.5
+		assert limit.filter(record())
+		assert not limit.filter(record())
+		assert dropped('rate_limit') == before + 2
+
+	def test_warnings_bypass(self: Self, mocker):
+		mocker.patch('utils.rate_limit.monotonic', return_value=100.0)
+		limit = logs.RateLimit(1)
+
+		assert limit.filter(record())
+		assert not limit.filter(record())
+		assert limit.filter(record(logging.WARNING))
+		assert limit.filter(record(logging.ERROR))
+
+
+class TestDroppingQueueHandler:
+	def test_full_queue_drops(self: Self):
+		queue = logs.Queue(1)
+		handler = logs.DroppingQueueHandler(queue)
+		before = dropped('queue_full')
+
+		handler.handle(record())
+		handler.handle(record())
+
+		assert queue.qsize() == 1
+		assert dropped('queue_full') == before + 1
+
+	def test_record_not_formatted(self: Self):
+		queue = logs.Queue(1)
+		entry = record()
+
+		logs.DroppingQueueHandler(queue).handle(entry)
+
+		assert queue.get_nowait() is entry
+		assert entry.args == ('there',)
+
+
+class TestPipeline:
+	def test_writes_json_off_the_caller(self: Self, settings):
+		stream = StringIO()
+		handler = logging.StreamHandler(stream)
+		handler.setFormatter(logs.JSONFormatter())
+
+		with logs.pipeline(handler):
+			logging.getLogger('jobs.test').info('done', extra={'job': 7})
+
+		(line,) = stream.getvalue().splitlines()
+		assert json.loads(line)['job'] == 7
+		assert not any(
+			isinstance(h, logs.DroppingQueueHandler)
+			for h in logging.getLogger().handlers
+		)
+
+	def test_samples_lookups(self: Self, settings):
+		settings.LOG_LOOKUP_SAMPLE_RATE = 0.0
+		stream = StringIO()
+
+		with logs.pipeline(logging.StreamHandler(stream)):
+			logs.lookups.info('lookup')
+			logs.lookups.warning('lookup')
+
+		assert stream.getvalue().splitlines() == ['lookup']
+		assert not logs.lookups.filters
+
+
+class TestLookup:
+	def test_logged(self: Self, caplog):
+		with (
+			caplog.at_level(logging.INFO, 'jacobson.lookups'),
+			logs.lookup(1001000) as entry,
+		):
+			entry.update({'provider': 'local', 'cache': 'hit'})
+
+		(logged,) = caplog.records
+		assert logged.levelname == 'INFO'
+		assert logged.zipcode == 1001000
+		assert logged.provider == 'local'
+		assert logged.cache == 'hit'
+		assert logged.latency >= 0
+
+	def test_error(self: Self, caplog):
+		with (
+			caplog.at_level(logging.INFO, 'jacobson.lookups'),
+			pytest.raises(ValueError),
+			logs.lookup(1001000),
+		):
+			raise ValueError
+
+		(logged,) = caplog.records
+		assert logged.levelname == 'WARNING'
+		assert logged.error == 'ValueError'
+
+	def test_without_zipcode(self: Self, caplog):
+		with caplog.at_level(logging.INFO, 'jacobson.lookups'), logs.lookup(None):
+			pass
+
+		assert not caplog.records
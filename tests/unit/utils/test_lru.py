@@ -0,0 +1,62 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from utils.lru import LRUCache
+
+
+class TestLRUCache:
+	def test_drops_least_recently_used(self: Self):
+		cache: LRUCache[str, str] = LRUCache(2)
+		cache.put('a', 'query a')
+		cache.put('b', 'query b')
+		cache.get('a')
+		cache.put('c', 'query c')
+
+		assert len(cache) == 2
+		assert cache.get('b') is None
+		assert cache.get('a') == 'query a'
+		assert cache.get('c') == 'query c'
+
+	def test_stats(self: Self):
+		cache: LRUCache[str, int] = LRUCache(2)
+		cache.put('a', 1)
+		cache.get('a')
+		cache.get('a')
+		cache.get('b')
+
+		assert cache.stats() == {
+			'size': 1,
+			'hits': 2,
+			'misses': 1,
+			'hit_ratio': 2 / 3,
+		}
+
+	def test_items_and_clear(self: Self):
+		cache: LRUCache[str, int] = LRUCache(2)
+		cache.put('a', 1)
+		cache.put('b', 2)
+		cache.get('a')
+
+		assert cache.items() == [('b', 2), ('a', 1)]
+		assert cache.stats()['hits'] == 1
+
+		cache.clear()
+		assert cache.items() == []
+		assert cache.stats()['hits'] == 1
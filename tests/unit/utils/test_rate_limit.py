@@ -0,0 +1,43 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from pytest_mock import MockerFixture
+
+from utils import rate_limit
+from utils.rate_limit import RateLimiter
+
+
+class TestRateLimiter:
+	def test_acquire_until_empty(self: Self):
+		limiter = RateLimiter(2)
+
+		assert limiter.acquire()
+		assert limiter.acquire()
+		assert not limiter.acquire()
+
+	def test_refill(self: Self, mocker: MockerFixture):
+		clock = mocker.patch.object(rate_limit, 'monotonic', return_value=100.0)
+		limiter = RateLimiter(2)
+		limiter.acquire()
+		limiter.acquire()
+
+		clock.return_value = 100.5
+		assert limiter.acquire()
+		assert not limiter.acquire()
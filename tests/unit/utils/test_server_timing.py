@@ -0,0 +1,54 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+from utils import server_timing
+from utils.server_timing import ServerTiming
+
+
+class TestServerTiming:
+	def test_header(self: Self):
+		timing = ServerTiming()
+		timing.add('db', 0.002)
+		timing.add('plugins', 0.0805, 'viacep')
+		timing.add('db', 0.0031)
+
+		assert timing.header() == (
+			'db;dur=5.1;desc="2x", plugins;dur=80.5;desc="viacep"'
+		)
+
+	def test_empty(self: Self):
+		assert ServerTiming().header() == ''
+
+
+class TestRecording:
+	def test_only_inside_timed(self: Self):
+		server_timing.record('db', 1)
+		with server_timing.phase('serialize'):
+			pass
+
+		with server_timing.timed() as timing:
+			server_timing.record('cache', 0.001, 'hit')
+			with server_timing.phase('serialize'):
+				pass
+
+		server_timing.record('db', 1)
+
+		assert timing.header().startswith('cache;dur=1.0;desc="hit", serialize;dur=')
+		assert 'db' not in timing.header()
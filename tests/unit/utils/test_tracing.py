@@ -0,0 +1,169 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Self
+
+import pytest
+from httpx import AsyncClient, ConnectError, MockTransport, Request, Response
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+	InMemorySpanExporter,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased
+from opentelemetry.trace import StatusCode
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from api.address.graphql_inputs import AddressFilterInput
+from api.resolvers import get_address
+from plugins.client import HttpClientFactory, TracingTransport
+from utils import tracing
+
+
+@pytest.fixture()
+def spans(mocker) -> InMemorySpanExporter:
+	exporter = InMemorySpanExporter()
+	provider = TracerProvider()
+	provider.add_span_processor(SimpleSpanProcessor(exporter))
+	mocker.patch.object(tracing, 'tracer', provider.get_tracer('test'))
+	return exporter
+
+
+class TestConfigure:
+	def test_off(self: Self, mocker):
+		mocker.patch.object(
+			tracing, 'settings', mocker.Mock(TRACING_EXPORTER='none')
+		)
+		set_provider = mocker.patch.object(tracing.trace, 'set_tracer_provider')
+
+		assert not tracing.enabled()
+		assert tracing.configure() is None
+		set_provider.assert_not_called()
+
+	def test_sampled_provider(self: Self, mocker):
+		mocker.patch.object(
+			tracing,
+			'settings',
+			mocker.Mock(TRACING_EXPORTER='console', TRACING_SAMPLE_RATE=0.25),
+		)
+		set_provider = mocker.patch.object(tracing.trace, 'set_tracer_provider')
+
+		provider = tracing.configure()
+
+		assert tracing.enabled()
+		set_provider.assert_called_once_with(provider)
+		assert isinstance(provider.sampler, ParentBased)
+		assert '0.25' in provider.sampler.get_description()
+		assert provider.resource.attributes['service.name'] == 'jacobson'
+
+	def test_given_exporter(self: Self, mocker):
+		mocker.patch.object(
+			tracing,
+			'settings',
+			mocker.Mock(TRACING_EXPORTER='none', TRACING_SAMPLE_RATE=1.0),
+		)
+		mocker.patch.object(tracing.trace, 'set_tracer_provider')
+
+		assert tracing.configure(InMemorySpanExporter()) is not None
+
+
+class TestInstrumentEngine:
+	def test_statement_spans(self: Self, spans):
+		engine = create_engine('sqlite://')
+		tracing.instrument_engine(engine)
+
+		with engine.connect() as conn:
+			conn.execute(text('SELECT 1 UNION SELECT 2')).all()
+
+		(span,) = spans.get_finished_spans()
+		assert span.name == 'SELECT'
+		assert span.attributes['db.system'] == 'sqlite'
+		assert span.attributes['db.statement'] == 'SELECT 1 UNION SELECT 2'
+
+	def test_failed_statement(self: Self, spans):
+		engine = create_engine('sqlite://')
+		tracing.instrument_engine(engine)
+
+		with engine.connect() as conn, pytest.raises(OperationalError):
+			conn.execute(text('SELECT * FROM nothing'))
+
+		(span,) = spans.get_finished_spans()
+		assert span.status.status_code == StatusCode.ERROR
+		assert span.events[0].name == 'exception'
+
+
+class TestTracingTransport:
+	async def test_request_span(self: Self, spans):
+		transport = TracingTransport(MockTransport(lambda _: Response(503)))
+
+		async with AsyncClient(transport=transport) as client:
+			await client.get('https://viacep.com.br/ws/01001000/json/')
+
+		(span,) = spans.get_finished_spans()
+		assert span.name == 'GET viacep.com.br'
+		assert span.attributes['http.response.status_code'] == 503
+		assert span.attributes['url.full'] == (
+			'https://viacep.com.br/ws/01001000/json/'
+		)
+		assert span.status.status_code == StatusCode.ERROR
+
+	async def test_failed_request(self: Self, spans):
+		def fail(request: Request) -> Response:
+			raise ConnectError('down', request=request)
+
+		transport = TracingTransport(MockTransport(fail))
+
+		async with AsyncClient(transport=transport) as client:
+			with pytest.raises(ConnectError):
+				await client.get('https://www.cepaberto.com/api/v3/cep')
+
+		(span,) = spans.get_finished_spans()
+		assert span.status.status_code == StatusCode.ERROR
+
+	def test_factory_wraps_when_enabled(self: Self, mocker):
+		factory = HttpClientFactory()
+		factory.transport = MockTransport(lambda _: Response(200))
+		mocker.patch.object(tracing, 'enabled', return_value=True)
+
+		assert isinstance(factory()._transport, TracingTransport)
+
+		tracing.enabled.return_value = False
+		assert factory()._transport is factory.transport
+
+
+class TestResolverSpans:
+	async def test_get_address_span(self: Self, spans, mocker):
+		mocker.patch(
+			'api.resolvers.functions.get_address_by_dc_join_state_join_city',
+			return_value=[],
+		)
+		mocker.patch(
+			'api.resolvers.get_zipcode_from_plugins',
+			return_value={'data': [], 'provider': 'Plugins'},
+		)
+
+		await get_address('session', AddressFilterInput(zipcode=1001000), 1, 1)
+
+		(span,) = spans.get_finished_spans()
+		assert span.name == 'get_address'
+		assert dict(span.attributes) == {
+			'zipcode': 1001000,
+			'provider': 'Plugins',
+			'rows': 0,
+		}
@@ -0,0 +1,285 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import sys
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from logging import (
+	INFO,
+	WARNING,
+	Filter,
+	Formatter,
+	Handler,
+	LogRecord,
+	StreamHandler,
+	getLogger,
+)
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from random import random
+from time import perf_counter
+from typing import Literal, Self, TypedDict
+
+from utils.metrics import LOG_DROPPED
+from utils.rate_limit import RateLimiter
+from utils.settings import settings
+
+# one record per zipcode lookup, see lookup and LOG_LOOKUP_SAMPLE_RATE
+lookups = getLogger('jacobson.lookups')
+
+# attributes every LogRecord has, the others came from extra=
+STANDARD_ATTRIBUTES = frozenset(
+	(*vars(LogRecord('', INFO, '', 0, '', None, None)), 'message', 'asctime')
+)
+
+
+class LookupEntry(TypedDict, total=False):
+	"""Fields of a lookup record."""
+
+	zipcode: int
+	provider: str
+	cache: Literal['hit', 'miss']
+	latency: float
+	error: str
+
+
+class JSONFormatter(Formatter):
+	"""One JSON object per line, extra= fields at the top level."""
+
+	def format(self: Self, record: LogRecord) -> str:
+		"""
+		Render a record.
+
+		Args:
+				self (Self): scope of the class
+				record (LogRecord): the record
+
+		Returns:
+				str: time, level, logger, message, extra fields and exception
+
+		"""
+		entry = {
+			'time': datetime.fromtimestamp(record.created, UTC).isoformat(),
+			'level': record.levelname,
+			'logger': record.name,
+			'message': record.getMessage(),
+		}
+		entry.update(
+			(key, value)
+			for key, value in vars(record).items()
+			if key not in STANDARD_ATTRIBUTES
+		)
+		if record.exc_info:
+			entry['exception'] = self.formatException(record.exc_info)
+		return json.dumps(entry, default=str)
+
+
+class Sample(Filter):
+	"""Keep a part of the records below WARNING, all the others."""
+
+	__slots__ = ('rate',)
+
+	def __init__(self: Self, rate: float) -> None:
+		"""
+		Set the part kept.
+
+		Args:
+				self (Self): scope of the class
+				rate (float): 0 to 1
+
+		"""
+		super().__init__()
+		self.rate = rate
+
+	def filter(self: Self, record: LogRecord) -> bool:
+		"""
+		Decide if a record is kept.
+
+		Args:
+				self (Self): scope of the class
+				record (LogRecord): the record
+
+		Returns:
+				bool: kept
+
+		"""
+		return record.levelno >= WARNING or random() < self.rate
+
+
+class RateLimit(Filter):
+	"""
+	At most rate records per second (bursts up to rate), see RateLimiter.
+
+	Info:
+			Warnings and errors always pass, so lookup and library INFO
+			records can't use up the bucket during an outage; the queue
+			size still bounds them.
+	"""
+
+	__slots__ = ('limiter',)
+
+	def __init__(self: Self, rate: float) -> None:
+		"""
+		Start with a full bucket.
+
+		Args:
+				self (Self): scope of the class
+				rate (float): records per second
+
+		"""
+		super().__init__()
+		self.limiter = RateLimiter(rate)
+
+	def filter(self: Self, record: LogRecord) -> bool:
+		"""
+		Take a token for an INFO record, drop it when there is none.
+
+		Args:
+				self (Self): scope of the class
+				record (LogRecord): the record
+
+		Returns:
+				bool: kept
+
+		"""
+		if record.levelno >= WARNING or self.limiter.acquire():
+			return True
+		LOG_DROPPED.labels('rate_limit').inc()
+		return False
+
+
+class DroppingQueueHandler(QueueHandler):
+	"""
+	Hand records to the listener thread, never blocking the caller.
+
+	Info:
+			Records are queued as they are, message formatting and
+			JSON rendering run on the listener thread. Records that
+			find the queue full are dropped and counted.
+	"""
+
+	def prepare(self: Self, record: LogRecord) -> LogRecord:
+		"""
+		Keep the record unformatted, the queue does not leave the process.
+
+		Args:
+				self (Self): scope of the class
+				record (LogRecord): the record
+
+		Returns:
+				LogRecord: the same record
+
+		"""
+		return record
+
+	def enqueue(self: Self, record: LogRecord) -> None:
+		"""
+		Queue a record, or drop it when the queue is full.
+
+		Args:
+				self (Self): scope of the class
+				record (LogRecord): the record
+
+		"""
+		try:
+			self.queue.put_nowait(record)
+		except Full:
+			LOG_DROPPED.labels('queue_full').inc()
+
+
+def output() -> Handler:
+	"""Build the stderr handler, formatted by LOG_FORMAT."""
+	handler = StreamHandler(sys.stderr)
+	if settings.LOG_FORMAT == 'json':
+		handler.setFormatter(JSONFormatter())
+	else:
+		handler.setFormatter(
+			Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
+		)
+	return handler
+
+
+@contextmanager
+def pipeline(handler: Handler | None = None) -> Iterator[QueueListener]:
+	"""
+	Send the app logs through a queue to a listener thread in the block.
+
+	The root logger gets LOG_LEVEL and a DroppingQueueHandler of
+	LOG_QUEUE_SIZE records, limited to LOG_RATE_LIMIT records per second;
+	lookups are sampled by LOG_LOOKUP_SAMPLE_RATE. Queued records are
+	written when the block ends.
+
+	Args:
+			handler (Handler | None, optional): where records are written.
+					Defaults to None, stderr (see output).
+
+	Yields:
+			QueueListener: the running listener
+
+	"""
+	queue: Queue[LogRecord] = Queue(settings.LOG_QUEUE_SIZE)
+	queue_handler = DroppingQueueHandler(queue)
+	queue_handler.addFilter(RateLimit(settings.LOG_RATE_LIMIT))
+	sample = Sample(settings.LOG_LOOKUP_SAMPLE_RATE)
+	listener = QueueListener(queue, handler or output())
+
+	root = getLogger()
+	level = root.level
+	root.setLevel(settings.LOG_LEVEL)
+	root.addHandler(queue_handler)
+	lookups.addFilter(sample)
+	listener.start()
+	try:
+		yield listener
+	finally:
+		lookups.removeFilter(sample)
+		root.removeHandler(queue_handler)
+		root.setLevel(level)
+		listener.stop()
+
+
+@contextmanager
+def lookup(zipcode: int | None) -> Iterator[LookupEntry]:
+	"""
+	Log a zipcode lookup when the block ends, with its latency.
+
+	The block fills provider and cache; an exception adds its class as
+	error and the record becomes a warning. Lookups without zipcode
+	(other filters) are not logged.
+
+	Args:
+			zipcode (int | None): looked up zipcode
+
+	Yields:
+			LookupEntry: fields of the record
+
+	"""
+	entry: LookupEntry = {}
+	start = perf_counter()
+	try:
+		yield entry
+	except Exception as exc:
+		entry['error'] = type(exc).__name__
+		raise
+	finally:
+		if zipcode:
+			entry['zipcode'] = zipcode
+			entry['latency'] = round(perf_counter() - start, 6)
+			lookups.log(WARNING if 'error' in entry else INFO, 'lookup', extra=entry)
@@ -0,0 +1,122 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections import OrderedDict
+from typing import Generic, Self, TypeVar
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+
+class LRUCache(Generic[K, V]):
+	"""Bounded mapping dropping the least recently used key, with hit counts."""
+
+	__slots__ = ('_items', 'hits', 'maxsize', 'misses')
+
+	def __init__(self: Self, maxsize: int) -> None:
+		"""
+		Start empty.
+
+		Args:
+				self (Self): scope of the class
+				maxsize (int): items kept
+
+		"""
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._items: OrderedDict[K, V] = OrderedDict()
+
+	def __len__(self: Self) -> int:
+		"""Count stored items."""
+		return len(self._items)
+
+	def get(self: Self, key: K) -> V | None:
+		"""
+		Find an item, marking it as recently used.
+
+		Args:
+				self (Self): scope of the class
+				key (K): item key
+
+		Returns:
+				V | None: item, None if unknown
+
+		"""
+		value = self._items.get(key)
+		if value is None:
+			self.misses += 1
+			return None
+		self.hits += 1
+		self._items.move_to_end(key)
+		return value
+
+	def put(self: Self, key: K, value: V) -> V:
+		"""
+		Store an item, dropping the least recently used ones when full.
+
+		Args:
+				self (Self): scope of the class
+				key (K): item key
+				value (V): item
+
+		Returns:
+				V: the stored item
+
+		"""
+		self._items[key] = value
+		self._items.move_to_end(key)
+		while len(self._items) > self.maxsize:
+			self._items.popitem(last=False)
+		return value
+
+	def items(self: Self) -> list[tuple[K, V]]:
+		"""
+		List the items, least recently used first, without marking them.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				list[tuple[K, V]]: (key, item) pairs
+
+		"""
+		return list(self._items.items())
+
+	def clear(self: Self) -> None:
+		"""Drop every item, hit counts are kept."""
+		self._items.clear()
+
+	def stats(self: Self) -> dict[str, float]:
+		"""
+		Get size and hit counts.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				dict[str, float]: size, hits, misses and hit_ratio
+
+		"""
+		lookups = self.hits + self.misses
+		return {
+			'size': len(self._items),
+			'hits': self.hits,
+			'misses': self.misses,
+			'hit_ratio': self.hits / lookups if lookups else 0.0,
+		}
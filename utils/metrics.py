@@ -0,0 +1,53 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from prometheus_client import Counter, Histogram
+
+# recorded on the request path: one dict lookup and an increment each,
+# everything else is read when /metrics is scraped (see api.metrics)
+
+REQUEST_LATENCY = Histogram(
+	'jacobson_http_request_duration_seconds',
+	'HTTP requests, by route template and response status.',
+	['method', 'route', 'status'],
+)
+OPERATION_LATENCY = Histogram(
+	'jacobson_graphql_operation_duration_seconds',
+	'GraphQL operations (parse, validation and execution), by operation name.',
+	['operation'],
+)
+LOOKUPS = Counter(
+	'jacobson_lookups',
+	'Zipcode lookups, by who answered: local, a plugin provider or not_found.',
+	['provider'],
+)
+PLUGIN_LATENCY = Histogram(
+	'jacobson_plugin_request_duration_seconds',
+	'Plugin calls that finished (answered or failed), by provider.',
+	['provider'],
+)
+PLUGIN_ERRORS = Counter(
+	'jacobson_plugin_errors',
+	'Plugin calls that raised, by provider and exception class.',
+	['provider', 'error'],
+)
+LOG_DROPPED = Counter(
+	'jacobson_log_records_dropped',
+	'Log records dropped unwritten, by reason: rate_limit or queue_full.',
+	['reason'],
+)
@@ -0,0 +1,64 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from time import monotonic
+from typing import Self
+
+
+class RateLimiter:
+	"""
+	Token bucket allowing rate operations per second (burst of 1s).
+
+	Info:
+			No lock: log records acquire from any thread, and two of them
+			can take the last token, a few more operations go through.
+	"""
+
+	__slots__ = ('_last', '_tokens', 'rate')
+
+	def __init__(self: Self, rate: float) -> None:
+		"""
+		Start with a full bucket.
+
+		Args:
+				self (Self): scope of the class
+				rate (float): operations per second
+
+		"""
+		self.rate = rate
+		self._tokens = rate
+		self._last = monotonic()
+
+	def acquire(self: Self) -> bool:
+		"""
+		Take one token if there is one.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				bool: True if the operation is allowed now
+
+		"""
+		now = monotonic()
+		self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+		self._last = now
+		if self._tokens < 1:
+			return False
+		self._tokens -= 1
+		return True
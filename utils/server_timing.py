@@ -0,0 +1,163 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Self
+
+
+class Phase:
+	"""Time spent in one phase of a request."""
+
+	__slots__ = ('count', 'description', 'seconds')
+
+	def __init__(self: Self, description: str | None) -> None:
+		"""
+		Start at zero.
+
+		Args:
+				self (Self): scope of the class
+				description (str | None): e.g. the winning provider
+
+		"""
+		self.seconds = 0.0
+		self.count = 0
+		self.description = description
+
+
+class ServerTiming:
+	"""
+	Phases of one request, rendered as a Server-Timing header.
+
+	Info:
+			Repeated phases (e.g. db, one per statement) are summed and
+			their count is the description, unless one was given.
+	"""
+
+	__slots__ = ('_phases',)
+
+	def __init__(self: Self) -> None:
+		"""
+		Start without phases.
+
+		Args:
+				self (Self): scope of the class
+
+		"""
+		self._phases: dict[str, Phase] = {}
+
+	def add(
+		self: Self, name: str, seconds: float, description: str | None = None
+	) -> None:
+		"""
+		Add the time of a phase.
+
+		Args:
+				self (Self): scope of the class
+				name (str): phase name, a token (e.g. db, plugins)
+				seconds (float): time spent
+				description (str | None, optional): e.g. the winning provider.
+						Defaults to None.
+
+		"""
+		phase = self._phases.get(name) or self._phases.setdefault(
+			name, Phase(description)
+		)
+		phase.seconds += seconds
+		phase.count += 1
+		phase.description = description or phase.description
+
+	def header(self: Self) -> str:
+		"""
+		Render the phases, in the order they first happened.
+
+		Args:
+				self (Self): scope of the class
+
+		Returns:
+				str: Server-Timing header value, durations in milliseconds
+
+		"""
+		metrics = []
+		for name, phase in self._phases.items():
+			metric = f'{name};dur={phase.seconds * 1e3:.1f}'
+			description = phase.description
+			if description is None and phase.count > 1:
+				description = f'{phase.count}x'
+			if description is not None:
+				metric += f';desc="{description}"'
+			metrics.append(metric)
+		return ', '.join(metrics)
+
+
+_current: ContextVar[ServerTiming | None] = ContextVar(
+	'server_timing', default=None
+)
+
+
+@contextmanager
+def timed() -> Iterator[ServerTiming]:
+	"""Record the phases of the current request (context) in the block."""
+	timing = ServerTiming()
+	token = _current.set(timing)
+	try:
+		yield timing
+	finally:
+		_current.reset(token)
+
+
+def record(name: str, seconds: float, description: str | None = None) -> None:
+	"""
+	Add the time of a phase, if the current request is timed.
+
+	Args:
+			name (str): phase name
+			seconds (float): time spent
+			description (str | None, optional): phase description.
+					Defaults to None.
+
+	"""
+	if timing := _current.get():
+		timing.add(name, seconds, description)
+
+
+@contextmanager
+def phase(name: str, description: str | None = None) -> Iterator[None]:
+	"""
+	Time a block as a phase, if the current request is timed.
+
+	Args:
+			name (str): phase name
+			description (str | None, optional): phase description.
+					Defaults to None.
+
+	Yields:
+			Iterator[None]: the block
+
+	"""
+	timing = _current.get()
+	if timing is None:
+		yield
+		return
+	begin = perf_counter()
+	try:
+		yield
+	finally:
+		timing.add(name, perf_counter() - begin, description)
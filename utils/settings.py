@@ -16,10 +16,16 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+from datetime import timedelta
+from typing import Literal
 from urllib.parse import quote_plus
 
 from pydantic import (
 	BaseModel,
+	Field,
+	NonNegativeFloat,
+	NonNegativeInt,
+	PositiveFloat,
 	PositiveInt,
 	PostgresDsn,
 	computed_field,
@@ -45,6 +51,128 @@ class Settings(BaseSettings):
 
 	CEP_ABERTO_TOKEN: str | None = None
 
+	# max age of an address per provider, older ones are served and
+	# re-fetched in background; providers not listed are never refreshed
+	REFRESH_MAX_AGE: dict[str, timedelta] = {
+		'viacep': timedelta(days=30),
+		'cep_aberto': timedelta(days=30),
+	}
+	REFRESH_RATE_LIMIT: PositiveFloat = 1.0  # background re-fetches per second
+
+	# respond with the first plugin, merge the others into the stored address
+	ENRICH_ENABLED: bool = True
+	ENRICH_TIMEOUT: PositiveFloat = 10.0  # seconds waiting the other plugins
+	ENRICH_DEFER: NonNegativeFloat = 2.0  # retry failed plugins after, 0 = off
+	# keep: never change; fill: only empty values; replace: any new value
+	ENRICH_MERGE_RULES: dict[str, Literal['keep', 'fill', 'replace']] = {
+		'neighborhood': 'fill',
+		'complement': 'fill',
+		'coordinates': 'fill',
+		'city.name': 'fill',
+		'city.ddd': 'fill',
+	}
+
+	# requests per day of each provider, providers not listed are unlimited
+	PROVIDER_DAILY_BUDGET: dict[str, PositiveInt] = {'cep_aberto': 10_000}
+	# background lookups stop when the day usage reaches this share of the
+	# budget, the rest is left for live traffic
+	BACKFILL_BUDGET_SHARE: float = Field(0.5, gt=0, le=1)
+	# seconds between syncs of the providers usage of every process
+	BUDGET_SYNC_INTERVAL: PositiveFloat = 5.0
+	BACKFILL_ENABLED: bool = True
+	BACKFILL_INTERVAL: NonNegativeFloat = 1.0  # seconds between lookups
+	BACKFILL_YIELD: NonNegativeFloat = 5.0  # max pause after a live lookup
+	BACKFILL_BATCH: PositiveInt = 100  # zipcodes between checkpoints
+	BACKFILL_POLL: PositiveFloat = 60.0  # seconds between checks for jobs
+
+	# Cache-Control max-age (seconds) of zipcode responses
+	HTTP_CACHE_MAX_AGE: NonNegativeInt = 86400
+	# GraphQL automatic persisted queries kept in memory (hash -> document)
+	APQ_MAX_SIZE: PositiveInt = 1000
+	# parsed and validated GraphQL documents kept in memory, by query text
+	DOCUMENT_CACHE_MAX_SIZE: PositiveInt = 1000
+
+	# GraphQL limits, checked before anything reaches the database
+	MAX_PAGE_SIZE: PositiveInt = 100
+	PAGE_SIZE_OVER_MAX: Literal['clamp', 'reject'] = 'clamp'
+	MAX_QUERY_DEPTH: PositiveInt = 10
+	# estimated rows read by an operation, see api.cost
+	MAX_QUERY_COST: PositiveInt = 5000
+
+	# rows fetched from the server-side cursor per exported chunk
+	EXPORT_CHUNK_SIZE: PositiveInt = 1000
+	# addresses accepted by one createAddresses mutation
+	MAX_BULK_ADDRESSES: PositiveInt = 10_000
+
+	# response compression, by preference; empty list turns it off
+	COMPRESSION_ENCODINGS: list[Literal['zstd', 'br', 'gzip']] = [
+		'zstd',
+		'br',
+		'gzip',
+	]
+	COMPRESSION_MIN_SIZE: NonNegativeInt = 1024  # smaller bodies are sent as is
+	COMPRESSION_GZIP_LEVEL: int = Field(6, ge=1, le=9)
+	COMPRESSION_BROTLI_QUALITY: int = Field(4, ge=0, le=11)
+	COMPRESSION_ZSTD_LEVEL: int = Field(3, ge=1, le=22)
+
+	# GraphQL operation names with their own latency series on /metrics,
+	# later names are counted as 'other'
+	METRICS_MAX_OPERATIONS: PositiveInt = 100
+
+	# OpenTelemetry spans, exported to stdout or to an OTLP collector
+	# (OTEL_EXPORTER_OTLP_* env vars); 'none' turns tracing off
+	TRACING_EXPORTER: Literal['none', 'console', 'otlp'] = 'none'
+	TRACING_SAMPLE_RATE: float = Field(1.0, ge=0, le=1)  # part of the traces kept
+
+	# statements slower than this (seconds) are logged and kept by shape,
+	# a part of the slow SELECTs is run again as EXPLAIN (ANALYZE, BUFFERS)
+	SLOW_QUERY_THRESHOLD: NonNegativeFloat = 0.5
+	SLOW_QUERY_MAX_SHAPES: PositiveInt = 200
+	SLOW_QUERY_EXPLAIN_RATE: float = Field(0.0, ge=0, le=1)
+
+	# Server-Timing response header, for requests sending X-Server-Timing: 1
+	# (when enabled) and for a sample of all requests
+	SERVER_TIMING_ENABLED: bool = True
+	SERVER_TIMING_SAMPLE_RATE: float = Field(0.0, ge=0, le=1)
+
+	# profile requests sent with X-Profile-Token: ADMIN_TOKEN (DEV/canary)
+	PROFILING_ENABLED: bool = False
+	PROFILING_INTERVAL: PositiveFloat = 0.001  # seconds between samples
+	# write profiles here instead of returning them as the response
+	PROFILING_DIRECTORY: str | None = None
+
+	# logs go through a queue to a thread writing them to stderr, records
+	# beyond the queue size or the rate limit are dropped
+	LOG_LEVEL: Literal['DEBUG', 'INFO', 'WARNING', 'ERROR'] = 'INFO'
+	LOG_FORMAT: Literal['json', 'text'] = 'json'
+	LOG_QUEUE_SIZE: PositiveInt = 10_000
+	LOG_RATE_LIMIT: PositiveFloat = 1000.0  # records per second, below WARNING
+	LOG_LOOKUP_SAMPLE_RATE: float = Field(
+		1.0, ge=0, le=1
+	)  # failures are all kept
+
+	# a provider is skipped for CIRCUIT_COOLDOWN seconds once this part of
+	# its calls in the last CIRCUIT_WINDOW seconds failed (and there were
+	# at least CIRCUIT_MIN_CALLS of them)
+	CIRCUIT_ERROR_RATE: float = Field(0.5, gt=0, le=1)
+	CIRCUIT_MIN_CALLS: PositiveInt = 10
+	CIRCUIT_WINDOW: PositiveFloat = 60.0
+	CIRCUIT_COOLDOWN: PositiveFloat = 30.0
+
+	# database ping behind /health and /ready, run by a background job (not
+	# by the probes) every HEALTH_PING_INTERVAL seconds
+	HEALTH_PING_INTERVAL: PositiveFloat = 5.0
+	HEALTH_PING_TIMEOUT: PositiveFloat = 2.0
+
+	# before /ready: open pool connections, load states and cities and run
+	# the lookups of these zipcodes (e.g. the most requested ones)
+	WARMUP_ENABLED: bool = True
+	WARMUP_CONNECTIONS: NonNegativeInt = 5  # at most the pool size
+	WARMUP_ZIPCODES: list[PositiveInt] = []
+
+	# bearer token of the /admin endpoints, they are off without one
+	ADMIN_TOKEN: str | None = None
+
 	@computed_field  # type: ignore[prop-decorator]
 	@property
 	def DATABASE_URL(self) -> str:
@@ -0,0 +1,134 @@
+"""
+Jacobson is a self hosted zipcode API
+Copyright (C) 2023-2024  Christian G. Semke.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+from typing import Any
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import (
+	BatchSpanProcessor,
+	ConsoleSpanExporter,
+	SpanExporter,
+)
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+from sqlalchemy import Engine, event
+
+from utils.settings import settings
+
+# a no-op tracer until configure sets a provider, spans then cost nothing
+tracer = trace.get_tracer('jacobson')
+
+
+def enabled() -> bool:
+	"""Check if TRACING_EXPORTER is set."""
+	return settings.TRACING_EXPORTER != 'none'
+
+
+def configure(exporter: SpanExporter | None = None) -> TracerProvider | None:
+	"""
+	Set the global tracer provider from TRACING_* settings.
+
+	Spans are sampled by TRACING_SAMPLE_RATE (by trace id, children follow
+	their parent) and exported in batches off the request path.
+
+	Args:
+			exporter (SpanExporter | None, optional): exporter to use instead
+					of TRACING_EXPORTER, e.g. an InMemorySpanExporter.
+					Defaults to None.
+
+	Returns:
+			TracerProvider | None: the provider, None when tracing is off
+
+	"""
+	if exporter is None:
+		if settings.TRACING_EXPORTER == 'console':
+			exporter = ConsoleSpanExporter()
+		elif settings.TRACING_EXPORTER == 'otlp':
+			from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+				OTLPSpanExporter,
+			)
+
+			# endpoint and headers come from the OTEL_EXPORTER_OTLP_* env vars
+			exporter = OTLPSpanExporter()
+		else:
+			return None
+
+	provider = TracerProvider(
+		resource=Resource.create({'service.name': 'jacobson'}),
+		sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATE)),
+	)
+	provider.add_span_processor(BatchSpanProcessor(exporter))
+	trace.set_tracer_provider(provider)
+	return provider
+
+
+def instrument_engine(engine: Engine) -> None:
+	"""
+	Trace every SQL statement run by the engine.
+
+	The span is kept on the execution context between the cursor events,
+	the async engine runs them in the caller context (greenlet), so spans
+	are children of the resolver span.
+
+	Args:
+			engine (Engine): sync engine, e.g. AsyncEngine.sync_engine
+
+	"""
+
+	@event.listens_for(engine, 'before_cursor_execute')
+	def start_span(  # noqa: PLR0913
+		conn: Any,
+		cursor: Any,
+		statement: str,
+		parameters: Any,
+		context: Any,
+		executemany: bool,
+	) -> None:
+		context._span = tracer.start_span(
+			statement.split(maxsplit=1)[0] if statement else 'SQL',
+			kind=SpanKind.CLIENT,
+			attributes={
+				'db.system': engine.dialect.name,
+				'db.statement': statement,
+			},
+		)
+
+	@event.listens_for(engine, 'after_cursor_execute')
+	def end_span(  # noqa: PLR0913
+		conn: Any,
+		cursor: Any,
+		statement: str,
+		parameters: Any,
+		context: Any,
+		executemany: bool,
+	) -> None:
+		span: Span | None = getattr(context, '_span', None)
+		if span:
+			span.set_attribute('rows', cursor.rowcount)
+			span.end()
+
+	@event.listens_for(engine, 'handle_error')
+	def fail_span(exception_context: Any) -> None:
+		context = exception_context.execution_context
+		span: Span | None = getattr(context, '_span', None)
+		if span:
+			span.record_exception(exception_context.original_exception)
+			span.set_status(Status(StatusCode.ERROR))
+			span.end()